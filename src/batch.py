@@ -0,0 +1,265 @@
+import numpy as np
+from datetime import datetime, timezone
+from fsrs import Scheduler, State, Rating
+from deck_store import DeckStore, NO_TIME, NO_STEP, to_micros
+
+DAY = 86400 * 1000000 # microseconds
+
+# fuzz ranges of the FSRS algorithm, the same in every fsrs release
+FUZZ_RANGES = (
+    {'start' : 2.5, 'end' : 7.0, 'factor' : 0.15},
+    {'start' : 7.0, 'end' : 20.0, 'factor' : 0.1},
+    {'start' : 20.0, 'end' : float('inf'), 'factor' : 0.05}
+)
+
+
+def _view(column, dtype):
+    """
+    Wraps a DeckStore column in a numpy array without copying it. Writes to the
+    array change the store. Views must not outlive the call that made them,
+    the store cannot grow while one exists.
+    """
+    return np.frombuffer(column, dtype = dtype)
+
+
+class BatchScheduler():
+    """
+    Applies the FSRS scheduler to every card of a DeckStore at once with numpy.
+    The formulas are the same as fsrs.Scheduler, evaluated over the stability,
+    difficulty and due columns instead of one Card at a time.
+
+    ## Attributes
+    - scheduler: scheduler whose parameters are used
+    - rng: random generator used to fuzz intervals
+    """
+
+    def __init__(self, scheduler : Scheduler, rng : np.random.Generator = None):
+        """
+        Creates a batch scheduler
+
+        ## Parameters
+        - scheduler: fsrs scheduler to take parameters and settings from
+        - rng: optional, random generator for interval fuzzing
+        """
+        self.scheduler = scheduler
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    @property
+    def _w(self):
+        return np.asarray(self.scheduler.parameters, dtype = np.float64)
+
+    @property
+    def _decay(self):
+        # FSRS-6 parameters end with the decay, FSRS-5 ones use a fixed -0.5
+        parameters = self.scheduler.parameters
+        return -parameters[20] if len(parameters) > 20 else -0.5
+
+    @property
+    def _factor(self):
+        return 0.9 ** (1 / self._decay) - 1
+
+    @staticmethod
+    def _now(now : datetime):
+        return to_micros(now if now is not None else datetime.now(timezone.utc))
+
+    def retrievability(self, store : DeckStore, now : datetime = None):
+        """
+        Computes the probability of recalling every card
+
+        ## Parameters
+        - store: deck to evaluate
+        - now: optional, time to evaluate at, defaults to the current time
+
+        ## Returns
+        Array with the retrievability of each row, 0 for cards never reviewed
+        """
+        last = _view(store.last_review, np.int64)
+        stability = _view(store.stability, np.float64)
+        reviewed = last != NO_TIME
+        elapsed = np.maximum((self._now(now) - last) // DAY, 0)
+        decay = self._decay
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            r = (1 + self._factor * elapsed / stability) ** decay
+        return np.where(reviewed, r, 0.0)
+
+    def forecast(self, store : DeckStore, days : int = 90, now : datetime = None):
+        """
+        Counts how many cards come due on each of the following days. Overdue
+        cards are counted on the first day and paused cards are skipped
+
+        ## Parameters
+        - store: deck to forecast
+        - days: number of days to forecast
+        - now: optional, start of the forecast, defaults to the current time
+
+        ## Returns
+        Array of length days with the number of cards due on each day
+        """
+        due = _view(store.due, np.int64)
+        active = _view(store.paused, np.int8) == 0
+        return self._count_days(due[active], days, now)
+
+    def forecast_tidbits(self, tidbits, days : int = 90, now : datetime = None):
+        """
+        Same as forecast for tidbits that are not in a DeckStore. Only the due
+        times are copied out of the tidbits, so this is one pass over the deck
+        in Python rather than the columnar speed of forecast
+
+        ## Parameters
+        - tidbits: iterable of tidbits
+        - days: number of days to forecast
+        - now: optional, start of the forecast, defaults to the current time
+
+        ## Returns
+        Array of length days with the number of cards due on each day
+        """
+        due = np.fromiter((to_micros(t.card.due) for t in tidbits if not t.paused),
+                          dtype = np.int64)
+        return self._count_days(due, days, now)
+
+    def _count_days(self, due : np.ndarray, days : int, now : datetime):
+        day = np.maximum((due - self._now(now)) // DAY, 0)
+        day = day[day < days]
+        return np.bincount(day, minlength = days)
+
+    def next_interval(self, stability : np.ndarray):
+        """
+        Vectorized Scheduler._next_interval
+
+        ## Parameters
+        - stability: array of stabilities
+
+        ## Returns
+        Array of intervals in whole days
+        """
+        sch = self.scheduler
+        decay = self._decay
+        interval = stability / self._factor * (sch.desired_retention ** (1 / decay) - 1)
+        return np.clip(np.rint(interval), 1, sch.maximum_interval).astype(np.int64)
+
+    def _fuzz(self, interval : np.ndarray):
+        """
+        Vectorized Scheduler._get_fuzzed_interval
+
+        ## Parameters
+        - interval: array of intervals in days
+
+        ## Returns
+        Array of fuzzed intervals in days
+        """
+        maximum = self.scheduler.maximum_interval
+        delta = np.ones(len(interval))
+        for fuzz in FUZZ_RANGES:
+            delta += fuzz['factor'] * np.maximum(
+                np.minimum(interval, fuzz['end']) - fuzz['start'], 0.0)
+        min_ivl = np.maximum(2, np.rint(interval - delta))
+        max_ivl = np.minimum(np.rint(interval + delta), maximum)
+        min_ivl = np.minimum(min_ivl, max_ivl)
+        fuzzed = self.rng.random(len(interval)) * (max_ivl - min_ivl + 1) + min_ivl
+        fuzzed = np.minimum(np.rint(fuzzed), maximum).astype(np.int64)
+        return np.where(interval < 2.5, interval, fuzzed)
+
+    def review(self, store : DeckStore, rows, ratings, now : datetime = None):
+        """
+        Reviews many cards at once. Cards in the Review state are updated with
+        array operations, cards still in a learning step go through
+        Scheduler.review_card one at a time
+
+        ## Parameters
+        - store: deck holding the cards, updated in place
+        - rows: row indexes of the cards to review
+        - ratings: Rating, or int, given to each card
+        - now: optional, time of the reviews, defaults to the current time
+        """
+        rows = np.asarray(rows, dtype = np.int64)
+        ratings = np.asarray(ratings, dtype = np.int64)
+        now = now if now is not None else datetime.now(timezone.utc)
+
+        state = _view(store.state, np.int8)
+        in_review = state[rows] == State.Review
+        slow = [(int(row), Rating(int(rating))) for row, rating
+                in zip(rows[~in_review], ratings[~in_review])]
+        rows, ratings = rows[in_review], ratings[in_review]
+
+        if len(rows):
+            self._review_vectorized(store, rows, ratings, to_micros(now))
+
+        for row, rating in slow:
+            card, _ = self.scheduler.review_card(store.card(row), rating, now)
+            store.set_card(row, card)
+
+    def _review_vectorized(self, store : DeckStore, rows : np.ndarray,
+                           r : np.ndarray, now_us : int):
+        """
+        Reviews cards in the Review state, see review
+        """
+        w = self._w
+        sch = self.scheduler
+        stability = _view(store.stability, np.float64)
+        difficulty = _view(store.difficulty, np.float64)
+        last = _view(store.last_review, np.int64)
+        due = _view(store.due, np.int64)
+        state = _view(store.state, np.int8)
+        step = _view(store.step, np.int8)
+
+        s, d, lr = stability[rows], difficulty[rows], last[rows]
+        reviewed = lr != NO_TIME
+        days_since = (now_us - lr) // DAY
+        short = reviewed & (days_since < 1)
+        retrievability = np.where(
+            reviewed, (1 + self._factor * np.maximum(days_since, 0) / s) ** self._decay, 0.0)
+
+        short_s = s * np.exp(w[17] * (r - 3 + w[18]))
+        forget_s = np.minimum(
+            w[11] * d ** -w[12] * ((s + 1) ** w[13] - 1)
+            * np.exp((1 - retrievability) * w[14]),
+            s / np.exp(w[17] * w[18]))
+        hard_penalty = np.where(r == Rating.Hard, w[15], 1.0)
+        easy_bonus = np.where(r == Rating.Easy, w[16], 1.0)
+        recall_s = s * (1 + np.exp(w[8]) * (11 - d) * s ** -w[9]
+                        * (np.exp((1 - retrievability) * w[10]) - 1)
+                        * hard_penalty * easy_bonus)
+        new_s = np.where(short, short_s,
+                         np.where(r == Rating.Again, forget_s, recall_s))
+
+        easy_d = np.clip(w[4] - np.exp(w[5] * (Rating.Easy - 1)) + 1, 1.0, 10.0)
+        delta_d = -(w[6] * (r - 3))
+        damped = d + (10.0 - d) * delta_d / 9.0
+        new_d = np.clip(w[7] * easy_d + (1 - w[7]) * damped, 1.0, 10.0)
+
+        interval = self.next_interval(new_s)
+        if sch.enable_fuzzing:
+            interval = self._fuzz(interval)
+        new_due = now_us + interval * DAY
+        new_state = np.full(len(rows), int(State.Review), dtype = np.int8)
+        new_step = np.full(len(rows), NO_STEP, dtype = np.int8)
+
+        if sch.relearning_steps:
+            lapsed = r == Rating.Again
+            relearn = int(sch.relearning_steps[0].total_seconds() * 1000000)
+            new_due = np.where(lapsed, now_us + relearn, new_due)
+            new_state[lapsed] = State.Relearning
+            new_step[lapsed] = 0
+
+        stability[rows] = new_s
+        difficulty[rows] = new_d
+        due[rows] = new_due
+        last[rows] = now_us
+        state[rows] = new_state
+        step[rows] = new_step
+
+    def reschedule(self, store : DeckStore):
+        """
+        Recomputes the due date of every card in the Review state from its
+        stability and last review, e.g. after the desired retention or maximum
+        interval of the scheduler changed. Intervals are not fuzzed
+
+        ## Parameters
+        - store: deck to reschedule, updated in place
+        """
+        state = _view(store.state, np.int8)
+        stability = _view(store.stability, np.float64)
+        last = _view(store.last_review, np.int64)
+        due = _view(store.due, np.int64)
+        rows = np.flatnonzero((state == State.Review) & (last != NO_TIME))
+        due[rows] = last[rows] + self.next_interval(stability[rows]) * DAY
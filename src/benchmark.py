@@ -0,0 +1,130 @@
+"""
+Benchmarks for the hot paths of DeckManager. Decks are generated
+synthetically and questions come from the stub model client, so no model
+server is needed. Results are written as json so runs can be compared across
+commits.
+
+Run from the src directory:
+    python benchmark.py --sizes 1000 10000 100000 --output bench.json
+"""
+import argparse
+import os
+import platform
+import random
+import tempfile
+import tracemalloc
+from datetime import datetime, timezone
+from json import dumps as j_dumps
+from time import perf_counter
+
+from fsrs import Rating
+
+from deck_manager import DeckManager
+from due_queue import DueQueue
+from deck_store import DeckStore
+from harness import make_config, make_tidbits, git_commit
+from snapshot import read as read_binary
+
+
+def timed(func, *args, **kwargs):
+    """
+    Calls a function and measures its duration
+
+    ## Returns
+    Tuple of the result and the elapsed seconds
+    """
+    start = perf_counter()
+    result = func(*args, **kwargs)
+    return result, perf_counter() - start
+
+
+def bench_size(size : int, reviews : int, directory : str):
+    """
+    Runs every benchmark on a deck of a given size
+
+    ## Parameters
+    - size: number of tidbits in the deck
+    - reviews: number of review cycles to measure
+    - directory: folder for temporary deck files
+
+    ## Returns
+    Dictionary of results in seconds and bytes
+    """
+    results = {'size' : size}
+    dm = DeckManager(make_config(directory))
+    tids, results['generate_s'] = timed(make_tidbits, size)
+    _, results['build_queue_s'] = timed(DueQueue, tids)
+    store, results['build_store_s'] = timed(DeckStore.from_tidbits, tids)
+    results['deck_store_bytes'] = store.nbytes()
+    dm.deck = DueQueue(tids)
+    dm.config['initialized'] = True
+
+    _, results['save_deck_s'] = timed(dm.save_deck)
+    results['deck_file_bytes'] = os.path.getsize(dm.config['deck'])
+    _, results['load_deck_s'] = timed(dm.load_deck)
+
+    binary_path = os.path.join(directory, 'deck.tbd')
+    _, results['save_binary_s'] = timed(dm.save_deck, binary_path)
+    results['binary_file_bytes'] = os.path.getsize(binary_path)
+    # time until the soonest due cards can be reviewed
+    deck, open_s = timed(read_binary, binary_path)
+    _, first_s = timed(lambda: [next(deck['tidbits'], None) for _ in range(DeckManager.LOAD_CHUNK)])
+    deck['tidbits'].close()
+    results['first_cards_binary_ms'] = (open_s + first_s) * 1000
+    _, results['load_binary_s'] = timed(dm.load_deck, binary_path)
+
+    _, results['get_deck_s'] = timed(lambda: j_dumps([t.to_dict() for t in dm.deck]))
+    _, search_s = timed(dm.search_tidbits, "fact word42", None, "source-7")
+    results['search_ms'] = search_s * 1000
+
+    rng = random.Random(1)
+    ratings = [Rating(rng.randrange(1, 5)) for _ in range(reviews)]
+    start = perf_counter()
+    for rating in ratings:
+        dm.review_tidbit(dm.get_next_tidbit(), rating)
+    results['review_cycle_us'] = (perf_counter() - start) / reviews * 1e6
+
+    journaled = DeckManager(make_config(directory, journal = True))
+    journaled.deck = dm.deck
+    journaled.schedule = dm.schedule
+    start = perf_counter()
+    for rating in ratings:
+        journaled.review_tidbit(journaled.get_next_tidbit(), rating)
+    results['journaled_review_cycle_us'] = (perf_counter() - start) / reviews * 1e6
+
+    tracemalloc.start()
+    dm.load_deck()
+    results['load_deck_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmark DeckManager hot paths")
+    parser.add_argument('--sizes', type = int, nargs = '+', default = [1000, 10000],
+                        help = "deck sizes to benchmark, e.g. 1000 10000 100000 1000000")
+    parser.add_argument('--reviews', type = int, default = 1000,
+                        help = "review cycles measured per deck")
+    parser.add_argument('--output', default = None,
+                        help = "json file to write results to, printed if not set")
+    args = parser.parse_args()
+
+    report = {
+        'commit' : git_commit(),
+        'python' : platform.python_version(),
+        'timestamp' : datetime.now(timezone.utc).isoformat(),
+        'results' : []
+    }
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            report['results'].append(bench_size(size, args.reviews, directory))
+
+    if args.output:
+        with open(args.output, 'w', encoding = 'utf-8') as file:
+            file.write(j_dumps(report, indent = 4))
+    else:
+        print(j_dumps(report, indent = 4))
+
+
+if __name__ == '__main__':
+    main()
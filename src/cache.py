@@ -0,0 +1,167 @@
+import sqlite3
+from hashlib import sha256
+from json import dumps as j_dumps, loads as j_loads
+from threading import Lock
+
+
+class ResponseCache():
+    """
+    Persistent cache of language model responses. Entries are content
+    addressed, keyed by a hash of the kind of request, the model, the system
+    prompt and the data sent, so the same request is only ever sent to the model
+    once. Entries are stored in a sqlite file and evicted least recently used
+    first once the cache grows past its entry or size limit.
+
+    ## Attributes
+    - file_path: location of the cache file, ':memory:' for a temporary cache
+    - max_entries: maximum number of responses kept, None for no limit
+    - max_bytes: maximum total size of stored responses, None for no limit
+    - hits: number of lookups answered by the cache
+    - misses: number of lookups that had to go to the model
+    """
+
+    def __init__(self,
+                 file_path : str = 'cache.db',
+                 max_entries : int = 10000,
+                 max_bytes : int = None):
+        """
+        Opens the cache file, creating it if it does not exist
+
+        ## Parameters
+        - file_path: location of the cache file
+        - max_entries: maximum number of responses kept
+        - max_bytes: maximum total size in bytes of stored responses
+        """
+        self.file_path = file_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._conn = sqlite3.connect(file_path, check_same_thread = False)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+                                key TEXT PRIMARY KEY,
+                                value TEXT NOT NULL,
+                                size INTEGER NOT NULL,
+                                last_used INTEGER NOT NULL)""")
+        self._conn.commit()
+        row = self._conn.execute("SELECT MAX(last_used) FROM responses").fetchone()
+        self._clock = row[0] or 0
+
+    @staticmethod
+    def make_key(kind : str, model_type : str, prompt : str, data):
+        """
+        Builds the key for a request
+
+        ## Parameters
+        - kind: type of request, e.g. 'question' or 'title'
+        - model_type: name of the model the request is sent to
+        - prompt: system prompt sent with the request
+        - data: json serializable content of the request
+
+        ## Returns
+        Hex digest identifying the request
+        """
+        content = j_dumps([kind, model_type, prompt, data], ensure_ascii = False)
+        return sha256(content.encode('utf-8')).hexdigest()
+
+    def _tick(self):
+        self._clock += 1
+        return self._clock
+
+    def get(self, key : str):
+        """
+        Looks up a response. A hit marks the entry as recently used
+
+        ## Parameters
+        - key: key built with make_key
+
+        ## Returns
+        The stored response or None if the key is not in the cache
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?",
+                               (self._tick(), key))
+            self._conn.commit()
+            return j_loads(row[0])
+
+    def put(self, key : str, value):
+        """
+        Stores a response and evicts old entries if a limit is exceeded
+
+        ## Parameters
+        - key: key built with make_key
+        - value: json serializable response
+        """
+        encoded = j_dumps(value, ensure_ascii = False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, encoded, len(encoded.encode('utf-8')), self._tick()))
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """
+        Removes the least recently used entries until the cache is within its
+        limits
+        """
+        if self.max_entries is not None:
+            count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    """DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY last_used LIMIT ?)""",
+                    (count - self.max_entries,))
+        if self.max_bytes is not None:
+            total = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_used")
+            stale = []
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                stale.append((key,))
+                total -= size
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def stats(self):
+        """
+        Gets the hit and miss counters of the cache
+
+        ## Returns
+        Dictionary with the number of entries, hits and misses
+        """
+        return {
+            'entries' : len(self),
+            'hits' : self.hits,
+            'misses' : self.misses
+        }
+
+    def clear(self):
+        """
+        Removes every entry and resets the counters
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def close(self):
+        """
+        Closes the cache file
+        """
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,123 @@
+from concurrent.futures import Future
+from functools import wraps
+from queue import Queue
+from threading import Thread, get_ident
+
+
+class CommandQueue():
+    """
+    Runs commands one at a time on a single writer thread. Every change to
+    shared state is sent here, so changes never interleave and are applied
+    in the order they were submitted. A command run from the writer thread
+    itself, e.g. a save started by a review, runs right away instead of
+    waiting behind itself.
+
+    ## Attributes
+    - name: name of the writer thread
+    """
+
+    def __init__(self, name : str = 'deck-writer'):
+        """
+        Starts the writer thread
+
+        ## Parameters
+        - name: name of the writer thread
+        """
+        self.name = name
+        self._queue = Queue()
+        self._closed = False
+        self._thread = Thread(target = self._run, name = name, daemon = True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                future, func, args, kwargs = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(func(*args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    def on_writer(self):
+        """
+        ## Returns
+        True if called from the writer thread
+        """
+        return get_ident() == self._thread.ident
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queues a command without waiting for it
+
+        ## Parameters
+        - func: function to run on the writer thread
+        - args, kwargs: arguments passed to func
+
+        ## Returns
+        A future resolved with the result of func
+
+        ## Raises
+        - RuntimeError: if the queue is closed
+        """
+        if self._closed:
+            raise RuntimeError("Command queue is closed")
+        future = Future()
+        if self.on_writer():
+            try:
+                future.set_result(func(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            return future
+        self._queue.put((future, func, args, kwargs))
+        return future
+
+    def call(self, func, *args, **kwargs):
+        """
+        Runs a command on the writer thread and waits for it
+
+        ## Parameters
+        - func: function to run on the writer thread
+        - args, kwargs: arguments passed to func
+
+        ## Returns
+        The result of func
+
+        ## Raises
+        Whatever func raised
+        """
+        if self.on_writer():
+            return func(*args, **kwargs)
+        return self.submit(func, *args, **kwargs).result()
+
+    def join(self):
+        """
+        Waits until every queued command has run
+        """
+        if not self.on_writer():
+            self._queue.join()
+
+    def close(self):
+        """
+        Stops the writer once the queued commands have run
+        """
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+
+
+def command(method):
+    """
+    Decorator running a method of an object with a `commands` CommandQueue on
+    its writer thread
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        return self.commands.call(method, self, *args, **kwargs)
+    return wrapper
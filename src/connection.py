@@ -0,0 +1,157 @@
+from threading import Event, Lock, Thread
+from time import monotonic
+
+
+class ModelUnavailableError(ConnectionError):
+    """
+    Raised when the model server cannot be reached or the circuit breaker is
+    open
+    """
+
+
+class CircuitBreaker():
+    """
+    Stops requests from being sent to a server that keeps failing. After
+    failure_threshold consecutive failures the breaker opens and requests are
+    refused right away. Once reset_timeout seconds have passed a single trial
+    request is let through (half open); if it succeeds the breaker closes.
+
+    ## Attributes
+    - failure_threshold: consecutive failures before the breaker opens
+    - reset_timeout: seconds to wait before a trial request
+    - state: one of 'closed', 'open' or 'half open'
+    - failures: current number of consecutive failures
+    """
+
+    def __init__(self, failure_threshold : int = 3, reset_timeout : float = 30):
+        """
+        Creates a closed breaker
+
+        ## Parameters
+        - failure_threshold: consecutive failures before the breaker opens
+        - reset_timeout: seconds before a trial request is allowed
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self._opened_at = 0
+        self._lock = Lock()
+
+    def allow(self):
+        """
+        Checks if a request may be sent
+
+        ## Returns
+        True if the breaker is closed or a trial request is due
+        """
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = 'half open'
+                return True
+            return False
+
+    def retry_due(self):
+        """
+        Checks, without changing the state, if a request would be let through
+
+        ## Returns
+        True unless the breaker is open and the reset timeout has not passed
+        """
+        with self._lock:
+            return self.state != 'open' or \
+                monotonic() - self._opened_at >= self.reset_timeout
+
+    def record_success(self):
+        """
+        Closes the breaker after a successful request
+        """
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self):
+        """
+        Counts a failed request, opening the breaker if the threshold is reached
+
+        ## Returns
+        True if this failure opened the breaker
+        """
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half open' or self.failures >= self.failure_threshold:
+                opened = self.state != 'open'
+                self.state = 'open'
+                self._opened_at = monotonic()
+                return opened
+            return False
+
+
+class HealthChecker():
+    """
+    Probes a server in a background thread until it responds again. The delay
+    between probes doubles after each failure, up to max_delay. When a probe
+    succeeds the on_healthy callback is called and the checker stops.
+
+    ## Attributes
+    - probe: function raising an exception when the server is unavailable
+    - on_healthy: called once the server responds
+    - initial_delay: seconds before the first probe
+    - max_delay: longest wait between probes
+    """
+
+    def __init__(self, probe, on_healthy, initial_delay : float = 1,
+                 max_delay : float = 60):
+        """
+        Creates a stopped health checker
+
+        ## Parameters
+        - probe: function checking the server
+        - on_healthy: function called when the server is available
+        - initial_delay: seconds before the first probe
+        - max_delay: longest wait between probes in seconds
+        """
+        self.probe = probe
+        self.on_healthy = on_healthy
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self._stop = Event()
+        self._thread = None
+
+    def running(self):
+        """
+        ## Returns
+        True if the checker is probing the server
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """
+        Starts probing in the background, unless already running
+        """
+        if self.running():
+            return
+        self._stop.clear()
+        self._thread = Thread(target = self._run, daemon = True)
+        self._thread.start()
+
+    def _run(self):
+        delay = self.initial_delay
+        while not self._stop.wait(delay):
+            try:
+                self.probe()
+            except Exception:
+                delay = min(delay * 2, self.max_delay)
+                continue
+            self.on_healthy()
+            return
+
+    def stop(self):
+        """
+        Stops probing
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
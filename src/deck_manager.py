@@ -1,11 +1,56 @@
-from model import Model
 from tidbit import Tidbit
-from json import load as j_load, dump as j_dump
+from question import Question
+from generation import GenerationQueue
+from grading import AnswerGrader
+from cache import ResponseCache
+from storage import DeckStorage
+from snapshot import is_binary, read as read_binary, write_snapshot as write_binary
+from due_queue import DueQueue
+from deck_store import DeckStore
+from search import SearchIndex
+from optimizer import BackgroundOptimizer, with_parameters
+from metrics import METRICS
+from commands import CommandQueue, command
 from fsrs import Scheduler, Card, Rating
 import yaml
-from heapq import heappush, heappop
 from datetime import datetime
-from time import sleep
+from functools import partial
+import heapq
+from itertools import islice
+from concurrent.futures import CancelledError
+from queue import Queue
+from threading import Event, Lock, Thread
+from time import monotonic, sleep
+
+
+class DuplicateTidbitError(ValueError):
+    """
+    Raised when a new tidbit is too similar to one already in the deck
+
+    ## Attributes
+    - tidbit: tidbit already in the deck
+    - similarity: cosine similarity between the two
+    """
+
+    def __init__(self, tidbit, similarity : float):
+        super().__init__(f"Near duplicate of card {tidbit.card.card_id} "
+                         f"(similarity {similarity:.2f})")
+        self.tidbit = tidbit
+        self.similarity = similarity
+
+
+class DeckLoadError(RuntimeError):
+    """
+    Raised when saving over a deck file that could not be fully loaded, which
+    would replace the cards on disk with the ones read before the error
+
+    ## Attributes
+    - error: exception raised while loading
+    """
+
+    def __init__(self, error : Exception):
+        super().__init__(f"Deck was not fully loaded: {error}")
+        self.error = error
 
 
 class DeckManager():
@@ -14,8 +59,8 @@ class DeckManager():
     config.yaml is loaded. If the program has been run previously then the
     scheduler and deck of cards last used are loaded by default, otherwise a new
     scheduler and deck are created. The scheduler is only responsible for
-    maintaining the parameters of the spaced repetion model. A heap is used to
-    pull the next card to be reviewed.
+    maintaining the parameters of the spaced repetion model. An indexed heap is
+    used to pull the next card to be reviewed and to find any card by its id.
     
     ## Attributes
     - config: configuration for location of deck, model prompts, and params for
@@ -23,9 +68,49 @@ class DeckManager():
     - deck: priority queue of tidbits ordered by time for review
     - schedule: scheduler for reviewing tidbits
     - config_file_path: location of config file
+    - generator: queue used to generate questions in the background, created
+    on first use
+    - grader: grades typed answers in the background, created on first use
+    - storage: journal of changes to the deck file, None unless 'journal params'
+    is set in the config
+    - review_logs: reviews made this session, the full history is kept by
+    storage when it is enabled
+    - optimizer: fits scheduler parameters to the review history in the
+    background
+    - commands: single writer queue. Every change to the deck, index,
+    embeddings and journal runs on its thread, one at a time, while model
+    calls run on the caller's thread. Reads of the whole deck use snapshot
+    - index: search index over the text, tags and sources of the deck
+    - embeddings: embedding of each card used to find near duplicates, None
+    unless 'duplicate params' is set and enabled in the config. Cards added in
+    bulk or loaded without a saved embedding are embedded in the background
+    - embed_error: error of the last embedding that failed, or None. Cards
+    are then added without a duplicate check and embedded at the next load
+    - generation_error: error of the last question generation that failed
+    after its retries, or None
+    - generation_errors: number of question generations that failed
+    - optimize_error: error of the last scheduler fit that failed, e.g.
+    ImportError when the optional fsrs optimizer dependencies are missing,
+    or None
+    - variants: number of questions generated for each tidbit, read from
+    'question params' in the config. The questions are rotated between reviews
+    - model: client for the model server. The model stack is only imported
+    and connected the first time this is used
+    - ready: set once the soonest due cards can be reviewed
+    - loaded: set once the whole deck, its search index and embeddings are
+    loaded
+    - report: optional StartupReport the startup phases are marked on
+    - last_active: monotonic time of the last interactive request, see touch
+    - enricher: fills in titles, tags and questions of cards due soon while
+    the deck is idle, None unless 'enrichment params' is enabled in the
+    config
+    - metrics: registry the review, save and error metrics are recorded in,
+    METRICS by default. Simulations swap in a private one
     """
 
-    def __init__(self, config_file_path : str):
+    LOAD_CHUNK = 500 # tidbits parsed between pushes of a background load
+
+    def __init__(self, config_file_path : str, background : bool = False, report = None):
         """
         Starts up the deck manager. If a previous configuration has been used,
         that will be loaded. If no deck has been created previously then a new
@@ -33,29 +118,195 @@ class DeckManager():
 
         ## Parameters
         - config_file_path: location of configuration file
+        - background: if True the deck is loaded on a background thread,
+        soonest due cards first, and the constructor returns right away
+        - report: optional StartupReport to mark the startup phases on
         """
         self.config = None
         with open(config_file_path, 'r') as config:
             self.config = yaml.safe_load(config)
         self.config_file_path = config_file_path
-        self.deck = [] # heap used for priority queue
+        self.report = report
+        self._mark('config')
+        self.deck = DueQueue() # indexed heap used for priority queue
+        self.index = SearchIndex()
         self.schedule = None
+        self.generator = None
+        self.grader = None
+        self.storage = None
+        self._sorted = None # cached ((deck, version, edits, sort, descending), tidbits)
+        self._edits = 0 # changes to fields of tidbits, which do not change the deck version
+        self.review_logs = []
+        self.optimizer = BackgroundOptimizer()
+        self.commands = CommandQueue()
+        self.metrics = METRICS
+        self._snapshot = None # (deck, version, tidbits) of the last snapshot
+        self.ready = Event()
+        self.loaded = Event()
+        self.load_error = None
+        self._model = None
+        self._model_lock = Lock()
+        self._loader = None
+        self.last_active = monotonic()
+        self.enricher = None
+        self.variants = (self.config.get('question params', None) or {}).get('variants', 1)
+        self.duplicates = dict(self.config.get('duplicate params', None) or {})
+        if not self.duplicates.pop('enabled', True):
+            self.duplicates = {}
+        if self.config.get('metrics params', None) is not None:
+            METRICS.enabled = bool(self.config['metrics params'].get('enabled', False))
+        self.embeddings = self._new_embeddings()
+        self.embed_error = None
+        self.generation_error = None
+        self.generation_errors = 0
+        self.optimize_error = None
+        self._fitted = None # future of the last fit whose result was handled
+        self._queued = set() # ids of cards waiting on the generation queue
+        self._queued_lock = Lock()
+        self._to_embed = None
+        if self.embeddings is not None:
+            self._to_embed = Queue()
+            Thread(target = self._embed_worker, name = 'embedder', daemon = True).start()
+        if self.config.get('journal params', None) is not None:
+            self.storage = DeckStorage(self.config['deck'],
+                                       **self.config['journal params'] or {})
 
-        # TODO IO block -- could be good to async
-        if self.config['initialized']:
-            self.load_deck(self.config['deck'])
-        else:
+        enrichment = dict(self.config.get('enrichment params', None) or {})
+        if enrichment.pop('enabled', False):
+            from enrichment import Enricher
+            self.enricher = Enricher(self, **enrichment)
+            self.enricher.start()
+
+        # a journaled deck that was never saved is only in its journal
+        stored = self.config['initialized'] or (self.storage is not None
+                                                 and self.storage.exists())
+        if background and stored:
+            self.schedule = Scheduler()
+            self._loader = Thread(target = self._load_in_background,
+                                  args = (self.config['deck'],), daemon = True)
+            self._loader.start()
+            return
+        if not (stored and self.load_deck(self.config['deck'])):
             self.schedule = Scheduler()
+        self.ready.set()
+        self.loaded.set()
+        self._mark('deck loaded')
 
-        # Need to handle error when model server is not up
-        self.model = Model(
-                **self.config['model params'],
-                question = self._load_prompt(self.config['question']),
-                answer = self._load_prompt(self.config['answer'])
-            )
-        
-    
-    def add_tidbit(self, data, usr_question = None, title = None, gen_title = False, gen_tags = False, **kwargs):
+    @property
+    def model(self):
+        """
+        Client for the model server, created the first time it is used so the
+        model stack is not imported at startup
+        """
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from model import Model
+                    cache = None
+                    if self.config.get('cache params', None):
+                        cache = ResponseCache(**self.config['cache params'])
+                    self._model = Model(
+                            **self.config['model params'],
+                            cache = cache,
+                            question = self._load_prompt(self.config['question']),
+                            answer = self._load_prompt(self.config['answer'])
+                        )
+                    self._mark('model')
+        return self._model
+
+    @model.setter
+    def model(self, model):
+        self._model = model
+
+    def _mark(self, phase : str):
+        if self.report is not None:
+            self.report.mark(phase)
+
+    @METRICS.timed('deck.load')
+    def _load_in_background(self, file_path : str):
+        """
+        Loads the deck in chunks of LOAD_CHUNK tidbits, soonest due first, so
+        reviews can start before the whole deck is parsed. Every tidbit is
+        still decoded before loaded is set, binary snapshots included. The
+        search index and embeddings are restored once every card is in the
+        deck. Errors are kept in load_error and added to the startup report;
+        the deck file is then never saved over or compacted, so the cards that
+        were not read stay on disk
+
+        ## Params
+        - file_path: location of deck file
+        """
+        try:
+            deck = self._read_deck(file_path)
+            if deck['schedule'] is not None:
+                self.commands.call(setattr, self, 'schedule',
+                                   Scheduler.from_dict(deck['schedule']))
+            tidbits = deck['tidbits']
+            while True:
+                chunk = list(islice(tidbits, self.LOAD_CHUNK))
+                if not chunk:
+                    break
+                self.commands.call(self._push_all, chunk)
+                if not self.ready.is_set():
+                    self.ready.set()
+                    self._mark('first cards')
+            self.commands.call(self._restore_indexes, deck, file_path)
+        except Exception as e:
+            self.load_error = e
+            if self.report is not None:
+                self.report.fail('deck loaded', e)
+        finally:
+            self.ready.set()
+            self.loaded.set()
+            self._mark('deck loaded')
+
+    def _push_all(self, tidbits):
+        for tid in tidbits:
+            self.deck.push(tid)
+
+    def _restore_indexes(self, deck : dict, file_path : str):
+        """
+        Restores the search index and embeddings of a deck read from a file
+        once its tidbits are in the queue
+
+        ## Params
+        - deck: contents read with _read_deck
+        - file_path: location of deck file
+        """
+        self.index = self._load_index(deck.get('index'), deck['touched'])
+        if self.embeddings is not None:
+            self.embeddings = self._new_embeddings()
+            self.embeddings.load(file_path + '.vectors.npz',
+                                 {t.card.card_id for t in self.deck})
+            # embeddings are only saved with the deck, cards added since are
+            # embedded again
+            self._queue_embeddings([t for t in self.deck
+                                    if t.card.card_id not in self.embeddings])
+
+    def snapshot(self):
+        """
+        Gets a consistent read only view of the deck. The view is rebuilt on
+        the writer thread only after the deck changed, so repeated reads are
+        free and never see a change half applied
+
+        ## Returns
+        Tuple of every tidbit in the deck, in heap order
+        """
+        snap = self._snapshot
+        if snap is None or snap[0] is not self.deck or snap[1] != self.deck.version:
+            snap = self.commands.call(lambda: (self.deck, self.deck.version, tuple(self.deck)))
+            self._snapshot = snap
+        return snap[2]
+
+    def deck_size(self):
+        """
+        ## Returns
+        Number of tidbits in the deck
+        """
+        return len(self.snapshot())
+
+
+    def add_tidbit(self, data, usr_question = None, title = None, gen_title = False, gen_tags = False, on_token = None, allow_duplicate = False, **kwargs):
         """
         Adds a new piece of information to the deck. The deck is treated as 
         'initialized' once at least one card has been added to the deck.
@@ -67,11 +318,33 @@ class DeckManager():
         tidbit
         - gen_tags: boolean flag, if True model will generate a set of tags 
         describing the content
+        - on_token: optional, called with each piece of the generated question
+        as the model streams it. The tidbit is only added once the question is
+        complete
+        - allow_duplicate: if True near duplicates are added anyway
         - kwargs: other optional params passed to the tidbit
 
         ## Returns
-        A reference to the new tidbit
+        A reference to the new tidbit, or to the tidbit already in the deck if
+        it is a near duplicate and duplicates are merged
+
+        ## Raises
+        - DuplicateTidbitError: if the data is a near duplicate of a tidbit in
+        the deck and duplicates are flagged
         """
+        self.touch()
+        vector = None
+        if self.embeddings is not None:
+            try:
+                vector = self.model.embed(data)
+            except Exception as e: # the card is still added, without a duplicate check
+                self.embed_error = e
+                self.metrics.inc('deck.embed.errors')
+            if vector is not None and not allow_duplicate:
+                existing = self.commands.call(self._check_duplicate, vector)
+                if existing is not None:
+                    return existing
+
         card = Card()
         # title = None
         tags = None
@@ -79,15 +352,370 @@ class DeckManager():
             title = self.model.generate_title(data)
         if gen_tags:
             tags = self.model.generate_tags(data)
-        tid_question = usr_question
-        if not tid_question:
-            tid_question = self.model.generate_question(data)
+        questions = None
+        if not usr_question and on_token is not None:
+            parts = []
+            for part in self.model.stream_question(data, self.variants):
+                parts.append(part)
+                on_token(part)
+            response = ''.join(parts)
+            questions = Question.parse(response, self.variants) if self.variants > 1 else [response]
+        elif not usr_question:
+            questions = self.model.generate_questions(data, self.variants)
+
+        tid = Tidbit(card, data, title, tags, usr_question, questions = questions, **kwargs)
+        return self.commands.call(self._insert, tid, vector, allow_duplicate)
 
-        tid = Tidbit(card, data, title, tags, tid_question, **kwargs)
-        heappush(self.deck, tid)
+    def _insert(self, tidbit : Tidbit, vector = None, allow_duplicate : bool = False):
+        """
+        Adds a finished tidbit to the deck, its indexes and the journal. The
+        duplicate check is repeated here in case a near duplicate was added
+        while the question was being generated
+
+        ## Returns
+        The tidbit, or the tidbit already in the deck if duplicates are merged
+        """
+        if vector is not None and not allow_duplicate:
+            existing = self._check_duplicate(vector)
+            if existing is not None:
+                return existing
+        self._claim_id(tidbit)
+        self.deck.push(tidbit)
+        self.index.add(tidbit)
+        if vector is not None:
+            self.embeddings.add(tidbit.card.card_id, vector)
+        if self.storage:
+            self.storage.log_add(tidbit)
         self.config['initialized'] = 'true'
-        return tid
+        return tidbit
+
+    def _claim_id(self, tidbit : Tidbit):
+        """
+        Card ids are creation times in milliseconds, so cards created at once
+        on different threads can share one. Runs on the writer, moving the id
+        of a new card forward until it is free. The index also knows the
+        cards taken out of the deck for review
+        """
+        while tidbit.card.card_id in self.deck or tidbit.card.card_id in self.index:
+            tidbit.card.card_id += 1
+
+    def _check_duplicate(self, vector):
+        """
+        Applies the duplicate action to a near duplicate of an embedding
+
+        ## Returns
+        The tidbit already in the deck if duplicates are merged, None if there
+        is no near duplicate
+
+        ## Raises
+        - DuplicateTidbitError: if there is a near duplicate and duplicates are
+        flagged
+        """
+        duplicate = self._nearest_duplicate(vector)
+        if duplicate is None:
+            return None
+        if self.duplicates.get('action', 'flag') == 'merge':
+            return duplicate[0]
+        raise DuplicateTidbitError(*duplicate)
+
+    def _new_embeddings(self):
+        """
+        Creates an empty embedding index from the 'duplicate params' of the
+        config
+
+        ## Returns
+        EmbeddingIndex or None if duplicates are not checked
+        """
+        if not self.duplicates:
+            return None
+        from embedding import EmbeddingIndex
+        return EmbeddingIndex(**{k : v for k, v in self.duplicates.items()
+                                 if k not in ('threshold', 'action')})
+
+    def find_duplicate(self, data, vector = None):
+        """
+        Looks for the tidbit most similar to a piece of information, if it is
+        above the 'threshold' of the duplicate params. Only cards whose
+        embedding is known are compared
+
+        ## Params
+        - data: information to compare
+        - vector: optional, embedding of the data if already computed
+
+        ## Returns
+        Tuple of the tidbit and its cosine similarity, or None if there is no
+        near duplicate or duplicates are not checked
+        """
+        if self.embeddings is None:
+            return None
+        if vector is None:
+            vector = self.model.embed(data)
+        return self.commands.call(self._nearest_duplicate, vector)
+
+    def _nearest_duplicate(self, vector):
+        for card_id, similarity in self.embeddings.nearest(vector):
+            if similarity >= self.duplicates.get('threshold', 0.95) and card_id in self.deck:
+                return self.deck.get(card_id), similarity
+        return None
+
+    def add_tidbits_bulk(self, datas, **kwargs):
+        """
+        Adds many pieces of information to the deck at once. Each tidbit is
+        inserted right away with a pending question (None) and its question is
+        filled in by the generation queue once the model responds.
+
+        ## Params
+        - datas: iterable of information to recall
+        - kwargs: other optional params passed to every tidbit
+
+        ## Returns
+        A list of references to the new tidbits
+        """
+        return self.add_tidbits([Tidbit(Card(), data, **kwargs) for data in datas])
+
+    def add_tidbits(self, tidbits):
+        """
+        Adds prepared tidbits to the deck in one command and one journal
+        write. Tidbits without a question are queued for generation without
+        waiting on the generation queue. When duplicates are
+        checked the tidbits are embedded in the background; they are not
+        checked against the deck themselves
+
+        ## Params
+        - tidbits: list of new tidbits, their card ids are moved forward if
+        already taken
+
+        ## Returns
+        The list of tidbits
+        """
+        self.commands.call(self._insert_all, tidbits)
+        self._queue_questions(tidbits)
+        self._queue_embeddings(tidbits)
+        return tidbits
+
+    def _queue_embeddings(self, tidbits):
+        if self._to_embed is not None:
+            for tid in tidbits:
+                self._to_embed.put(tid)
+
+    def _embed_worker(self):
+        """
+        Embeds queued tidbits one at a time, storing each embedding on the
+        writer. A failed embedding is kept in embed_error and the card is
+        embedded again at the next load
+        """
+        while True:
+            tid = self._to_embed.get()
+            try:
+                if tid.card.card_id not in self.embeddings:
+                    vector = self.model.embed(tid.data)
+                    self.commands.submit(self._add_embedding, tid, vector)
+            except Exception as e: # e.g. the model server is down
+                self.embed_error = e
+                self.metrics.inc('deck.embed.errors')
+            finally:
+                self._to_embed.task_done()
+
+    def _add_embedding(self, tidbit : Tidbit, vector):
+        # the card may have been deleted while it was embedded
+        card_id = tidbit.card.card_id
+        if self.embeddings is not None and (card_id in self.deck or card_id in self.index):
+            self.embeddings.add(card_id, vector)
+
+    def wait_for_embeddings(self):
+        """
+        Blocks until every tidbit queued for embedding has been embedded and
+        stored
+        """
+        if self._to_embed is not None:
+            self._to_embed.join()
+        self.commands.join()
+
+    def _queue_questions(self, tidbits):
+        # submitted outside the writer, submit never waits. Cards already
+        # queued are skipped so resuming twice does not generate twice
+        with self._queued_lock:
+            pending = [t for t in tidbits
+                       if t.question is None and t.card.card_id not in self._queued]
+            self._queued.update(t.card.card_id for t in pending)
+        if pending:
+            generator = self._get_generator()
+            for tid in pending:
+                generator.submit(tid.data, self._question_callback(tid))
+        return len(pending)
+
+    def _insert_all(self, tidbits):
+        for tid in tidbits:
+            self._claim_id(tid)
+            self.deck.push(tid)
+            self.index.add(tid)
+        if self.storage and tidbits:
+            self.storage.log_add_all(tidbits)
+        if tidbits:
+            self.config['initialized'] = 'true'
+
+    def pending_tidbits(self):
+        """
+        Gets the tidbits that are still waiting on a generated question
+
+        ## Returns
+        List of tidbits without a question
+        """
+        return [t for t in self.snapshot() if t.question is None]
+
+    def resume_questions(self):
+        """
+        Queues generation for every tidbit still waiting on a question that
+        is not already queued, e.g. after an import was interrupted or a
+        generation failed
+
+        ## Returns
+        Number of tidbits queued
+        """
+        return self._queue_questions(self.snapshot())
+
+    def wait_for_questions(self, timeout : float = None):
+        """
+        Blocks until every queued question has been generated and stored
+
+        ## Params
+        - timeout: optional, seconds to wait before raising TimeoutError
+        """
+        if self.generator:
+            self.generator.join(timeout)
+        self.commands.join()
+
+    def generation_status(self):
+        """
+        ## Returns
+        Json serializable dictionary with the number of questions 'pending'
+        in the generation queue, the number that 'failed' and the
+        'last_error'
+        """
+        return {
+            'pending' : self.generator.pending() if self.generator else 0,
+            'failed' : self.generation_errors,
+            'last_error' : None if self.generation_error is None else str(self.generation_error)
+        }
+
+    def _get_generator(self):
+        """
+        Creates the generation queue on first use. Concurrency and queue size
+        are read from 'generation params' in the config
+
+        ## Returns
+        The generation queue for this deck
+        """
+        if self.generator is None:
+            job = self.model.agenerate_question
+            if self.variants > 1:
+                job = partial(self.model.agenerate_questions, k = self.variants)
+            self.generator = GenerationQueue(
+                job,
+                **self.config.get('generation params', None) or {}
+            )
+        return self.generator
+
+    def grade_answer(self, tidbit : Tidbit, answer : str, callback = None):
+        """
+        Queues a typed answer to be graded by the model against the data of
+        the tidbit. Concurrency and queue size are read from 'grading params'
+        in the config
+
+        ## Params
+        - tidbit: tidbit the answer is for
+        - answer: answer typed by the user
+        - callback: optional, called with the finished future
+
+        ## Returns
+        A future resolved with the Rating of the answer
+        """
+        self.touch()
+        if self.grader is None:
+            self.grader = AnswerGrader(self.model,
+                                       **self.config.get('grading params', None) or {})
+        return self.grader.submit(tidbit.data, answer, callback)
+
+    def _question_callback(self, tidbit : Tidbit):
+        """
+        Builds a callback that stores generated questions on a tidbit. If
+        generation fails after its retries the question is left pending, to
+        be queued again by resume_questions, and the error is counted in
+        generation_errors and kept in generation_error
+
+        ## Params
+        - tidbit: tidbit waiting on a question
+
+        ## Returns
+        Function taking the finished future
+        """
+        def _unqueue():
+            with self._queued_lock:
+                self._queued.discard(tidbit.card.card_id)
+
+        def _store(result):
+            if self.variants > 1:
+                tidbit.questions = result
+            else:
+                tidbit.question = result
+            # only once the question is set, so it is not queued again
+            _unqueue()
+            self._edits += 1
+            self.index.update(tidbit)
+            if self.storage:
+                self.storage.log_update(tidbit, question = tidbit.question,
+                                        questions = tidbit.questions)
+
+        def _set_question(future):
+            # jobs running when the queue is closed end with CancelledError
+            if future.cancelled() or isinstance(future.exception(), CancelledError):
+                _unqueue()
+                return
+            if future.exception() is not None:
+                _unqueue()
+                self.generation_error = future.exception()
+                self.generation_errors += 1
+                self.metrics.inc('deck.generate.errors')
+                return
+            self.commands.submit(_store, future.result())
+        return _set_question
+
+    def touch(self):
+        """
+        Records an interactive request. Background enrichment waits until no
+        request came in for a while, so it never competes with the user for
+        the model
+        """
+        self.last_active = monotonic()
+
+    @command
+    def update_tidbit(self, tidbit : Tidbit, **fields):
+        """
+        Changes fields of a tidbit, reindexing and journaling it. Tidbits
+        deleted in the meantime are left alone
+
+        ## Params
+        - tidbit: tidbit to change, in the deck or taken out for review
+        - fields: new values of 'title', 'tags', 'source' or 'questions'
+
+        ## Returns
+        True if the tidbit was changed
+        """
+        card_id = tidbit.card.card_id
+        if card_id not in self.deck and card_id not in self.index:
+            return False
+        for name, value in fields.items():
+            setattr(tidbit, name, value)
+        self._edits += 1
+        if 'questions' in fields:
+            fields['question'] = tidbit.question
+        self.index.update(tidbit)
+        if self.storage:
+            self.storage.log_update(tidbit, **fields)
+        return True
 
+    @METRICS.timed('deck.get_next_tidbit')
+    @command
     def get_next_tidbit(self):
         """
         Removes and returns the next tidbit to review from the deck
@@ -95,32 +723,415 @@ class DeckManager():
         ## Returns
         Tidbit with closest time for review or None if deck is empty
         """
-        if len(self.deck) == 0:
-            return None
-        return heappop(self.deck)
+        self.touch()
+        with self.metrics.timer('deck.review.pop'):
+            return self.deck.pop()
+
+    @command
+    def peek_tidbit(self):
+        """
+        Gets the next tidbit to review without removing it
+
+        ## Returns
+        Tidbit with closest time for review or None if deck is empty
+        """
+        return self.deck.peek()
+
+    def get_tidbit(self, card_id : int):
+        """
+        Looks up a tidbit in the deck by the id of its card
+
+        ## Params
+        - card_id: id of the card
+
+        ## Returns
+        The tidbit or None if it is not in the deck
+        """
+        return self.deck.get(card_id)
     
+    @METRICS.timed('deck.review_tidbit')
+    @command
     def review_tidbit(self, tidbit : Tidbit,
-                      rating : Rating):
-        rev_card = tidbit.card
-        rev_card, _ = self.schedule.review_card(rev_card, rating)
+                      rating : Rating, review_datetime : datetime = None):
+        """
+        Reviews a tidbit and returns it to the deck. The review log is kept
+        for fitting the scheduler and the next question variant is moved to
+        the front
+
+        ## Params
+        - tidbit: tidbit taken from the deck with get_next_tidbit
+        - rating: recall rating, as a Rating or its integer value
+        - review_datetime: optional, timezone aware time of the review, now by
+        default. Simulations pass a virtual time
+
+        ## Returns
+        The review log of the review
+        """
+        self.touch()
+        with self.metrics.timer('deck.review.schedule'):
+            rev_card, review_log = self.schedule.review_card(tidbit.card, Rating(rating),
+                                                             review_datetime)
         tidbit.card = rev_card
-        heappush(self.deck, tidbit)
+        rotated = tidbit.rotate_question()
+        with self.metrics.timer('deck.review.push'):
+            self.deck.push(tidbit)
+        self.review_logs.append(review_log)
+        if self.storage:
+            with self.metrics.timer('deck.review.persist'):
+                self.storage.log_review(tidbit)
+                self.storage.log_review_history(review_log)
+                if rotated:
+                    self.storage.log_update(tidbit, question = tidbit.question,
+                                            questions = tidbit.questions)
+            # a deck still loading in the background is compacted later, one
+            # that failed to load never is
+            if self.storage.needs_compaction() and self.loaded.is_set() \
+                    and self.load_error is None:
+                self.save_deck()
+        return review_log
+
+    @command
+    def review_card(self, card_id : int, rating : Rating, review_datetime : datetime = None):
+        """
+        Reviews a card still in the deck by its id, e.g. one handed out by a
+        ReviewSession
+
+        ## Params
+        - card_id: id of the card
+        - rating: recall rating, as a Rating or its integer value
+        - review_datetime: optional, timezone aware time of the review
+
+        ## Returns
+        The review log, or None if the card is no longer in the deck
+
+        ## Raises
+        - ValueError: if rating is not a Rating, the card is left in the deck
+        """
+        rating = Rating(rating)
+        if card_id not in self.deck:
+            return None
+        tidbit = self.deck.remove(card_id)
+        try:
+            return self.review_tidbit(tidbit, rating, review_datetime)
+        except Exception:
+            # a failed review must not lose the card
+            if card_id not in self.deck:
+                self.deck.push(tidbit)
+            raise
     
+    @command
+    def review_next(self, rating : Rating, review_datetime : datetime = None):
+        """
+        Reviews the next tidbit due in a single command, so nothing else can
+        change the deck between taking the tidbit out and putting it back
+
+        ## Params
+        - rating: recall rating, as a Rating or its integer value
+        - review_datetime: optional, timezone aware time of the review
+
+        ## Returns
+        The review log, or None if there is nothing to review
+
+        ## Raises
+        - ValueError: if rating is not a Rating, the deck is left unchanged
+        """
+        rating = Rating(rating)
+        tidbit = self.deck.peek()
+        if tidbit is None:
+            return None
+        return self.review_card(tidbit.card.card_id, rating, review_datetime)
+
+    def get_review_history(self):
+        """
+        Gets every review made with this deck. Without storage only the
+        reviews of this session are known
+
+        ## Returns
+        List of ReviewLog
+        """
+        if self.storage:
+            return self.storage.read_review_history()
+        return list(self.review_logs)
+
+    def optimize_schedule(self, min_reviews : int = 100, callback = None):
+        """
+        Fits the scheduler parameters to the review history in a background
+        process. When the fit finishes the new parameters replace those of the
+        current scheduler. A fit that fails is kept in optimize_error, see
+        optimize_status
+
+        ## Params
+        - min_reviews: minimum number of reviews needed to start a fit
+        - callback: optional, called with the finished future after the
+        scheduler is updated
+
+        ## Returns
+        Future resolved with the fitted parameters, or None if there are not
+        enough reviews
+        """
+        logs = self.get_review_history()
+        if len(logs) < min_reviews:
+            return None
+
+        def _swap_schedule(future):
+            if future.cancelled():
+                pass
+            elif future.exception() is not None:
+                self.optimize_error = future.exception()
+                self.metrics.inc('deck.optimize.errors')
+            else:
+                self.optimize_error = None
+                self.commands.call(self._set_parameters, future.result())
+            self._fitted = future
+            if callback:
+                callback(future)
+
+        return self.optimizer.submit(logs, _swap_schedule)
+
+    def optimize_status(self):
+        """
+        ## Returns
+        Json serializable dictionary with whether a fit is 'running' and the
+        'last_error' of a failed fit
+        """
+        # a fit counts as running until its result or error is handled
+        running = self.optimizer.running
+        return {
+            'running' : running is not None and running is not self._fitted,
+            'last_error' : None if self.optimize_error is None else str(self.optimize_error)
+        }
+
+    def _set_parameters(self, parameters):
+        self.schedule = with_parameters(self.schedule, parameters)
+        if self.storage:
+            self.storage.log_schedule(self.schedule)
+
+    @command
     def pause_card(self, tidbit: Tidbit):
         """
         Prevent a card from being reviewed, but not delete it
 
         ## Params
         - tidbit: card to pause
+
+        ## Raises
+        - KeyError: if the card is not in the deck
         """
-        raise NotImplementedError()
+        self.deck.pause(tidbit.card.card_id)
+        if self.storage:
+            self.storage.log_update(tidbit, paused = True)
+
+    @command
+    def resume_card(self, tidbit: Tidbit):
+        """
+        Allow a paused card to be reviewed again
+
+        ## Params
+        - tidbit: card to resume
+
+        ## Raises
+        - KeyError: if the card is not paused
+        """
+        self.deck.resume(tidbit.card.card_id)
+        if self.storage:
+            self.storage.log_update(tidbit, paused = False)
     
+    @command
     def delete_card(self, tidbit: Tidbit):
         """
         Remove card entirely from the deck
+
+        ## Params
+        - tidbit: card to delete
+
+        ## Raises
+        - KeyError: if the card is not in the deck
+        """
+        self.deck.remove(tidbit.card.card_id)
+        self.index.remove(tidbit.card.card_id)
+        if self.embeddings is not None:
+            self.embeddings.remove(tidbit.card.card_id)
+        if self.storage:
+            self.storage.log_delete(tidbit)
+
+    @command
+    def reschedule_card(self, tidbit: Tidbit, due : datetime):
         """
-        raise NotImplementedError
+        Change when a card is next due for review
+
+        ## Params
+        - tidbit: card to reschedule
+        - due: timezone aware time the card is due
+
+        ## Raises
+        - KeyError: if the card is not in the deck
+        """
+        tidbit.card.due = due
+        self.deck.update(tidbit.card.card_id)
+        if self.storage:
+            self.storage.log_review(tidbit)
     
+    @command
+    def forecast_reviews(self, days : int = 90):
+        """
+        Counts how many cards come due on each of the following days. The due
+        times are read from every tidbit, so this costs one pass over the deck
+
+        ## Params
+        - days: number of days to forecast
+
+        ## Returns
+        List with the number of cards due on each day, overdue cards are
+        counted on the first day
+        """
+        from batch import BatchScheduler
+        return BatchScheduler(self.schedule).forecast_tidbits(self.deck, days).tolist()
+
+    def reschedule_all(self):
+        """
+        Recomputes the due date of every reviewed card with the current
+        scheduler, e.g. after its parameters or desired retention changed.
+        The deck is copied into a DeckStore and back, so this is a full
+        rebuild meant for rare settings changes, not for every review
+        """
+        self.loaded.wait()
+        self.commands.call(self._reschedule_all)
+
+    def _reschedule_all(self):
+        from batch import BatchScheduler
+        tids = list(self.deck)
+        store = DeckStore.from_tidbits(tids)
+        BatchScheduler(self.schedule).reschedule(store)
+        for row, tid in enumerate(tids):
+            tid.card = store.card(row)
+        self.deck = DueQueue(tids)
+        if self.storage:
+            self.save_deck()
+
+    @command
+    def query_deck(self, offset : int = 0, limit : int = 50, fields : list = None,
+                   sort : str = 'due', descending : bool = False):
+        """
+        Gets a page of the deck. Only the requested page is serialized, and
+        pages sorted soonest due first are read straight from the heap, so the
+        first page costs the same however big the deck is
+
+        ## Params
+        - offset: number of tidbits to skip
+        - limit: maximum number of tidbits to return, None for the rest of the
+        deck
+        - fields: tidbit attributes to include, e.g. ['title', 'due'], None for
+        every attribute. 'due' is the due date of the card. The card_id is
+        always included
+        - sort: order of the deck, one of 'due', 'created' or 'title'
+        - descending: if True the order is reversed
+
+        ## Returns
+        Dictionary with the 'total' number of tidbits, the 'items' of the
+        page, and the 'next' offset or None if this is the last page
+
+        ## Raises
+        - ValueError: if sort or one of the fields is not supported
+        """
+        if sort not in ('due', 'created', 'title'):
+            raise ValueError(f"Cannot sort deck by {sort}")
+        for field in fields or []:
+            if field != 'due' and field not in Tidbit.__slots__:
+                raise ValueError(f"Tidbit has no field {field}")
+
+        stop = None if limit is None else offset + limit
+        if sort == 'due' and not descending:
+            page = list(islice(self.deck.ordered(), offset, stop))
+        else:
+            page = self._sorted_deck(sort, descending)[offset:stop]
+
+        total = len(self.deck)
+        end = offset + len(page)
+        return {
+            'total' : total,
+            'items' : [self.serialize_tidbit(t, fields) for t in page],
+            'next' : end if end < total else None
+        }
+
+    def _sorted_deck(self, sort : str, descending : bool):
+        """
+        Sorts the deck, reusing the previous result until the deck is replaced,
+        changes or has a tidbit edited
+
+        ## Params
+        - sort: one of 'due', 'created' or 'title'
+        - descending: if True the order is reversed
+
+        ## Returns
+        List of every tidbit in order
+        """
+        # a new DueQueue starts again at version 0, so the queue itself is
+        # part of the key, kept alive by the cache
+        key = (self.deck, self.deck.version, self._edits, sort, descending)
+        if self._sorted is None or self._sorted[0] != key:
+            if sort == 'due':
+                order = lambda t: t.card.due
+            elif sort == 'created':
+                order = lambda t: t.created
+            else:
+                order = lambda t: (t.title is None, t.title or "")
+            self._sorted = (key, sorted(self.deck, key = order, reverse = descending))
+        return self._sorted[1]
+
+    @command
+    def search_tidbits(self, query : str = None, tags : list = None,
+                       source : str = None, limit : int = 50,
+                       fields : list = None):
+        """
+        Finds the cards containing every word of a query, with every tag and
+        from a source. Matches are returned soonest due first
+
+        ## Params
+        - query: words to look for in the data, title and questions
+        - tags: tags the cards must have
+        - source: source the cards must come from
+        - limit: maximum number of cards to return
+        - fields: card attributes to include, None for all of them
+
+        ## Returns
+        Dictionary with the 'total' number of matches and the serialized
+        'items'
+        """
+        matches = self.index.search(query, tags, source)
+        tids = heapq.nsmallest(limit, (self.deck.get(i) for i in matches if i in self.deck),
+                               key = lambda t: t.card.due)
+        return {
+            'total' : len(matches),
+            'items' : [self.serialize_tidbit(t, fields) for t in tids]
+        }
+
+    def serialize_tidbit(self, tidbit : Tidbit, fields : list = None):
+        """
+        Converts a tidbit to a dictionary with only the requested fields
+
+        ## Params
+        - tidbit: tidbit to convert
+        - fields: attributes to include or None for all of them
+
+        ## Returns
+        Dictionary representation of the tidbit including its card_id
+        """
+        if fields is None:
+            rtn = tidbit.to_dict()
+        else:
+            rtn = {}
+            for field in fields:
+                if field == 'due':
+                    rtn['due'] = tidbit.card.due.isoformat()
+                elif field == 'card':
+                    rtn['card'] = tidbit.card.to_dict()
+                elif field == 'created':
+                    rtn['created'] = tidbit.created.isoformat()
+                else:
+                    rtn[field] = getattr(tidbit, field)
+        rtn['card_id'] = tidbit.card.card_id
+        return rtn
+
     def _load_prompt(self, file_path):
         """
         Load a prompt from a given text file
@@ -154,13 +1165,14 @@ class DeckManager():
         ## Returns
         A tidbit with the params passed from a file
         """
-        tidbit_dict['card'] = Card.from_dict(tidbit_dict['card'])
-        tidbit_dict['created'] = datetime.fromisoformat(tidbit_dict['created'])
-        return Tidbit(**tidbit_dict)
+        return Tidbit.from_dict(tidbit_dict)
 
+    @METRICS.timed('deck.load')
     def load_deck(self, file_path = None):
         """
-        Builds a deck and scheduler from a json formatted file
+        Builds a deck and scheduler from a json formatted file or a binary
+        snapshot. Changes journaled since the file was last saved are
+        replayed on top of it
         
         ## Params
         -file_path: location of deck file
@@ -169,22 +1181,81 @@ class DeckManager():
         True is deck is successfully loaded False if there are no cards
         
         ## Raises
-        - ValueError if file_path is not for a json file
+        - ValueError if file_path is not for a json file or binary snapshot
         """
         file_path = self.config['deck'] if file_path == None else file_path
+        if self._loader is not None:
+            self.loaded.wait()
+        # the file is read and parsed before the writer is held
+        deck = self._read_deck(file_path)
+        temp_schedule = Scheduler() if deck['schedule'] is None \
+            else Scheduler.from_dict(deck['schedule'])
+        temp_deck = list(deck['tidbits'])
+        if len(temp_deck) <= 0:
+            return False
+
+        self.commands.call(self._replace_deck, temp_schedule, temp_deck, deck, file_path)
+        return True
+
+    def _replace_deck(self, schedule : Scheduler, tidbits : list, deck : dict, file_path : str):
+        self.schedule = schedule
+        # journaled cards are appended out of order, the queue is heapified
+        self.deck = DueQueue(tidbits)
+        self._restore_indexes(deck, file_path)
+        if file_path == self.config['deck']:
+            # the whole deck file was read again, it may be saved over
+            self.load_error = None
+
+    def _read_deck(self, file_path : str):
+        """
+        Reads a deck file with its journal replayed. Json decks are parsed
+        whole while binary snapshots are mapped and decoded as their tidbits
+        are consumed
+
+        ## Returns
+        Dictionary like DeckStorage.read, with 'tidbits' a generator of the
+        tidbits in place of 'deck'. Apart from those changed by the journal,
+        which come first, they are yielded soonest due first
 
+        ## Raises
+        - ValueError if file_path is not for a json file or binary snapshot
+        """
+        if is_binary(file_path):
+            return read_binary(file_path)
         if file_path.split('.')[-1] != 'json':
-            raise ValueError("Deck must be in json format")
-        with open(file_path, 'r') as file:
-            deck = j_load(file)
-            temp_schedule = Scheduler.from_dict(deck['schedule'])
-            temp_deck = [self._parse_tidbit(t) for t in deck['deck']]
-            if len(temp_deck) <= 0:
-                return False
-            
-            self.schedule = temp_schedule
-            self.deck = temp_deck
-            return True
+            raise ValueError("Deck must be in json format or a binary snapshot")
+        deck = DeckStorage.read(file_path)
+        # due dates are UTC isoformat strings so they sort chronologically
+        tidbit_dicts = sorted(deck.pop('deck'), key = lambda t: t['card']['due'])
+        deck['tidbits'] = (self._parse_tidbit(t) for t in tidbit_dicts)
+        return deck
+
+    def _load_index(self, index_dict : dict, touched : list):
+        """
+        Restores the search index saved with the deck, reindexing the cards
+        the journal changed since. Decks saved without an index are indexed
+        from scratch
+
+        ## Params
+        - index_dict: index saved in the snapshot or None
+        - touched: ids of the cards changed by the journal
+
+        ## Returns
+        Search index in sync with the deck
+        """
+        if index_dict is None:
+            return SearchIndex.from_tidbits(self.deck)
+        index = SearchIndex.from_dict(index_dict)
+        for card_id in touched:
+            index.remove(card_id)
+            if card_id in self.deck:
+                index.add(self.deck.get(card_id))
+        for card_id in [i for i in index.card_ids() if i not in self.deck]:
+            index.remove(card_id)
+        for tid in self.deck:
+            if tid.card.card_id not in index:
+                index.add(tid)
+        return index
 
 
     def save_deck(self, file_path = None):
@@ -192,22 +1263,61 @@ class DeckManager():
         Write the contents of the deck and the state of the scheduler to a 
         json file. If no location is specifed then the location specifed by the
         config attribute is used. After the first time a deck is saved,
-        config.yaml is updated to the initialized state.
+        config.yaml is updated to the initialized state. The file is replaced
+        atomically, and if it is the journaled deck file the journal is
+        compacted into it.
 
         ## Params
         - file_path: location to save the deck to
-        
+
+        ## Raises
+        - DeckLoadError: if the deck failed to load and file_path is the deck
+        file
         """
         file_path = self.config['deck'] if file_path == None else file_path
+        # never write out a deck that is still being loaded
+        if not self.commands.on_writer():
+            self.loaded.wait()
+        # nor one that is missing the cards after a load error
+        if self.load_error is not None and file_path == self.config['deck']:
+            raise DeckLoadError(self.load_error)
+        self.commands.call(self._save, file_path)
 
+    def _save(self, file_path : str):
+        with self.metrics.timer('deck.save'):
+            self._write_deck(file_path)
+
+    def _write_deck(self, file_path : str):
+        compacting = self.storage and file_path == self.storage.file_path
+        if is_binary(file_path):
+            write = partial(self._write_binary, file_path)
+            if compacting:
+                self.storage.clear_journal(write)
+            else:
+                write()
+        else:
+            if compacting:
+                # built under the journal lock so no journaled change is lost
+                self.storage.compact(self._deck_dict)
+            else:
+                DeckStorage.write_snapshot(file_path, self._deck_dict())
+        if self.embeddings is not None:
+            self.embeddings.save(file_path + '.vectors.npz')
+
+    def _deck_dict(self):
         # contents of deck are stored in their current ordering
-        update = {
+        return {
             'deck' : [t.to_dict() for t in self.deck],
-            'schedule' : self.schedule.to_dict()
+            'schedule' : self.schedule.to_dict(),
+            'index' : self.index.to_dict()
         }
-        
-        with open(file_path, 'w', encoding = 'utf-8') as file:
-            j_dump(update, file, ensure_ascii = False, indent = 4)
+
+    def _write_binary(self, file_path : str):
+        # rows are written soonest due first so loading can stop early
+        write_binary(file_path, sorted(self.deck, key = lambda t: t.card.due), {
+            'schedule' : self.schedule.to_dict(),
+            'index' : self.index.to_dict()
+        })
         
 
 
@@ -225,11 +1335,46 @@ class DeckManager():
 
     def reset(self):
         """
-        Resets the state of the deck and scheduler
+        Resets the state of the deck and scheduler. Questions still waiting to
+        be generated and answers waiting to be graded are dropped. Enrichment
+        is stopped first, so nothing it generated for the old deck is stored,
+        and started again on the new one
         """
+        if self.enricher is not None:
+            self.enricher.stop()
+        self.commands.call(self._reset)
+        if self.enricher is not None:
+            self.enricher.start()
 
-        self.deck = []
+    def _reset(self):
+        if self.generator:
+            self.generator.close()
+            self.generator = None
+        if self.grader:
+            self.grader.close()
+            self.grader = None
+
+        with self._queued_lock:
+            self._queued.clear()
+        self.deck = DueQueue()
+        self.index = SearchIndex()
+        self.embeddings = self._new_embeddings()
         self.schedule = Scheduler()
+        self.review_logs = []
+
+    def close(self):
+        """
+        Stops the background work of the deck: enrichment, question
+        generation, grading and the writer, once its queued commands have run.
+        The deck is not saved
+        """
+        if self.enricher is not None:
+            self.enricher.stop()
+        if self.generator:
+            self.generator.close()
+        if self.grader:
+            self.grader.close()
+        self.commands.close()
 
 
 if __name__ == '__main__':
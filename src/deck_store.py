@@ -0,0 +1,317 @@
+from array import array
+from datetime import datetime, timezone
+from fsrs import Card, State
+from tidbit import Tidbit
+
+# sentinels for missing values in typed columns
+NO_TIME = -2 ** 63
+NO_STEP = -1
+NO_TEXT = -1
+TAG_SEP = '\x1f'
+QUESTION_SEP = '\x1e'
+
+_EPOCH = datetime(1970, 1, 1, tzinfo = timezone.utc)
+
+
+def to_micros(time : datetime):
+    """
+    Converts a timezone aware datetime to integer microseconds since the epoch,
+    which is exact unlike a float timestamp
+
+    ## Returns
+    Microseconds as an integer or NO_TIME if time is None
+    """
+    if time is None:
+        return NO_TIME
+    delta = time - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def from_micros(micros : int):
+    """
+    Converts microseconds since the epoch back to a UTC datetime
+
+    ## Returns
+    A timezone aware datetime or None if micros is NO_TIME
+    """
+    if micros == NO_TIME:
+        return None
+    return datetime.fromtimestamp(micros // 1000000, timezone.utc).replace(
+        microsecond = micros % 1000000)
+
+
+class StringPool():
+    """
+    Stores strings back to back in a single utf-8 buffer, indexed by offset.
+    Optionally interns strings so repeated values, like sources and titles, are
+    only stored once.
+
+    ## Attributes
+    - intern: if True equal strings share one entry
+    """
+
+    def __init__(self, intern : bool = False):
+        """
+        Creates an empty pool
+
+        ## Parameters
+        - intern: share entries between equal strings
+        """
+        self.intern = intern
+        self._buffer = bytearray()
+        self._offsets = array('q', [0])
+        self._index = {} if intern else None
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def add(self, text : str):
+        """
+        Adds a string to the pool
+
+        ## Parameters
+        - text: string to store, may be None
+
+        ## Returns
+        Index of the string or NO_TEXT for None
+        """
+        if text is None:
+            return NO_TEXT
+        if self.intern and text in self._index:
+            return self._index[text]
+        self._buffer += text.encode('utf-8')
+        self._offsets.append(len(self._buffer))
+        index = len(self._offsets) - 2
+        if self.intern:
+            self._index[text] = index
+        return index
+
+    def get(self, index : int):
+        """
+        Reads a string from the pool
+
+        ## Parameters
+        - index: index returned by add
+
+        ## Returns
+        The string or None for NO_TEXT
+        """
+        if index == NO_TEXT:
+            return None
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return self._buffer[start:end].decode('utf-8')
+
+    def nbytes(self):
+        """
+        Gets the size of the buffer and offsets
+
+        ## Returns
+        Number of bytes used by the pool
+        """
+        return len(self._buffer) + self._offsets.itemsize * len(self._offsets)
+
+
+class DeckStore():
+    """
+    Columnar storage for large decks. Card state is kept in typed arrays, one
+    per field, and text is kept in string pools, so a card costs a few dozen
+    bytes plus its text instead of a Tidbit, a Card and several datetime
+    objects. Card and Tidbit objects are only built when a row is read, for
+    example when the card is shown or reviewed.
+
+    Times are stored as integer microseconds since the epoch, missing values use
+    the NO_TIME, NO_STEP and NO_TEXT sentinels and missing floats are nan.
+
+    ## Attributes
+    - card_id, state, step, stability, difficulty, due, last_review: card
+    columns
+    - created, paused: tidbit columns
+    - data, question, title, source, tags: indexes into the string pools,
+    question holds every question variant of the card
+    """
+
+    def __init__(self):
+        """
+        Creates an empty store
+        """
+        self.card_id = array('q')
+        self.state = array('b')
+        self.step = array('b')
+        self.stability = array('d')
+        self.difficulty = array('d')
+        self.due = array('q')
+        self.last_review = array('q')
+        self.created = array('q')
+        self.paused = array('b')
+        self.data = array('q')
+        self.question = array('q')
+        self.title = array('q')
+        self.source = array('q')
+        self.tags = array('q')
+        self._text = StringPool()
+        self._labels = StringPool(intern = True)
+        self._rows = {}
+
+    @classmethod
+    def from_tidbits(cls, tidbits):
+        """
+        Builds a store from tidbits
+
+        ## Parameters
+        - tidbits: iterable of tidbits
+
+        ## Returns
+        A new store holding every tidbit
+        """
+        store = cls()
+        for tid in tidbits:
+            store.append(tid)
+        return store
+
+    def __len__(self):
+        return len(self.card_id)
+
+    def __contains__(self, card_id : int):
+        return card_id in self._rows
+
+    def row(self, card_id : int):
+        """
+        Finds the row of a card
+
+        ## Parameters
+        - card_id: id of the card
+
+        ## Returns
+        Row index
+
+        ## Raises
+        - KeyError: if the card is not in the store
+        """
+        return self._rows[card_id]
+
+    def append(self, tidbit : Tidbit):
+        """
+        Adds a tidbit as a new row
+
+        ## Parameters
+        - tidbit: tidbit to store
+
+        ## Returns
+        Row index of the tidbit
+        """
+        row = len(self.card_id)
+        self.card_id.append(tidbit.card.card_id)
+        for column in (self.state, self.step, self.stability, self.difficulty,
+                       self.due, self.last_review):
+            column.append(0)
+        self.set_card(row, tidbit.card)
+        self.created.append(to_micros(tidbit.created))
+        self.paused.append(1 if tidbit.paused else 0)
+        self.data.append(self._text.add(tidbit.data))
+        self.question.append(self._text.add(
+            QUESTION_SEP.join(tidbit.questions) if tidbit.questions else None))
+        self.title.append(self._labels.add(tidbit.title))
+        self.source.append(self._labels.add(tidbit.source))
+        self.tags.append(self._labels.add(
+            TAG_SEP.join(tidbit.tags) if tidbit.tags is not None else None))
+        self._rows[tidbit.card.card_id] = row
+        return row
+
+    def set_card(self, row : int, card : Card):
+        """
+        Writes the state of a card into a row, e.g. after a review
+
+        ## Parameters
+        - row: row index
+        - card: card with the new state
+        """
+        self.state[row] = int(card.state)
+        self.step[row] = NO_STEP if card.step is None else card.step
+        self.stability[row] = float('nan') if card.stability is None else card.stability
+        self.difficulty[row] = float('nan') if card.difficulty is None else card.difficulty
+        self.due[row] = to_micros(card.due)
+        self.last_review[row] = to_micros(card.last_review)
+
+    def card(self, row : int):
+        """
+        Builds the Card stored in a row
+
+        ## Parameters
+        - row: row index
+
+        ## Returns
+        A new Card
+        """
+        stability = self.stability[row]
+        difficulty = self.difficulty[row]
+        return Card(
+            card_id = self.card_id[row],
+            state = State(self.state[row]),
+            step = None if self.step[row] == NO_STEP else self.step[row],
+            stability = None if stability != stability else stability,
+            difficulty = None if difficulty != difficulty else difficulty,
+            due = from_micros(self.due[row]),
+            last_review = from_micros(self.last_review[row])
+        )
+
+    def tidbit(self, row : int):
+        """
+        Builds the Tidbit stored in a row
+
+        ## Parameters
+        - row: row index
+
+        ## Returns
+        A new Tidbit
+        """
+        tags = self._labels.get(self.tags[row])
+        questions = self._text.get(self.question[row])
+        return Tidbit(
+            self.card(row),
+            self._text.get(self.data[row]),
+            title = self._labels.get(self.title[row]),
+            tags = tags.split(TAG_SEP) if tags is not None else None,
+            questions = questions.split(QUESTION_SEP) if questions is not None else None,
+            source = self._labels.get(self.source[row]),
+            created = from_micros(self.created[row]),
+            paused = bool(self.paused[row])
+        )
+
+    def tidbits(self):
+        """
+        Builds every tidbit in row order
+
+        ## Returns
+        Generator of tidbits
+        """
+        return (self.tidbit(row) for row in range(len(self)))
+
+    def review(self, row : int, scheduler, rating):
+        """
+        Reviews the card in a row and writes the new state back
+
+        ## Parameters
+        - row: row index
+        - scheduler: fsrs Scheduler used for the review
+        - rating: fsrs Rating given to the card
+
+        ## Returns
+        The review log of the review
+        """
+        card, review_log = scheduler.review_card(self.card(row), rating)
+        self.set_card(row, card)
+        return review_log
+
+    def nbytes(self):
+        """
+        Gets the memory used by the columns and string pools
+
+        ## Returns
+        Number of bytes
+        """
+        columns = (self.card_id, self.state, self.step, self.stability,
+                   self.difficulty, self.due, self.last_review, self.created,
+                   self.paused, self.data, self.question, self.title,
+                   self.source, self.tags)
+        return (sum(c.itemsize * len(c) for c in columns)
+                + self._text.nbytes() + self._labels.nbytes())
@@ -0,0 +1,265 @@
+from heapq import heappush, heappop
+
+
+class DueQueue():
+    """
+    Priority queue of tidbits ordered by due date. This is a binary heap with a
+    map from card_id to heap position, so besides push and pop any tidbit can
+    be looked up in O(1) and removed or rescheduled in O(log n). The heap is
+    maintained with the same algorithms as heapq, so tidbits are popped in the
+    same order as a heapq list.
+
+    Paused tidbits are kept aside from the heap and are never popped until they
+    are resumed.
+
+    The queue is a sequence of the active tidbits in heap order followed by the
+    paused tidbits. Membership is checked by card_id.
+
+    ## Attributes
+    - version: incremented on every change, used to invalidate cached views
+    """
+
+    def __init__(self, tidbits = None):
+        """
+        Builds a queue from an optional collection of tidbits in O(n)
+
+        ## Parameters
+        - tidbits: tidbits to add, those flagged as paused are kept aside
+        """
+        self._heap = []
+        self._pos = {}
+        self._paused = {}
+        self.version = 0
+        for tid in tidbits or []:
+            if tid.paused:
+                self._paused[tid.card.card_id] = tid
+            else:
+                self._pos[tid.card.card_id] = len(self._heap)
+                self._heap.append(tid)
+        for i in reversed(range(len(self._heap) // 2)):
+            self._siftup(i)
+
+    def __len__(self):
+        return len(self._heap) + len(self._paused)
+
+    def __iter__(self):
+        yield from self._heap
+        yield from self._paused.values()
+
+    def __getitem__(self, index : int):
+        if index < len(self._heap):
+            return self._heap[index]
+        return list(self._paused.values())[index - len(self._heap)]
+
+    def __contains__(self, card_id : int):
+        return card_id in self._pos or card_id in self._paused
+
+    def active(self):
+        """
+        Gets the number of tidbits that can be reviewed
+
+        ## Returns
+        Number of tidbits that are not paused
+        """
+        return len(self._heap)
+
+    def push(self, tidbit):
+        """
+        Adds a tidbit to the queue
+
+        ## Parameters
+        - tidbit: tidbit to add, must not already be in the queue
+
+        ## Raises
+        - KeyError: if a tidbit with the same card_id is already queued
+        """
+        card_id = tidbit.card.card_id
+        if card_id in self:
+            raise KeyError(f"Card {card_id} is already in the deck")
+        self.version += 1
+        if tidbit.paused:
+            self._paused[card_id] = tidbit
+            return
+        self._heap.append(tidbit)
+        self._pos[card_id] = len(self._heap) - 1
+        self._siftdown(0, len(self._heap) - 1)
+
+    def peek(self):
+        """
+        Returns the tidbit due soonest without removing it
+
+        ## Returns
+        Next tidbit to review or None if there are no active tidbits
+        """
+        return self._heap[0] if self._heap else None
+
+    def pop(self):
+        """
+        Removes and returns the tidbit due soonest
+
+        ## Returns
+        Next tidbit to review or None if there are no active tidbits
+        """
+        if not self._heap:
+            return None
+        return self._remove_at(0)
+
+    def get(self, card_id : int):
+        """
+        Looks up a tidbit by the id of its card
+
+        ## Parameters
+        - card_id: id of the card
+
+        ## Returns
+        The tidbit or None if it is not in the queue
+        """
+        if card_id in self._pos:
+            return self._heap[self._pos[card_id]]
+        return self._paused.get(card_id)
+
+    def remove(self, card_id : int):
+        """
+        Removes a tidbit from the queue, whether it is active or paused
+
+        ## Parameters
+        - card_id: id of the card to remove
+
+        ## Returns
+        The removed tidbit
+
+        ## Raises
+        - KeyError: if the card is not in the queue
+        """
+        if card_id in self._paused:
+            self.version += 1
+            return self._paused.pop(card_id)
+        return self._remove_at(self._pos[card_id])
+
+    def update(self, card_id : int):
+        """
+        Restores the order of the queue after the due date of a tidbit changed
+
+        ## Parameters
+        - card_id: id of the card that was rescheduled
+
+        ## Raises
+        - KeyError: if the card is not in the queue
+        """
+        self.version += 1
+        if card_id in self._paused:
+            return
+        pos = self._pos[card_id]
+        self._siftdown(0, pos)
+        self._siftup(self._pos[card_id])
+
+    def pause(self, card_id : int):
+        """
+        Moves a tidbit out of the heap so it is not reviewed
+
+        ## Parameters
+        - card_id: id of the card to pause
+
+        ## Returns
+        The paused tidbit
+
+        ## Raises
+        - KeyError: if the card is not in the queue
+        """
+        tid = self.remove(card_id)
+        tid.paused = True
+        self._paused[card_id] = tid
+        return tid
+
+    def resume(self, card_id : int):
+        """
+        Returns a paused tidbit to the heap
+
+        ## Parameters
+        - card_id: id of the card to resume
+
+        ## Returns
+        The resumed tidbit
+
+        ## Raises
+        - KeyError: if the card is not paused
+        """
+        tid = self._paused.pop(card_id)
+        tid.paused = False
+        self.push(tid)
+        return tid
+
+    def ordered(self):
+        """
+        Iterates over the tidbits in due order without changing the queue. The
+        heap is explored best first, so the first k tidbits cost O(k log k)
+        however big the queue is. Paused tidbits follow the active ones.
+
+        ## Returns
+        Generator of tidbits, soonest due first
+        """
+        heap = self._heap
+        if heap:
+            frontier = [(heap[0].card.due, 0)]
+            while frontier:
+                _, pos = heappop(frontier)
+                yield heap[pos]
+                for child in (2 * pos + 1, 2 * pos + 2):
+                    if child < len(heap):
+                        heappush(frontier, (heap[child].card.due, child))
+        yield from sorted(self._paused.values(), key = lambda t: t.card.due)
+
+    def _remove_at(self, pos : int):
+        """
+        Removes the tidbit at a position in the heap
+        """
+        self.version += 1
+        last = self._heap.pop()
+        if pos == len(self._heap):
+            del self._pos[last.card.card_id]
+            return last
+        removed = self._heap[pos]
+        del self._pos[removed.card.card_id]
+        self._set(pos, last)
+        self._siftup(pos)
+        self._siftdown(0, self._pos[last.card.card_id])
+        return removed
+
+    def _set(self, pos : int, tidbit):
+        self._heap[pos] = tidbit
+        self._pos[tidbit.card.card_id] = pos
+
+    def _siftdown(self, startpos : int, pos : int):
+        """
+        Moves the tidbit at pos towards the root, same as heapq._siftdown
+        """
+        heap = self._heap
+        newitem = heap[pos]
+        while pos > startpos:
+            parentpos = (pos - 1) >> 1
+            parent = heap[parentpos]
+            if newitem < parent:
+                self._set(pos, parent)
+                pos = parentpos
+                continue
+            break
+        self._set(pos, newitem)
+
+    def _siftup(self, pos : int):
+        """
+        Moves the tidbit at pos towards the leaves, same as heapq._siftup
+        """
+        heap = self._heap
+        endpos = len(heap)
+        startpos = pos
+        newitem = heap[pos]
+        childpos = 2 * pos + 1
+        while childpos < endpos:
+            rightpos = childpos + 1
+            if rightpos < endpos and not heap[childpos] < heap[rightpos]:
+                childpos = rightpos
+            self._set(pos, heap[childpos])
+            pos = childpos
+            childpos = 2 * pos + 1
+        self._set(pos, newitem)
+        self._siftdown(startpos, pos)
@@ -0,0 +1,216 @@
+import os
+import numpy as np
+
+
+class LSHIndex():
+    """
+    Approximate nearest neighbour lookup with random hyperplane hashing. Each
+    table hashes a vector to the side of `bits` random hyperplanes it falls
+    on, so similar vectors tend to share a bucket. Candidates from every table
+    are then scored exactly by the EmbeddingIndex.
+
+    ## Attributes
+    - bits: hyperplanes per table
+    - tables: number of hash tables
+    """
+
+    def __init__(self, dim : int, bits : int = 16, tables : int = 8, seed : int = 0):
+        """
+        Creates empty hash tables
+
+        ## Parameters
+        - dim: length of the vectors
+        - bits: hyperplanes per table, more bits make smaller buckets
+        - tables: number of tables, more tables find more candidates
+        - seed: seed for the hyperplanes
+        """
+        self.bits = bits
+        self.tables = tables
+        rng = np.random.default_rng(seed)
+        self._planes = rng.standard_normal((tables, bits, dim))
+        self._weights = 1 << np.arange(bits, dtype = np.int64)
+        self._buckets = [{} for _ in range(tables)]
+
+    def _keys(self, vector : np.ndarray):
+        sides = (self._planes @ vector) > 0
+        return (sides @ self._weights).tolist()
+
+    def add(self, card_id : int, vector : np.ndarray):
+        for table, key in zip(self._buckets, self._keys(vector)):
+            table.setdefault(key, set()).add(card_id)
+
+    def remove(self, card_id : int, vector : np.ndarray):
+        for table, key in zip(self._buckets, self._keys(vector)):
+            bucket = table.get(key)
+            if bucket is not None:
+                bucket.discard(card_id)
+                if not bucket:
+                    del table[key]
+
+    def candidates(self, vector : np.ndarray):
+        """
+        ## Returns
+        Set of card ids sharing a bucket with the vector in any table
+        """
+        found = set()
+        for table, key in zip(self._buckets, self._keys(vector)):
+            found.update(table.get(key, ()))
+        return found
+
+
+class EmbeddingIndex():
+    """
+    Keeps one unit length embedding per card in a numpy matrix and finds the
+    most similar cards by cosine similarity. Lookups scan the whole matrix
+    with one matrix product, or, once the index holds at least `lsh_min`
+    cards and approximate lookups are enabled, only the candidates of an
+    LSHIndex.
+
+    ## Attributes
+    - dim: length of the vectors, set by the first vector added
+    - approximate: if True large indexes are searched with LSH
+    - lsh_min: size from which LSH is used
+    """
+
+    def __init__(self, approximate : bool = False, lsh_min : int = 10000, **lsh_params):
+        """
+        Creates an empty index
+
+        ## Parameters
+        - approximate: use LSH for large indexes
+        - lsh_min: number of cards from which LSH is used
+        - lsh_params: bits, tables and seed passed to LSHIndex
+        """
+        self.dim = None
+        self.approximate = approximate
+        self.lsh_min = lsh_min
+        self._lsh_params = lsh_params
+        self._lsh = None
+        self._vectors = None
+        self._ids = np.zeros(0, dtype = np.int64)
+        self._rows = {}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, card_id : int):
+        return card_id in self._rows
+
+    def _normalize(self, vector):
+        vector = np.asarray(vector, dtype = np.float32)
+        if self.dim is None:
+            self.dim = len(vector)
+            self._vectors = np.zeros((16, self.dim), dtype = np.float32)
+            self._ids = np.zeros(16, dtype = np.int64)
+            if self.approximate:
+                self._lsh = LSHIndex(self.dim, **self._lsh_params)
+        elif len(vector) != self.dim:
+            raise ValueError(f"Expected a vector of length {self.dim}, got {len(vector)}")
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def add(self, card_id : int, vector):
+        """
+        Stores the embedding of a card, replacing any previous one
+
+        ## Parameters
+        - card_id: id of the card
+        - vector: embedding of the card
+        """
+        vector = self._normalize(vector)
+        if card_id in self._rows:
+            self.remove(card_id)
+        if self._size == len(self._vectors):
+            self._vectors = np.concatenate([self._vectors, np.zeros_like(self._vectors)])
+            self._ids = np.concatenate([self._ids, np.zeros_like(self._ids)])
+        row = self._size
+        self._vectors[row] = vector
+        self._ids[row] = card_id
+        self._rows[card_id] = row
+        self._size += 1
+        if self._lsh is not None:
+            self._lsh.add(card_id, vector)
+
+    def remove(self, card_id : int):
+        """
+        Removes the embedding of a card, unknown cards are ignored
+
+        ## Parameters
+        - card_id: id of the card
+        """
+        row = self._rows.pop(card_id, None)
+        if row is None:
+            return
+        if self._lsh is not None:
+            self._lsh.remove(card_id, self._vectors[row])
+        last = self._size - 1
+        if row != last:
+            # move the last row into the gap so the matrix stays dense
+            self._vectors[row] = self._vectors[last]
+            self._ids[row] = self._ids[last]
+            self._rows[int(self._ids[row])] = row
+        self._size = last
+
+    def nearest(self, vector, k : int = 1):
+        """
+        Finds the cards most similar to a vector
+
+        ## Parameters
+        - vector: embedding to compare with
+        - k: number of cards to return
+
+        ## Returns
+        List of (card_id, similarity) pairs, most similar first
+        """
+        if self._size == 0:
+            return []
+        vector = self._normalize(vector)
+        rows = None
+        if self._lsh is not None and self._size >= self.lsh_min:
+            rows = np.fromiter((self._rows[i] for i in self._lsh.candidates(vector)),
+                               dtype = np.int64)
+            if len(rows) == 0:
+                return []
+            scores = self._vectors[rows] @ vector
+        else:
+            scores = self._vectors[:self._size] @ vector
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        ids = self._ids[rows[best] if rows is not None else best]
+        return [(int(card_id), float(scores[i])) for card_id, i in zip(ids, best)]
+
+    def save(self, file_path : str):
+        """
+        Atomically writes the embeddings to a numpy .npz file
+
+        ## Parameters
+        - file_path: location to write to
+        """
+        tmp_path = file_path + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            np.savez(file, ids = self._ids[:self._size],
+                     vectors = self._vectors[:self._size] if self._size else np.zeros((0, 0)))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, file_path)
+
+    def load(self, file_path : str, card_ids = None):
+        """
+        Adds the embeddings saved in a file
+
+        ## Parameters
+        - file_path: file written by save
+        - card_ids: optional, only cards in this collection are loaded
+
+        ## Returns
+        False if the file does not exist
+        """
+        if not os.path.exists(file_path):
+            return False
+        with np.load(file_path) as saved:
+            for card_id, vector in zip(saved['ids'].tolist(), saved['vectors']):
+                if card_ids is None or card_id in card_ids:
+                    self.add(card_id, vector)
+        return True
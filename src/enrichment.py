@@ -0,0 +1,252 @@
+"""
+Idle time enrichment of the cards due soon. While nobody is adding or
+reviewing cards, a background thread looks through the cards due within a
+horizon for ones without a title, without tags or with fewer question
+variants than the deck asks for, and fills them in with the model one
+request at a time. Before every request it checks that the deck is still
+idle, so interactive requests never queue behind more than the one request
+already sent.
+"""
+from datetime import datetime, timedelta, timezone
+from threading import Event, Thread
+from time import monotonic
+from metrics import METRICS
+
+
+class Enricher():
+    """
+    Fills in missing titles, tags and question variants of the cards of a
+    DeckManager that are due soon, while the deck is idle. The deck counts
+    as idle once idle_seconds have passed since DeckManager.touch was last
+    called by an interactive request. Results are stored with
+    DeckManager.update_tidbit, so they are journaled and indexed like any
+    other change.
+
+    ## Attributes
+    - deck_manager: deck to enrich
+    - horizon: only cards due before now plus the horizon are enriched
+    - idle_seconds: seconds without interactive requests before work starts
+    - interval: seconds between looks for work
+    - titles: if True missing titles are generated
+    - tags: if True missing tags are generated
+    - questions: if True question variants are generated for cards with fewer
+    than the deck's variants
+    - max_tags: maximum number of generated tags
+    - progress: counts of the fields filled in and the requests that failed
+    - last_error: error of the last failed request or None
+    """
+
+    def __init__(self, deck_manager, horizon_hours : float = 24, idle_seconds : float = 10,
+                 interval : float = 5, titles : bool = True, tags : bool = True,
+                 questions : bool = True, max_tags : int = 5):
+        """
+        ## Parameters
+        - deck_manager: DeckManager to enrich
+        - horizon_hours: how far ahead to look for due cards
+        - idle_seconds: seconds without interactive requests before work
+        starts
+        - interval: seconds between looks for work
+        - titles: generate missing titles
+        - tags: generate missing tags
+        - questions: generate missing question variants
+        - max_tags: maximum number of generated tags
+        """
+        self.deck_manager = deck_manager
+        self.horizon = timedelta(hours = horizon_hours)
+        self.idle_seconds = idle_seconds
+        self.interval = interval
+        self.titles = titles
+        self.tags = tags
+        self.questions = questions
+        self.max_tags = max_tags
+        self.progress = {'title' : 0, 'tags' : 0, 'questions' : 0, 'errors' : 0}
+        self.last_error = None
+        self._stop = Event()
+        self._thread = None
+
+    def needs(self, tidbit):
+        """
+        ## Returns
+        List of the fields of a tidbit to generate, among 'title', 'tags' and
+        'questions'
+        """
+        fields = []
+        if self.titles and not tidbit.title:
+            fields.append('title')
+        if self.tags and not tidbit.tags:
+            fields.append('tags')
+        if self.questions and (tidbit.question is None
+                               or len(tidbit.questions) < self.deck_manager.variants) \
+                and not self._generating(tidbit):
+            fields.append('questions')
+        return fields
+
+    def _generating(self, tidbit):
+        # questions of cards waiting on the generation queue are left to it
+        deck_manager = self.deck_manager
+        with deck_manager._queued_lock:
+            return tidbit.card.card_id in deck_manager._queued
+
+    def _claim(self, tidbit):
+        """
+        Marks a tidbit as queued for generation while its questions are
+        generated here, so the generation queue does not take it as well
+
+        ## Returns
+        True if the tidbit was not queued already
+        """
+        deck_manager = self.deck_manager
+        with deck_manager._queued_lock:
+            if tidbit.card.card_id in deck_manager._queued:
+                return False
+            deck_manager._queued.add(tidbit.card.card_id)
+            return True
+
+    def _release(self, tidbit):
+        deck_manager = self.deck_manager
+        with deck_manager._queued_lock:
+            deck_manager._queued.discard(tidbit.card.card_id)
+
+    def is_idle(self):
+        """
+        ## Returns
+        True if no interactive request came in for idle_seconds and the
+        enricher is not stopping
+        """
+        return not self._stop.is_set() \
+            and monotonic() - self.deck_manager.last_active >= self.idle_seconds
+
+    def candidates(self, now : datetime = None, limit : int = None):
+        """
+        Finds the active cards due within the horizon that are missing
+        something, soonest due first
+
+        ## Parameters
+        - now: timezone aware time the horizon starts from, by default now
+        - limit: maximum number of cards
+
+        ## Returns
+        List of tidbits
+        """
+        cutoff = (now or datetime.now(timezone.utc)) + self.horizon
+        return self.deck_manager.commands.call(self._due_soon, cutoff, limit)
+
+    def _due_soon(self, cutoff : datetime, limit : int):
+        found = []
+        for tid in self.deck_manager.deck.ordered():
+            if tid.paused or tid.card.due > cutoff:
+                break
+            if self.needs(tid):
+                found.append(tid)
+                if limit is not None and len(found) >= limit:
+                    break
+        return found
+
+    def _generate(self, field : str, tidbit):
+        model = self.deck_manager.model
+        if field == 'title':
+            return model.generate_title(tidbit.data)
+        if field == 'tags':
+            return model.generate_tags(tidbit.data, self.max_tags)
+        variants = max(self.deck_manager.variants, 1)
+        existing = tidbit.questions or []
+        # a question the user wrote or one already asked stays first
+        generated = model.generate_questions(tidbit.data, variants)
+        return (existing + [q for q in generated if q not in existing])[:variants]
+
+    def enrich(self, tidbit):
+        """
+        Generates the missing fields of a tidbit one request at a time and
+        stores them. Stops before the next request once the deck is no longer
+        idle, keeping what was generated so far. Questions are skipped for
+        tidbits waiting on the generation queue
+
+        ## Parameters
+        - tidbit: tidbit to enrich
+
+        ## Returns
+        Number of fields filled in
+        """
+        needed = self.needs(tidbit)
+        claimed = 'questions' in needed and self._claim(tidbit)
+        if 'questions' in needed and not claimed:
+            needed.remove('questions')
+        try:
+            fields = {}
+            for field in needed:
+                if not self.is_idle():
+                    break
+                with METRICS.timer('enrich.' + field):
+                    value = self._generate(field, tidbit)
+                if value:
+                    fields[field] = value
+            if fields and self.deck_manager.update_tidbit(tidbit, **fields):
+                for field in fields:
+                    self.progress[field] += 1
+                    METRICS.inc('enrich.' + field)
+        finally:
+            if claimed:
+                self._release(tidbit)
+        return len(fields)
+
+    def run_once(self, now : datetime = None):
+        """
+        Enriches the cards due soon, soonest first, until none is left or the
+        deck stops being idle
+
+        ## Parameters
+        - now: timezone aware time the horizon starts from, by default now
+
+        ## Returns
+        Number of fields filled in
+        """
+        filled = 0
+        for tidbit in self.candidates(now):
+            if not self.is_idle():
+                break
+            filled += self.enrich(tidbit)
+        return filled
+
+    def start(self):
+        """
+        Starts enriching in a background thread once the deck is loaded
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = Thread(target = self._run, name = 'enricher', daemon = True)
+            self._thread.start()
+
+    def stop(self, timeout : float = None):
+        """
+        Stops the background thread after the request in flight, if any
+
+        ## Parameters
+        - timeout: optional, seconds to wait for the thread
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        self.deck_manager.loaded.wait()
+        while not self._stop.wait(self.interval):
+            if not self.is_idle():
+                continue
+            try:
+                self.run_once()
+            except Exception as e: # e.g. the model server is down, retried later
+                self.last_error = e
+                self.progress['errors'] += 1
+                METRICS.inc('enrich.errors')
+
+    def to_dict(self):
+        """
+        ## Returns
+        Json serializable dictionary of the progress and state
+        """
+        return {
+            **self.progress,
+            'running' : self._thread is not None and self._thread.is_alive(),
+            'idle' : self.is_idle(),
+            'last_error' : None if self.last_error is None else str(self.last_error)
+        }
@@ -0,0 +1,180 @@
+import asyncio
+from concurrent.futures import CancelledError, Future
+from threading import Condition, Thread
+
+
+class GenerationQueue():
+    """
+    Work queue for model requests. Jobs are run on an asyncio event loop in a
+    background thread so callers, like the eel UI, are never blocked by a
+    round trip to the language model, nor by a full queue: submit only hands
+    the item over. A fixed number of workers pull from the queue, so the
+    number of requests in flight matches the parallel slots of the model
+    server. Failed jobs are retried before their future fails.
+
+    ## Attributes
+    - job: coroutine function called with the data of each submitted item
+    - concurrency: number of requests allowed to be in flight at once
+    - max_pending: number of waiting items above which wait_for_room blocks
+    producers that can afford to wait, like an import. 0 for no limit
+    - retries: number of times a failed job is run again
+    - backoff: seconds before the first retry, doubled after every retry
+    """
+
+    def __init__(self, job, concurrency : int = 4, max_pending : int = 256,
+                 retries : int = 2, backoff : float = 0.5):
+        """
+        Starts the background event loop and its workers
+
+        ## Parameters
+        - job: coroutine function taking a single argument
+        - concurrency: number of workers pulling from the queue
+        - max_pending: waiting items before wait_for_room blocks, 0 for no
+        limit
+        - retries: times a failed job is run again
+        - backoff: seconds before the first retry
+
+        ## Raises
+        - ValueError: if concurrency is less than 1
+        """
+        if concurrency < 1:
+            raise ValueError("Concurrency must be at least 1")
+        self.job = job
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.retries = retries
+        self.backoff = backoff
+        self._loop = asyncio.new_event_loop()
+        self._queue = asyncio.Queue()
+        self._waiting = 0 # submitted and not yet started
+        self._room = Condition()
+        self._closed = False
+        self._workers = []
+        self._thread = Thread(target = self._run, daemon = True)
+        self._thread.start()
+
+    def _run(self):
+        """
+        Runs the event loop until the queue is closed
+        """
+        asyncio.set_event_loop(self._loop)
+        self._workers = [self._loop.create_task(self._worker())
+                         for _ in range(self.concurrency)]
+        self._loop.run_forever()
+
+    def _started(self):
+        with self._room:
+            self._waiting -= 1
+            self._room.notify_all()
+
+    async def _worker(self):
+        """
+        Pulls items from the queue and resolves their futures with the result of
+        the job, retrying failed jobs. A job cancelled by close resolves its
+        future with CancelledError, so nobody waits on it forever
+        """
+        while True:
+            data, future = await self._queue.get()
+            self._started()
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(await self._attempt(data))
+                    except asyncio.CancelledError:
+                        # a running future can no longer be cancelled
+                        future.set_exception(CancelledError())
+                        raise
+                    except Exception as e:
+                        future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    async def _attempt(self, data):
+        for retry in range(self.retries):
+            try:
+                return await self.job(data)
+            except Exception: # e.g. the model server restarted
+                await asyncio.sleep(self.backoff * 2 ** retry)
+        return await self.job(data)
+
+    def submit(self, data, callback = None):
+        """
+        Adds an item to the queue without waiting. Items submitted after the
+        queue is closed are cancelled
+
+        ## Parameters
+        - data: argument passed to the job
+        - callback: optional, called with the finished future
+
+        ## Returns
+        A future resolved with the result of the job
+        """
+        future = Future()
+        if callback:
+            future.add_done_callback(callback)
+        with self._room:
+            if self._closed:
+                future.cancel()
+                return future
+            self._waiting += 1
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, (data, future))
+        return future
+
+    def wait_for_room(self, timeout : float = None):
+        """
+        Blocks until fewer than max_pending items are waiting. Called by
+        producers that can afford to wait, so a large import does not queue
+        every item at once
+
+        ## Parameters
+        - timeout: optional, seconds to wait
+
+        ## Returns
+        True if there is room, False after the timeout
+        """
+        with self._room:
+            return self._room.wait_for(
+                lambda: self._closed or not self.max_pending
+                or self._waiting < self.max_pending, timeout)
+
+    def pending(self):
+        """
+        Gets the number of items waiting to be started
+
+        ## Returns
+        Number of queued items as an integer
+        """
+        return self._waiting
+
+    def join(self, timeout : float = None):
+        """
+        Waits for every submitted item to finish
+
+        ## Parameters
+        - timeout: optional, seconds to wait before raising TimeoutError
+        """
+        asyncio.run_coroutine_threadsafe(
+            self._queue.join(), self._loop).result(timeout)
+
+    def close(self):
+        """
+        Stops the workers and the event loop. Items not yet started are
+        cancelled and items in flight fail with CancelledError
+        """
+        async def _stop():
+            for worker in self._workers:
+                worker.cancel()
+            # let the workers resolve the futures of the jobs in flight
+            await asyncio.gather(*self._workers, return_exceptions = True)
+            while not self._queue.empty():
+                _, future = self._queue.get_nowait()
+                self._started()
+                future.cancel()
+            self._loop.stop()
+
+        with self._room:
+            self._closed = True
+            self._room.notify_all()
+            # queued after every item handed over before the close
+            asyncio.run_coroutine_threadsafe(_stop(), self._loop)
+        self._thread.join()
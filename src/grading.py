@@ -0,0 +1,112 @@
+import re
+from fsrs import Rating
+from generation import GenerationQueue
+
+_SCORE = re.compile(r'\d+')
+# 'Score: 3', '3/5' or '3 out of 5', the score the model settled on
+_LABELLED = re.compile(r'score\s*(?:is|of|[:=])?\s*(\d+)|(\d+)\s*(?:/|out of)\s*\d+',
+                       re.IGNORECASE)
+MAX_SCORE = 5
+
+
+def parse_score(response : str):
+    """
+    Reads the score from the response of the model. The prompt asks for a
+    single number, but models often explain themselves first and quote the
+    scale ('0 means wrong ...'). The last score written as 'Score: N', 'N/5'
+    or 'N out of 5' is used, otherwise the last number in the response. It
+    is clamped to the 0 to MAX_SCORE scale of the answer prompt
+
+    ## Parameters
+    - response: text returned by the model
+
+    ## Returns
+    The score as an integer
+
+    ## Raises
+    - ValueError: if the response has no number
+    """
+    labelled = _LABELLED.findall(response)
+    if labelled:
+        score = next(group for group in labelled[-1] if group)
+    else:
+        numbers = _SCORE.findall(response)
+        if not numbers:
+            raise ValueError(f"No score in model response: {response!r}")
+        score = numbers[-1]
+    return max(0, min(int(score), MAX_SCORE))
+
+
+def score_to_rating(score : int):
+    """
+    Maps an answer score to the rating given to the card: 0 or 1 is Again, 2
+    is Hard, 3 or 4 is Good and 5 is Easy
+
+    ## Parameters
+    - score: score from 0 to MAX_SCORE
+
+    ## Returns
+    fsrs Rating
+    """
+    if score <= 1:
+        return Rating.Again
+    if score == 2:
+        return Rating.Hard
+    if score < MAX_SCORE:
+        return Rating.Good
+    return Rating.Easy
+
+
+class AnswerGrader():
+    """
+    Grades typed answers in the background. Answers are queued on a
+    GenerationQueue so several evaluations are sent to the model at once and
+    the review loop never waits on one.
+
+    ## Attributes
+    - model: Model used to evaluate answers
+    - queue: queue running the evaluations
+    """
+
+    def __init__(self, model, concurrency : int = 4, max_pending : int = 256):
+        """
+        Creates a grader and starts its queue
+
+        ## Parameters
+        - model: Model with an aeval_answer coroutine
+        - concurrency: number of evaluations sent to the model at once
+        - max_pending: number of answers that can wait before wait_for_room
+        blocks, submit never does
+        """
+        self.model = model
+        self.queue = GenerationQueue(self._grade, concurrency, max_pending)
+
+    async def _grade(self, item):
+        data, answer = item
+        return score_to_rating(await self.model.aeval_answer(data, answer))
+
+    def submit(self, data : str, answer : str, callback = None):
+        """
+        Queues an answer to be graded
+
+        ## Parameters
+        - data: information the answer should recall
+        - answer: answer typed by the user
+        - callback: optional, called with the finished future
+
+        ## Returns
+        A future resolved with the Rating of the answer
+        """
+        return self.queue.submit((data, answer), callback)
+
+    def join(self, timeout : float = None):
+        """
+        Waits until every queued answer has been graded
+        """
+        return self.queue.join(timeout)
+
+    def close(self):
+        """
+        Stops grading, answers still queued are dropped
+        """
+        self.queue.close()
@@ -0,0 +1,91 @@
+"""
+Synthetic decks and configs shared by the benchmark, the simulator and the
+tests, and the commit their reports are for. Configs use the stub model
+client, so no model server is needed.
+"""
+import os
+import random
+import subprocess
+from datetime import datetime, timedelta, timezone
+
+import yaml
+from fsrs import Card, State
+
+from tidbit import Tidbit
+
+
+def make_config(directory : str, journal : bool = False, deck : str = 'deck.json',
+                settings : dict = None):
+    """
+    Writes a config for a deck in a directory using the stub model client
+
+    ## Parameters
+    - directory: folder for the config and deck files, created if needed
+    - journal: if True changes are journaled
+    - deck: name of the deck file
+    - settings: other config sections, e.g. {'duplicate params' : {...}}
+
+    ## Returns
+    Location of the config file
+    """
+    directory = str(directory)
+    os.makedirs(directory, exist_ok = True)
+    config = {
+        'initialized' : None,
+        'deck' : os.path.join(directory, deck),
+        'question' : os.path.join(directory, 'question.txt'),
+        'answer' : os.path.join(directory, 'answer.txt'),
+        'model params' : {'connection' : 'stub'}
+    }
+    if journal:
+        config['journal params'] = {'compact_after' : 10 ** 9}
+    config.update(settings or {})
+    config_path = os.path.join(directory, 'config.yaml')
+    with open(config_path, 'w') as file:
+        yaml.safe_dump(config, file)
+    return config_path
+
+
+def make_tidbits(size : int, seed : int = 0):
+    """
+    Generates a synthetic deck with a mix of new and reviewed cards
+
+    ## Parameters
+    - size: number of tidbits
+    - seed: seed for the random generator
+
+    ## Returns
+    List of tidbits
+    """
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    tids = []
+    for i in range(size):
+        reviewed = rng.random() < 0.7
+        card = Card(
+            card_id = i + 1,
+            state = State.Review if reviewed else State.Learning,
+            step = None if reviewed else 0,
+            stability = rng.uniform(0.5, 200) if reviewed else None,
+            difficulty = rng.uniform(1, 10) if reviewed else None,
+            due = now + timedelta(minutes = rng.randrange(-7 * 1440, 90 * 1440)),
+            last_review = now - timedelta(days = rng.randrange(1, 60)) if reviewed else None
+        )
+        data = f"Fact {i}: " + " ".join(f"word{rng.randrange(5000)}" for _ in range(20))
+        tids.append(Tidbit(card, data, question = f"What is fact {i}?",
+                           source = f"source-{i % 100}"))
+    return tids
+
+
+def git_commit():
+    """
+    Gets the current git commit, if run inside the repository
+
+    ## Returns
+    Commit hash or None
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output = True,
+                              text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,415 @@
+"""
+Streaming import of note archives into a deck. Records are read one at a time
+from Markdown, plain text, JSONL or CSV files, long passages are chunked into
+tidbit sized pieces, duplicates are dropped by content hash and the rest are
+added to the deck in batches while their questions are generated in the
+background. Progress is checkpointed so an interrupted import picks up where
+it stopped.
+"""
+import argparse
+import csv
+import json
+import os
+import re
+from hashlib import blake2b
+from itertools import islice
+from fsrs import Card
+from tidbit import Tidbit
+
+_SENTENCE = re.compile(r'(?<=[.!?])\s+')
+_HEADING = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+_LIST_ITEM = re.compile(r'^\s{0,3}(?:[-*+]|\d+[.)])\s+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def chunk_text(text : str, max_chars : int = 800):
+    """
+    Splits a passage into pieces of at most max_chars characters, breaking
+    between sentences where possible and between words otherwise
+
+    ## Parameters
+    - text: passage to split
+    - max_chars: maximum length of a piece
+
+    ## Returns
+    List of pieces, empty if the text is blank
+    """
+    text = _WHITESPACE.sub(' ', text).strip()
+    if len(text) <= max_chars:
+        return [text] if text else []
+    pieces, current = [], ''
+    for sentence in _SENTENCE.split(text):
+        words = [sentence] if len(sentence) <= max_chars else sentence.split(' ')
+        for word in words:
+            while len(word) > max_chars: # no space to break on
+                if current:
+                    pieces.append(current)
+                    current = ''
+                pieces.append(word[:max_chars])
+                word = word[max_chars:]
+            joined = f'{current} {word}' if current else word
+            if len(joined) <= max_chars:
+                current = joined
+            else:
+                pieces.append(current)
+                current = word
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def content_hash(text : str):
+    """
+    Hashes a piece of information ignoring case and whitespace, so the same
+    note imported twice is recognised
+
+    ## Returns
+    16 byte digest
+    """
+    return blake2b(_WHITESPACE.sub(' ', text).strip().lower().encode('utf-8'),
+                   digest_size = 16).digest()
+
+
+def read_text(file):
+    """
+    Reads a plain text file, one record per paragraph. Paragraphs are
+    separated by blank lines
+
+    ## Parameters
+    - file: open text file
+
+    ## Returns
+    Generator of record dictionaries
+    """
+    lines = []
+    for line in file:
+        if line.strip():
+            lines.append(line.strip())
+        elif lines:
+            yield {'data' : ' '.join(lines)}
+            lines = []
+    if lines:
+        yield {'data' : ' '.join(lines)}
+
+
+def read_markdown(file):
+    """
+    Reads a Markdown file, one record per paragraph or list item. The
+    closest heading above a record is used as its title, and fenced code
+    blocks are kept whole, marked with 'fenced' so their whitespace is kept
+
+    ## Parameters
+    - file: open text file
+
+    ## Returns
+    Generator of record dictionaries
+    """
+    title, lines, fenced = None, [], False
+
+    def _record():
+        if fenced:
+            return {'data' : '\n'.join(lines), 'title' : title, 'fenced' : True}
+        return {'data' : ' '.join(lines), 'title' : title}
+
+    for line in file:
+        stripped = line.strip()
+        if stripped.startswith('```'):
+            if fenced:
+                lines.append(stripped)
+                yield _record()
+                lines, fenced = [], False
+            else:
+                if lines:
+                    yield _record()
+                lines, fenced = [stripped], True
+            continue
+        if fenced:
+            lines.append(line.rstrip('\n'))
+            continue
+        heading = _HEADING.match(stripped)
+        if heading or not stripped or _LIST_ITEM.match(line):
+            if lines:
+                yield _record()
+                lines = []
+            if heading:
+                title = heading.group(2) or None
+                continue
+        if stripped:
+            lines.append(_LIST_ITEM.sub('', stripped) if not lines else stripped)
+    if lines:
+        yield _record()
+
+
+def _record_fields(row : dict):
+    """
+    Picks the tidbit fields out of a JSONL object or CSV row. The text may be
+    under 'data', 'text' or 'content', and tags may be a list or a string
+    separated by commas or semicolons
+    """
+    data = row.get('data') or row.get('text') or row.get('content')
+    tags = row.get('tags')
+    if isinstance(tags, str):
+        tags = [t.strip() for t in re.split(r'[;,]', tags) if t.strip()]
+    return {'data' : data, 'title' : row.get('title') or None, 'tags' : tags or None,
+            'source' : row.get('source') or None, 'question' : row.get('question') or None}
+
+
+def read_jsonl(file):
+    """
+    Reads a JSON lines file, one record per object. Lines that are not json
+    objects are skipped
+
+    ## Parameters
+    - file: open text file
+
+    ## Returns
+    Generator of record dictionaries
+    """
+    for line in file:
+        try:
+            row = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(row, dict):
+            yield _record_fields(row)
+
+
+def read_csv(file):
+    """
+    Reads a CSV file with a header row, one record per row
+
+    ## Parameters
+    - file: open text file
+
+    ## Returns
+    Generator of record dictionaries
+    """
+    for row in csv.DictReader(file):
+        yield _record_fields(row)
+
+
+def read_deck(file):
+    """
+    Reads the tidbits of a deck.json file written by DeckManager.save_deck,
+    keeping their cards and questions so merged cards keep their schedule.
+    Unlike the other formats the file is parsed whole
+
+    ## Parameters
+    - file: open text file
+
+    ## Returns
+    Generator of record dictionaries holding a 'tidbit' dictionary
+    """
+    for tidbit in json.load(file).get('deck', []):
+        yield {'data' : tidbit['data'], 'tidbit' : tidbit}
+
+
+READERS = {
+    'md' : read_markdown,
+    'markdown' : read_markdown,
+    'txt' : read_text,
+    'jsonl' : read_jsonl,
+    'csv' : read_csv,
+    'json' : read_deck
+}
+
+
+class Importer():
+    """
+    Imports archives into the deck of a DeckManager. Records flow through a
+    chain of generators, so only one batch of tidbits is held at a time, and
+    the reader waits while the generation queue of the deck holds more than
+    its max_pending questions. Duplicates are found with a set of the 16 byte
+    content hashes of the deck and of every record read, so memory still
+    grows with the number of cards plus records, just far more slowly than
+    holding the records would. Every checkpoint_every records the deck is
+    persisted and the number of records done is written to the checkpoint
+    file. A new run over the same file skips those records and requeues
+    questions left pending that are not already queued.
+
+    ## Attributes
+    - deck_manager: deck the records are added to
+    - max_chars: longest tidbit, longer passages are chunked
+    - batch_size: tidbits added to the deck per command
+    - checkpoint_every: records between checkpoints
+    - progress: counts of the current or last import, 'done' once it finished
+    and 'error' if it failed
+    """
+
+    def __init__(self, deck_manager, max_chars : int = 800, batch_size : int = 100,
+                 checkpoint_every : int = 1000):
+        """
+        ## Parameters
+        - deck_manager: DeckManager to import into
+        - max_chars: maximum length of an imported tidbit
+        - batch_size: number of tidbits added to the deck at once
+        - checkpoint_every: number of records between checkpoints
+        """
+        self.deck_manager = deck_manager
+        self.max_chars = max_chars
+        self.batch_size = batch_size
+        self.checkpoint_every = checkpoint_every
+        self.progress = {'records' : 0, 'added' : 0, 'duplicates' : 0, 'done' : False}
+
+    def checkpoint_path(self):
+        """
+        ## Returns
+        Location of the checkpoint file, next to the deck
+        """
+        return self.deck_manager.config['deck'] + '.import.json'
+
+    def _read_checkpoint(self, file_path : str):
+        """
+        Reads the checkpoint of an earlier import of the same, unchanged file
+
+        ## Returns
+        Checkpoint dictionary, with no records done if there is none
+        """
+        stat = os.stat(file_path)
+        fresh = {'file' : os.path.abspath(file_path), 'size' : stat.st_size,
+                 'mtime' : stat.st_mtime, 'records' : 0, 'added' : 0, 'duplicates' : 0}
+        try:
+            with open(self.checkpoint_path(), 'r') as file:
+                checkpoint = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return fresh
+        if any(checkpoint.get(k) != fresh[k] for k in ('file', 'size', 'mtime')):
+            return fresh
+        return checkpoint
+
+    def _persist(self):
+        # journaled adds are already on disk, otherwise the deck is saved
+        dm = self.deck_manager
+        if dm.storage is None or dm.storage.needs_compaction():
+            dm.save_deck()
+
+    def _write_checkpoint(self, checkpoint : dict):
+        # the deck is persisted first so the checkpoint never runs ahead of it
+        self._persist()
+        tmp_path = self.checkpoint_path() + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(checkpoint, file)
+        os.replace(tmp_path, self.checkpoint_path())
+
+    def records(self, file_path : str, fmt : str = None):
+        """
+        Streams the tidbit sized records of a file
+
+        ## Parameters
+        - file_path: archive to read
+        - fmt: one of the READERS, taken from the extension if not given
+
+        ## Returns
+        Generator of record dictionaries, long records split into several.
+        Fenced code is neither split nor has its whitespace collapsed
+
+        ## Raises
+        - ValueError: if the format is not supported
+        """
+        fmt = (fmt or os.path.splitext(file_path)[1].lstrip('.')).lower()
+        if fmt not in READERS:
+            raise ValueError(f"Cannot import {fmt} files")
+        with open(file_path, 'r', encoding = 'utf-8', errors = 'replace', newline = '') as file:
+            for record in READERS[fmt](file):
+                if 'tidbit' in record or record.get('fenced'):
+                    yield record
+                    continue
+                for piece in chunk_text(str(record.get('data') or ''), self.max_chars):
+                    yield {**record, 'data' : piece}
+
+    def _add(self, batch : list):
+        dm = self.deck_manager
+        dm.add_tidbits(batch)
+        self.progress['added'] += len(batch)
+        # the import waits for the model, the UI never does
+        if dm.generator is not None:
+            dm.generator.wait_for_room()
+
+    def _tidbit(self, record : dict, source : str, tags : list):
+        if 'tidbit' in record:
+            return Tidbit.from_dict(record['tidbit'])
+        return Tidbit(Card(), record['data'],
+                      title = record.get('title'),
+                      tags = record.get('tags') or tags,
+                      question = record.get('question'),
+                      source = record.get('source') or source)
+
+    def run(self, file_path : str, fmt : str = None, source : str = None,
+            tags : list = None, wait : bool = True):
+        """
+        Imports a file, resuming from the checkpoint of an interrupted import
+
+        ## Parameters
+        - file_path: archive to import
+        - fmt: format of the archive, taken from the extension if not given
+        - source: source of records that do not name one
+        - tags: tags of records that have none
+        - wait: if True returns once every question is generated and saved
+
+        ## Returns
+        Dictionary with the number of 'records' read, tidbits 'added' and
+        'duplicates' skipped
+
+        ## Raises
+        - ValueError: if the format is not supported
+        """
+        dm = self.deck_manager
+        dm.loaded.wait() # duplicates are checked against the whole deck
+        checkpoint = self._read_checkpoint(file_path)
+        done = checkpoint['records']
+        self.progress = {'records' : done, 'added' : checkpoint['added'],
+                         'duplicates' : checkpoint['duplicates'], 'done' : False}
+        # only cards that are not already waiting on the generation queue
+        dm.resume_questions()
+        seen = {content_hash(t.data) for t in dm.snapshot()}
+
+        batch = []
+        try:
+            records = islice(enumerate(self.records(file_path, fmt)), done, None)
+            for index, record in records:
+                key = content_hash(record['data'])
+                if key in seen:
+                    self.progress['duplicates'] += 1
+                else:
+                    seen.add(key)
+                    batch.append(self._tidbit(record, source, tags))
+                self.progress['records'] = index + 1
+                checkpoint_due = (index + 1) % self.checkpoint_every == 0
+                if len(batch) >= self.batch_size or checkpoint_due:
+                    self._add(batch)
+                    batch = []
+                if checkpoint_due:
+                    self._write_checkpoint({**checkpoint, **self.progress})
+            self._add(batch)
+
+            if wait:
+                dm.wait_for_questions()
+            self._persist()
+        except Exception as e:
+            self.progress['error'] = str(e)
+            raise
+        if os.path.exists(self.checkpoint_path()):
+            os.remove(self.checkpoint_path())
+        self.progress['done'] = True
+        return {k : self.progress[k] for k in ('records', 'added', 'duplicates')}
+
+
+def main():
+    from deck_manager import DeckManager
+
+    parser = argparse.ArgumentParser(description = "Import notes into a deck")
+    parser.add_argument('file', help = "md, txt, jsonl, csv or deck json file to import")
+    parser.add_argument('--config', default = 'config.yaml', help = "config of the deck")
+    parser.add_argument('--format', default = None, help = "format if not the extension")
+    parser.add_argument('--source', default = None, help = "source of the notes")
+    parser.add_argument('--tags', nargs = '*', default = None, help = "tags of the notes")
+    parser.add_argument('--max-chars', type = int, default = 800,
+                        help = "longest tidbit, longer passages are split")
+    args = parser.parse_args()
+
+    importer = Importer(DeckManager(args.config), max_chars = args.max_chars)
+    print(json.dumps(importer.run(args.file, args.format, args.source, args.tags)))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,86 @@
+import startup
+import json
 import eel
-from deck_manager import DeckManager
+from deck_manager import DeckManager, DuplicateTidbitError
+from review_session import ReviewSession
+from metrics import METRICS
+from importer import Importer
+from threading import Thread
 
+startup.REPORT.mark('imports')
 eel.init("web")
 
-dm = DeckManager("config.yaml")
+# the deck loads in the background and the model connects on first use
+dm = DeckManager("config.yaml", background = True, report = startup.REPORT)
+session = ReviewSession(dm)
+importer = Importer(dm)
+import_thread = None
+
+def expose(func):
+    """
+    Exposes a handler to the frontend, timing each call under 'eel.<name>'
+    """
+    return eel.expose(METRICS.timed('eel.' + func.__name__)(func))
 
 # *** REVIEW ***
-@eel.expose
+@expose
 def review_tidbit(rating: int):
-    tid = dm.get_next_tidbit()
-    if tid == None:
+    """
+    Reviews the next card due
+
+    ## Parameters
+    - rating: rating of the review, 1 to 4
+
+    ## Returns
+    The card due after it, or None if there is none
+    """
+    if dm.review_next(rating) is None:
         return None
-    
-    dm.review_tidbit(tid, rating)
-    return dm.deck[0].to_dict()
+    tid = dm.peek_tidbit()
+    return tid.to_dict() if tid is not None else None
+
+@expose
+def start_review():
+    """
+    Starts a review session
+
+    ## Returns
+    List of the next cards to review, soonest due first
+    """
+    return session.start()
+
+@expose
+def rate_card(card_id: int, rating: int):
+    """
+    Rates a card from the review session. The rating is applied in the
+    background
+
+    ## Parameters
+    - card_id: id of the card that was reviewed
+    - rating: rating of the review, 1 to 4
+
+    ## Returns
+    List of cards to add to the end of the review buffer
+    """
+    return session.rate(card_id, rating)
+
+@expose
+def answer_card(card_id: int, answer: str):
+    """
+    Submits a typed answer for a card from the review session. The answer is
+    graded by the model and the card rated in the background
+
+    ## Parameters
+    - card_id: id of the card that was answered
+    - answer: answer typed by the user
+
+    ## Returns
+    List of cards to add to the end of the review buffer
+    """
+    return session.answer(card_id, answer)
 
 # *** ADD ***
-@eel.expose
+@expose
 def add_tidbit(data: str, usr_question: str, source: str, title: str):
     """
     Creates a new tidbit in the deck
@@ -34,9 +98,93 @@ def add_tidbit(data: str, usr_question: str, source: str, title: str):
                         title = title if title != "" else None)
     
     # get what ever card is next in the queue
-    return dm.deck[0].to_dict()
+    nxt = dm.peek_tidbit()
+    return nxt.to_dict() if nxt else None
 
-@eel.expose
+@expose
+def add_tidbit_stream(data: str, usr_question: str, source: str, title: str,
+                      force: bool = False):
+    """
+    Creates a new tidbit in the deck, pushing the question to the
+    receive_question_token javascript function as the model writes it. The
+    card is added once the question is complete
+
+    ## Parameters
+    - data: the information to remember
+    - usr_question: question passed from user, if empty, model will generate question
+    - source: source of the information
+    - title: title of the tidbit
+    - force: if True the tidbit is added even if it is a near duplicate
+
+    ## Returns
+    The new tidbit as a dictionary, or a dictionary with the 'duplicate'
+    tidbit and its 'similarity' if a near duplicate is already in the deck
+    """
+    def push_token(token):
+        eel.receive_question_token(token)
+        eel.sleep(0)
+
+    try:
+        tid = dm.add_tidbit(data = data,
+                            usr_question = usr_question if usr_question != "" else None,
+                            source = source if source != "" else None,
+                            title = title if title != "" else None,
+                            on_token = push_token,
+                            allow_duplicate = force)
+    except DuplicateTidbitError as e:
+        return {'duplicate' : e.tidbit.to_dict(), 'similarity' : e.similarity}
+    return tid.to_dict()
+
+@expose
+def add_tidbits_bulk(datas: list, source: str):
+    """
+    Creates many tidbits at once. Cards are added right away and their
+    questions are generated in the background
+
+    ## Parameters
+    - datas: list of information to remember
+    - source: source of the information, shared by every tidbit
+
+    ## Returns
+    The number of tidbits added
+    """
+    tids = dm.add_tidbits_bulk(datas, source = source if source != "" else None)
+    return len(tids)
+
+@expose
+def import_file(file_path: str, source: str = ""):
+    """
+    Starts importing a Markdown, text, JSONL, CSV or deck json file in the
+    background. An interrupted import of the same file resumes where it
+    stopped
+
+    ## Parameters
+    - file_path: location of the file to import
+    - source: source of the notes, if the file does not name one
+
+    ## Returns
+    False if an import is already running
+    """
+    global import_thread
+    if import_thread is not None and import_thread.is_alive():
+        return False
+    import_thread = Thread(target = importer.run, daemon = True,
+                           args = (file_path, None, source if source != "" else None))
+    import_thread.start()
+    return True
+
+@expose
+def get_import_progress():
+    """
+    Reports the records read, tidbits added and duplicates skipped by the
+    current or last import
+
+    ## Returns
+    Dictionary of counts, 'done' is True once the import finished
+    """
+    return importer.progress
+
+@expose
 def get_deck():
     """
     Returns a list of all the cards in the deck formatted as dictionaries.
@@ -44,9 +192,71 @@ def get_deck():
     ## Returns
     - list of all contents of the deck in dictionary format
     """
-    return [tid.to_dict() for tid in dm.deck]
+    return [tid.to_dict() for tid in dm.snapshot()]
+
+@expose
+def get_deck_page(offset: int = 0, limit: int = 50, fields: list = None,
+                  sort: str = 'due', descending: bool = False):
+    """
+    Returns one page of the deck, see DeckManager.query_deck
+
+    ## Parameters
+    - offset: number of cards to skip
+    - limit: maximum number of cards to return
+    - fields: card attributes to include, None for all of them
+    - sort: one of 'due', 'created' or 'title'
+    - descending: if True the order is reversed
+
+    ## Returns
+    Dictionary with the 'total' number of cards, the 'items' of the page and
+    the 'next' offset or None
+    """
+    return dm.query_deck(offset, limit, fields, sort, descending)
+
+@expose
+def stream_deck(fields: list = None, sort: str = 'due', chunk_size: int = 200):
+    """
+    Pushes the whole deck to the frontend in chunks. Each chunk is sent to the
+    receive_cards javascript function, yielding between chunks so the UI and
+    other requests are not blocked
+
+    ## Parameters
+    - fields: card attributes to include, None for all of them
+    - sort: one of 'due', 'created' or 'title'
+    - chunk_size: number of cards per chunk
+
+    ## Returns
+    The number of cards sent
+    """
+    offset = 0
+    while offset is not None:
+        page = dm.query_deck(offset, chunk_size, fields, sort)
+        eel.receive_cards(page['items'])
+        offset = page['next']
+        eel.sleep(0)
+    return page['total']
+
+@expose
+def search_tidbits(query: str = "", tags: list = None, source: str = "",
+                   limit: int = 50, fields: list = None):
+    """
+    Finds the cards containing every word of a query, see
+    DeckManager.search_tidbits
 
-@eel.expose
+    ## Parameters
+    - query: words to look for in the data, title and questions
+    - tags: tags the cards must have
+    - source: source the cards must come from, ignored if empty
+    - limit: maximum number of cards to return
+    - fields: card attributes to include, None for all of them
+
+    ## Returns
+    Dictionary with the 'total' number of matches and the 'items' found
+    """
+    return dm.search_tidbits(query, tags, source if source != "" else None,
+                             limit, fields)
+
+@expose
 def get_deck_size():
     """
     Gets the number of entries in the deck
@@ -54,23 +264,182 @@ def get_deck_size():
     ## Returns
     The number of cards in the deck as an integer
     """
-    return len(dm.deck)
+    return dm.deck_size()
+
+@expose
+def pause_card(card_id: int):
+    """
+    Stops a card from being reviewed without deleting it
+
+    ## Parameters
+    - card_id: id of the card to pause
+
+    ## Returns
+    True if the card was paused, False if it is not in the deck
+    """
+    return _change_card(dm.pause_card, card_id)
+
+@expose
+def resume_card(card_id: int):
+    """
+    Allows a paused card to be reviewed again
+
+    ## Parameters
+    - card_id: id of the card to resume
+
+    ## Returns
+    True if the card was resumed, False if it is not in the deck
+    """
+    return _change_card(dm.resume_card, card_id)
+
+@expose
+def delete_card(card_id: int):
+    """
+    Removes a card from the deck
+
+    ## Parameters
+    - card_id: id of the card to delete
+
+    ## Returns
+    True if the card was deleted, False if it is not in the deck
+    """
+    return _change_card(dm.delete_card, card_id)
+
+def _change_card(change, card_id: int):
+    # the card may have been deleted, or taken out for review, since the
+    # page was shown
+    tid = dm.get_tidbit(card_id)
+    if tid is None:
+        return False
+    try:
+        change(tid)
+    except KeyError:
+        return False
+    return True
 
 # *** SETTINGS ***
-@eel.expose
+@expose
 def save_deck():
     """
     Save the deck to the location specified in config.yaml
     """
     dm.save_deck()
 
-@eel.expose
+@expose
+def optimize_schedule():
+    """
+    Starts fitting the scheduler to the review history in the background
+
+    ## Returns
+    True if the fit was started, False if there are not enough reviews
+    """
+    return dm.optimize_schedule() is not None
+
+@expose
+def get_optimize_status():
+    """
+    Reports whether a scheduler fit is running and why the last one failed
+
+    ## Returns
+    Dictionary of the fit status
+    """
+    return dm.optimize_status()
+
+@expose
 def load_deck():
     """
     Load the deck from the location specified in config.yaml
     """
     return dm.load_deck()
 
+@expose
+def get_backend_stats():
+    """
+    Reports the load and latency of each model server when requests are
+    routed over several servers
+
+    ## Returns
+    List of dictionaries, one per server
+    """
+    return dm.model.backend_stats()
+
+@expose
+def get_startup_report():
+    """
+    Reports how long each phase of startup took and which heavy modules have
+    been imported so far
+
+    ## Returns
+    Dictionary of the startup phases
+    """
+    return startup.REPORT.to_dict()
+
+@expose
+def get_generation_status():
+    """
+    Reports the questions waiting to be generated and the generations that
+    failed
+
+    ## Returns
+    Dictionary of the generation status
+    """
+    return dm.generation_status()
+
+@expose
+def get_enrichment_status():
+    """
+    Reports how many titles, tags and question sets were filled in while
+    the deck was idle
+
+    ## Returns
+    Dictionary of the enrichment progress, None if enrichment is disabled
+    """
+    return None if dm.enricher is None else dm.enricher.to_dict()
+
+# *** METRICS ***
+@expose
+def get_metrics():
+    """
+    Gets the counters and timing histograms recorded so far
+
+    ## Returns
+    Dictionary of the metrics
+    """
+    return METRICS.to_dict()
+
+@expose
+def set_metrics_enabled(enabled: bool):
+    """
+    Turns recording of metrics on or off
+    """
+    METRICS.enabled = bool(enabled)
+    return METRICS.enabled
+
+@expose
+def reset_metrics():
+    """
+    Drops the metrics recorded so far
+    """
+    METRICS.reset()
+
+@expose
+def export_metrics(fmt: str = 'json'):
+    """
+    Dumps the metrics for offline analysis
+
+    ## Parameters
+    - fmt: 'json' or 'prometheus'
+
+    ## Returns
+    The metrics as text
+    """
+    if fmt == 'prometheus':
+        return METRICS.to_prometheus()
+    return json.dumps(METRICS.to_dict(), indent = 2)
 
 
-eel.start("index.html")
\ No newline at end of file
+startup.REPORT.mark('window')
+try:
+    eel.start("index.html")
+finally:
+    dm.close()
\ No newline at end of file
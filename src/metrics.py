@@ -0,0 +1,280 @@
+"""
+Lightweight instrumentation of the hot paths. Counters and histograms live in
+the METRICS registry; while it is disabled every timer and counter returns
+after a single attribute check, so instrumented code can stay instrumented.
+"""
+import json
+import os
+import re
+from bisect import bisect_left
+from functools import wraps
+from threading import Lock
+from time import perf_counter
+
+# upper bounds in seconds of the histogram buckets, the last bucket is +Inf
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_INVALID = re.compile(r'[^a-zA-Z0-9_]')
+
+
+class Histogram():
+    """
+    Distribution of observed durations over fixed buckets
+
+    ## Attributes
+    - bounds: upper bound of each bucket
+    - counts: number of observations in each bucket, one more than bounds for
+    observations above the last bound
+    - count: number of observations
+    - total: sum of the observations
+    - min: smallest observation
+    - max: largest observation
+    """
+
+    def __init__(self, bounds : tuple = BUCKETS):
+        """
+        Creates an empty histogram
+
+        ## Parameters
+        - bounds: sorted upper bounds of the buckets
+        """
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value : float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q : float):
+        """
+        Estimates a quantile from the buckets, interpolating linearly inside
+        the bucket it falls in
+
+        ## Parameters
+        - q: quantile between 0 and 1
+
+        ## Returns
+        Estimated value, or None if nothing was observed
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                low = self.bounds[i - 1] if i > 0 else 0.0
+                high = self.bounds[i] if i < len(self.bounds) else self.max
+                estimate = low + (high - low) * (rank - seen) / n
+                return max(self.min, min(estimate, self.max))
+            seen += n
+        return self.max
+
+    def to_dict(self):
+        """
+        ## Returns
+        Dictionary with the count, sum, min, max, mean, estimated p50, p95
+        and p99, and the cumulative count of each bucket
+        """
+        cumulative, buckets = 0, {}
+        for bound, n in zip(self.bounds + ('+Inf',), self.counts):
+            cumulative += n
+            buckets[str(bound)] = cumulative
+        return {
+            'count' : self.count,
+            'sum' : self.total,
+            'min' : self.min,
+            'max' : self.max,
+            'mean' : self.total / self.count if self.count else None,
+            'p50' : self.quantile(0.5),
+            'p95' : self.quantile(0.95),
+            'p99' : self.quantile(0.99),
+            'buckets' : buckets
+        }
+
+
+class Metrics():
+    """
+    Registry of counters and duration histograms. Names are dotted, e.g.
+    'model.generate_question', and are turned into Prometheus names on export
+
+    ## Attributes
+    - enabled: if False nothing is recorded
+    - counters: value of each counter
+    - histograms: Histogram of each timer
+    """
+
+    def __init__(self, enabled : bool = False):
+        """
+        Creates an empty registry
+
+        ## Parameters
+        - enabled: record metrics from the start
+        """
+        self.enabled = enabled
+        self.counters = {}
+        self.histograms = {}
+        self._lock = Lock()
+
+    def inc(self, name : str, value : int = 1):
+        """
+        Adds to a counter
+
+        ## Parameters
+        - name: name of the counter
+        - value: amount to add
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name : str, seconds : float):
+        """
+        Records a duration
+
+        ## Parameters
+        - name: name of the timer
+        - seconds: duration to record
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def timer(self, name : str):
+        """
+        Times a block of code
+
+            with METRICS.timer('deck.save'):
+                ...
+
+        ## Parameters
+        - name: name of the timer
+
+        ## Returns
+        Context manager recording the duration of the block
+        """
+        return _Timer(self, name)
+
+    def timed(self, name : str):
+        """
+        Decorator timing every call of a function. Calls that raise are also
+        counted under '<name>.errors'
+
+        ## Parameters
+        - name: name of the timer
+        """
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                except BaseException:
+                    self.inc(name + '.errors')
+                    raise
+                finally:
+                    self.observe(name, perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        """
+        Drops everything recorded so far
+        """
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def to_dict(self):
+        """
+        ## Returns
+        Json serializable dictionary of every counter and histogram
+        """
+        with self._lock:
+            return {
+                'enabled' : self.enabled,
+                'counters' : dict(self.counters),
+                'histograms' : {name : h.to_dict() for name, h in self.histograms.items()}
+            }
+
+    def to_prometheus(self, prefix : str = 'tidbit'):
+        """
+        Formats the metrics in the Prometheus text exposition format.
+        Counters are exported as '<name>_total' and timers as histograms of
+        seconds
+
+        ## Parameters
+        - prefix: prepended to every metric name
+
+        ## Returns
+        The metrics as text
+        """
+        def _name(name):
+            return _INVALID.sub('_', f'{prefix}_{name}' if prefix else name)
+
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                metric = _name(name) + '_total'
+                lines += [f'# TYPE {metric} counter', f'{metric} {value}']
+            for name, histogram in sorted(self.histograms.items()):
+                metric = _name(name) + '_seconds'
+                lines.append(f'# TYPE {metric} histogram')
+                cumulative = 0
+                for bound, n in zip(histogram.bounds + ('+Inf',), histogram.counts):
+                    cumulative += n
+                    lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+                lines += [f'{metric}_sum {histogram.total}',
+                          f'{metric}_count {histogram.count}']
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, file_path : str):
+        """
+        Writes the metrics to a file, in the Prometheus text format if the
+        file ends in .prom or .txt and as json otherwise
+
+        ## Parameters
+        - file_path: location to write to
+        """
+        if os.path.splitext(file_path)[1] in ('.prom', '.txt'):
+            text = self.to_prometheus()
+        else:
+            text = json.dumps(self.to_dict(), indent = 2)
+        with open(file_path, 'w') as file:
+            file.write(text)
+
+
+class _Timer():
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics : Metrics, name : str):
+        self.metrics = metrics
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        if self.metrics.enabled:
+            self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.start is not None:
+            self.metrics.observe(self.name, perf_counter() - self.start)
+        return False
+
+
+METRICS = Metrics()
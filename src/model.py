@@ -1,4 +1,15 @@
-from ollama import Client
+import hashlib
+import math
+import re
+import httpx
+from ollama import Client, AsyncClient
+from connection import CircuitBreaker, HealthChecker, ModelUnavailableError
+from question import Question, parse_title, parse_tags
+from grading import parse_score
+from metrics import METRICS
+
+# errors caused by the server being unreachable, as opposed to a bad request
+_CONNECTION_ERRORS = (ConnectionError, httpx.TransportError)
 
 class Model():
     """
@@ -7,30 +18,144 @@ class Model():
     
     ## Attributes
     - connection: name of the languge model to connect to
+    - cache: optional, cache of previous responses checked before every request
+    - breaker: circuit breaker shared by every request to the server
+    - health: health checker reconnecting in the background once the breaker
+    opens
+
+    No request is made when the model is created, the connection is opened on
+    first use. If the server stops responding requests fail fast with
+    ModelUnavailableError until the health checker reaches it again.
     """
 
-    def __init__(self, connection : str, **kwargs):
+    def __init__(self, connection : str, cache = None,
+                 failure_threshold : int = 3, reset_timeout : float = 30,
+                 **kwargs):
         """
         Initializes the connection the the model
         
         ## Parameters
         - connection: name of the model to connect to
+        - cache: optional, ResponseCache shared by every request
+        - failure_threshold: failed requests in a row before the server is
+        considered unavailable
+        - reset_timeout: longest wait in seconds between reconnection attempts
         - kwargs: params that are specific to the language model connection,
         should include anything needed to establish the connection
         """
         self.model_client = None
+        self.async_client = None
         self.connection = connection
+        self.cache = cache
+        self.model_type = kwargs.get('model_type')
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.health = HealthChecker(self._probe, self.breaker.record_success,
+                                    max_delay = reset_timeout)
         if connection == 'ollama':
             self.model_client = OllamaClient(**kwargs)
+            self.async_client = AsyncOllamaClient(**kwargs)
+        elif connection == 'stub':
+            self.model_client = StubClient(**kwargs)
+            self.async_client = AsyncStubClient(**kwargs)
+        elif connection == 'router':
+            from router import RouterClient, AsyncRouterClient, make_backends
+            self.model_client = RouterClient(make_backends(**kwargs),
+                                             kwargs.get('question'),
+                                             kwargs.get('answer'),
+                                             self.model_type)
+            self.async_client = AsyncRouterClient(self.model_client)
         else:
             raise ValueError(f"Invalid Model Connection: {connection}")
-        
-        # TODO IO block, could be good to async
+
+    def is_available(self):
+        """
+        Checks if requests are currently sent to the server, without contacting
+        it
+
+        ## Returns
+        False if the server stopped responding and has not recovered yet
+        """
+        return self.breaker.state != 'open'
+
+    def _probe(self):
+        """
+        Pings the server from the health checker on a fresh connection
+        """
+        self.model_client.reset()
+        self.async_client.reset()
+        self.model_client.ping()
+
+    def _failed(self, error : Exception):
+        """
+        Records a failed request and starts reconnecting if the server is now
+        considered unavailable
+
+        ## Raises
+        - ModelUnavailableError: always, caused by error
+        """
+        if self.breaker.record_failure():
+            self.health.start()
+        raise ModelUnavailableError(
+            f"Model server is unavailable: {error}") from error
+
+    def _call(self, request):
+        """
+        Sends a request through the circuit breaker
+
+        ## Parameters
+        - request: function without arguments that calls the model
+
+        ## Returns
+        The response to the request
+
+        ## Raises
+        - ModelUnavailableError: if the server cannot be reached
+        """
+        if not self.breaker.allow():
+            METRICS.inc('model.rejected')
+            raise ModelUnavailableError("Model server is unavailable")
         try:
-            self.model_client.client.list()
-        except ConnectionError:
-            self.model_client = None
-        
+            with METRICS.timer('model.request'):
+                response = request()
+        except _CONNECTION_ERRORS as e:
+            self._failed(e)
+        self.breaker.record_success()
+        return response
+
+    async def _acall(self, request):
+        """
+        Asynchronous version of _call, request must return an awaitable
+        """
+        if not self.breaker.allow():
+            METRICS.inc('model.rejected')
+            raise ModelUnavailableError("Model server is unavailable")
+        try:
+            with METRICS.timer('model.request'):
+                response = await request()
+        except _CONNECTION_ERRORS as e:
+            self._failed(e)
+        self.breaker.record_success()
+        return response
+
+    def backend_stats(self):
+        """
+        Reports the load and latency of each model server
+
+        ## Returns
+        List of dictionaries, one per backend, empty unless the model is a
+        router
+        """
+        stats = getattr(self.model_client, 'stats', None)
+        return stats() if stats is not None else []
+
+    def close(self):
+        """
+        Stops the health checker and closes the pooled connections
+        """
+        self.health.stop()
+        self.model_client.close_connection()
+        self.async_client.close_connection()
+
     def get_question_prompt(self):
         """
         Returns the current prompt for generating questions
@@ -40,8 +165,215 @@ class Model():
         """
         return self.model_client.question_prompt
 
+    def _cached(self, kind : str, prompt : str, data, request):
+        """
+        Returns the cached response for a request, calling the model only on a
+        cache miss
+
+        ## Parameters
+        - kind: type of request, part of the cache key
+        - prompt: system prompt sent with the request
+        - data: content sent with the request
+        - request: function without arguments that calls the model
+
+        ## Returns
+        The response to the request
+        """
+        if self.cache is None:
+            return self._call(request)
+        key = self.cache.make_key(kind, self.model_type, prompt, data)
+        response = self.cache.get(key)
+        if response is None:
+            response = self._call(request)
+            self.cache.put(key, response)
+        return response
+
+    async def _acached(self, kind : str, prompt : str, data, request):
+        """
+        Asynchronous version of _cached, request must return an awaitable
+        """
+        if self.cache is None:
+            return await self._acall(request)
+        key = self.cache.make_key(kind, self.model_type, prompt, data)
+        response = self.cache.get(key)
+        if response is None:
+            response = await self._acall(request)
+            self.cache.put(key, response)
+        return response
+
+    @METRICS.timed('model.generate_question')
     def generate_question(self, data):
-        return self.model_client.generate_question(data)['message']['content']
+        return self._cached(
+            'question', self.get_question_prompt(), data,
+            lambda: self.model_client.generate_question(data)['message']['content']
+        )
+
+    async def agenerate_question(self, data):
+        """
+        Generates a question without blocking the calling event loop. Used by
+        the generation queue so several requests can be in flight at once
+
+        ## Parameters
+        - data: information used to generate a question
+
+        ## Returns
+        A new question about the data
+        """
+        async def _request():
+            response = await self.async_client.generate_question(data)
+            return response['message']['content']
+        return await self._acached('question', self.get_question_prompt(),
+                                   data, _request)
+
+    @METRICS.timed('model.generate_questions')
+    def generate_questions(self, data, k : int = 1):
+        """
+        Generates several different questions about the same information with
+        a single request
+
+        ## Parameters
+        - data: information used to generate the questions
+        - k: number of questions wanted
+
+        ## Returns
+        List of at most k questions
+        """
+        if k <= 1:
+            return [self.generate_question(data)]
+        response = self._cached(
+            'questions', self.get_question_prompt(), [data, k],
+            lambda: self.model_client.generate_question(data, k)['message']['content']
+        )
+        return Question.parse(response, k)
+
+    async def agenerate_questions(self, data, k : int = 1):
+        """
+        Asynchronous version of generate_questions, used by the generation
+        queue
+        """
+        if k <= 1:
+            return [await self.agenerate_question(data)]
+
+        async def _request():
+            response = await self.async_client.generate_question(data, k)
+            return response['message']['content']
+        response = await self._acached('questions', self.get_question_prompt(),
+                                       [data, k], _request)
+        return Question.parse(response, k)
+
+    def stream_question(self, data, k : int = 1):
+        """
+        Generates a question piece by piece as the model produces it. Cached
+        questions are returned as a single piece. When k is more than 1 the
+        model lists k questions, one per line, to be split with Question.parse
+
+        ## Parameters
+        - data: information used to generate a question
+        - k: number of questions wanted
+
+        ## Returns
+        Generator of strings that join into the response
+        """
+        prompt = self.get_question_prompt()
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key('question', self.model_type, prompt, data) \
+                if k <= 1 else self.cache.make_key('questions', self.model_type, prompt, [data, k])
+            response = self.cache.get(key)
+            if response is not None:
+                yield response
+                return
+
+        if not self.breaker.allow():
+            raise ModelUnavailableError("Model server is unavailable")
+        parts = []
+        try:
+            for part in self.model_client.stream_question(data, k):
+                parts.append(part)
+                yield part
+        except _CONNECTION_ERRORS as e:
+            self._failed(e)
+        self.breaker.record_success()
+        if key is not None:
+            self.cache.put(key, ''.join(parts))
+
+    @METRICS.timed('model.generate_title')
+    def generate_title(self, data):
+        """
+        Generates a title for a piece of information
+
+        ## Parameters
+        - data: information to title
+
+        ## Returns
+        A title as a string, None if the model gave none
+        """
+        response = self._cached(
+            'title', self.model_client.title_prompt, data,
+            lambda: self.model_client.generate_title(data)['message']['content'])
+        return parse_title(response)
+
+    @METRICS.timed('model.generate_tags')
+    def generate_tags(self, data, k : int = 5):
+        """
+        Generates a list of tags describing a piece of information
+
+        ## Parameters
+        - data: information to tag
+        - k: maximum number of tags
+
+        ## Returns
+        A list of at most k lowercase tags
+        """
+        response = self._cached(
+            'tags', self.model_client.tags_prompt, [data, k],
+            lambda: self.model_client.generate_tags(data, k)['message']['content'])
+        return parse_tags(response, k)
+
+    def eval_answer(self, data, answer):
+        """
+        Evaluates an answer against the information it should recall
+
+        ## Parameters
+        - data: information the answer is compared with
+        - answer: answer given by the user
+
+        ## Returns
+        The score of the answer, from 0 to 5
+
+        ## Raises
+        - ValueError: if the model response has no score
+        """
+        response = self._cached(
+            'answer', self.get_answer_prompt(), [data, answer],
+            lambda: self.model_client.eval_answer(data, answer)['message']['content'])
+        return parse_score(response)
+
+    async def aeval_answer(self, data, answer):
+        """
+        Asynchronous version of eval_answer, used to grade answers in the
+        background
+        """
+        async def _request():
+            response = await self.async_client.eval_answer(data, answer)
+            return response['message']['content']
+        response = await self._acached('answer', self.get_answer_prompt(),
+                                       [data, answer], _request)
+        return parse_score(response)
+
+    def embed(self, data):
+        """
+        Computes an embedding of a piece of information, used to find near
+        duplicates
+
+        ## Parameters
+        - data: information to embed
+
+        ## Returns
+        The embedding as a list of floats
+        """
+        return self._cached('embedding', getattr(self.model_client, 'embedding_model', None),
+                            data, lambda: self.model_client.embed(data))
     
     def get_answer_prompt(self):
         """
@@ -74,36 +406,142 @@ class ModelClient():
         """
         self.question_prompt = question
         self.answer_prompt = answer
+        self.title_prompt = ("Write a short title, at most eight words, for the following "
+                             "information. Reply with the title only.")
+        self.tags_prompt = ("List a few short topic tags for the following information, "
+                            "separated by commas. Reply with the tags only.")
         if question == None:
             self.question_prompt = """Create a question based on the following information:"""
         if answer == None:
             self.answer_prompt = """Evalute the following input on a scale from 1 to 5. With 5 being the best"""
 
-    def generate_question(self):
+    def question_messages(self, data : str, k : int = 1):
+        """
+        Builds the chat messages asking for questions about the data
+
+        ## Parameters
+        - data: information used to generate a question
+        - k: number of questions wanted, listed one per line when more than 1
+
+        ## Returns
+        List of chat messages
+        """
+        prompt = self.question_prompt
+        if k > 1:
+            prompt += (f"\nWrite {k} different questions about the information, "
+                       "each asking about it in a different way. Put each question "
+                       "on its own line and do not number them.")
+        return [{'role' : 'system', 'content' : prompt},
+                {'role' : 'user', 'content' : data}]
+
+    def generate_question(self, data, k = 1):
         raise NotImplementedError()
 
-    def eval_answer(self):
+    def stream_question(self, data, k = 1):
+        """
+        Generates a question piece by piece. Clients that cannot stream yield
+        the whole question at once
+
+        ## Returns
+        Generator of strings that join into the question
+        """
+        yield self.generate_question(data, k)['message']['content']
+
+    def answer_messages(self, data : str, answer : str):
+        """
+        Builds the chat messages asking the model to grade an answer
+
+        ## Parameters
+        - data: information the answer should recall
+        - answer: answer given by the user
+
+        ## Returns
+        List of chat messages
+        """
+        return [{'role' : 'system', 'content' : self.answer_prompt},
+                {'role' : 'user',
+                 'content' : f"Information:\n{data}\n\nAnswer:\n{answer}"}]
+
+    def eval_answer(self, data, answer):
         raise NotImplementedError()
-    
-    def generate_tags(self):
+
+    def title_messages(self, data : str):
+        """
+        Builds the chat messages asking for a title for the data
+
+        ## Returns
+        List of chat messages
+        """
+        return [{'role' : 'system', 'content' : self.title_prompt},
+                {'role' : 'user', 'content' : data}]
+
+    def tags_messages(self, data : str, k : int = 5):
+        """
+        Builds the chat messages asking for tags describing the data
+
+        ## Parameters
+        - data: information to tag
+        - k: maximum number of tags
+
+        ## Returns
+        List of chat messages
+        """
+        return [{'role' : 'system', 'content' : f"{self.tags_prompt} Give at most {k} tags."},
+                {'role' : 'user', 'content' : data}]
+
+    def generate_tags(self, data, k = 5):
         raise NotImplementedError()
     
-    def generate_title(self):
+    def generate_title(self, data):
+        raise NotImplementedError()
+
+    def embed(self, data):
         raise NotImplementedError()
     
+    def ping(self):
+        raise NotImplementedError()
+
+    def reset(self):
+        """
+        Drops pooled connections so the next request reconnects. Clients
+        without a connection have nothing to do
+        """
+        return None
+
     def close_connection(self):
         raise NotImplementedError()
     
     
+def _client_options(timeout : float, max_connections : int):
+    """
+    Builds the httpx options shared by the ollama clients: a per request
+    timeout and a pool of keep-alive connections
+
+    ## Returns
+    Dictionary of keyword arguments for Client and AsyncClient
+    """
+    return {
+        'timeout' : httpx.Timeout(timeout, connect = min(timeout, 5)),
+        'limits' : httpx.Limits(max_connections = max_connections,
+                                max_keepalive_connections = max_connections)
+    }
+
+
 class OllamaClient(ModelClient):
-    """Connection to an ollama model"""
+    """
+    Connection to an ollama model. The underlying client is created on first
+    use and keeps a pool of keep-alive connections to the server.
+    """
 
     def __init__(self,
                  model_type : str,
                  host : str = 'http://localhost:11434',
                  headers : dict = None,
                  question : str = None,
-                 answer : str = None):
+                 answer : str = None,
+                 timeout : float = 120,
+                 max_connections : int = 10,
+                 embedding_model : str = None):
         """
         Creates an instance of a connection to an ollama client
         ## Parameters
@@ -112,39 +550,366 @@ class OllamaClient(ModelClient):
         - headers: optional, parameters used for server connection
         - question: prompt used to generate quiz questions
         - answer: prompt used to evaluate answers
+        - timeout: seconds before a request is abandoned
+        - max_connections: size of the connection pool
+        - embedding_model: model used for embeddings, defaults to model_type
         """
         
         super().__init__(question, answer)
         self.model_type = model_type
-        self.client = Client(
-            host = host,
-            # headers = headers
-        )
+        self.host = host
+        self.headers = headers
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.embedding_model = embedding_model or model_type
+        self._client = None
+        self._transport = None
+
+    @property
+    def client(self):
+        """
+        The ollama client, connected on first use. Its connection pool is a
+        transport owned here, so reset can close it
+        """
+        if self._client is None:
+            options = _client_options(self.timeout, self.max_connections)
+            self._transport = httpx.HTTPTransport(limits = options.pop('limits'))
+            self._client = Client(host = self.host, headers = self.headers,
+                                  transport = self._transport, **options)
+        return self._client
      
-    def generate_question(self, data : str):
+    def generate_question(self, data : str, k : int = 1):
         """
         Generates a question about the data passed using the current prompt and
         returns the result as a string
 
         ## Paramerters
         - data: information used to generate a question
+        - k: number of questions wanted, listed one per line when more than 1
 
         ## Returns
         A new question about the data
         """
         return self.client.chat(model = self.model_type,
-                         messages = [{
-                             'role' : 'system',
-                             'content' : self.question_prompt
-                         },
-                         {
-                             'role' : 'user',
-                             'content' : data
-                         }])        
-    
+                                messages = self.question_messages(data, k))
+
+    def stream_question(self, data : str, k : int = 1):
+        """
+        Generates a question about the data, yielding the text as the model
+        produces it
+
+        ## Paramerters
+        - data: information used to generate a question
+        - k: number of questions wanted, listed one per line when more than 1
+
+        ## Returns
+        Generator of strings that join into the question
+        """
+        stream = self.client.chat(model = self.model_type,
+                                  messages = self.question_messages(data, k),
+                                  stream = True)
+        for part in stream:
+            content = part['message']['content']
+            if content:
+                yield content
+
+    def eval_answer(self, data : str, answer : str):
+        """
+        Asks the model to score an answer against the information it should
+        recall, using the answer prompt
+
+        ## Parameters
+        - data: information the answer should recall
+        - answer: answer given by the user
+
+        ## Returns
+        The chat response containing the score
+        """
+        return self.client.chat(model = self.model_type,
+                                messages = self.answer_messages(data, answer))
+
+    def generate_title(self, data : str):
+        """
+        Asks the model for a short title for the data
+
+        ## Returns
+        The chat response containing the title
+        """
+        return self.client.chat(model = self.model_type,
+                                messages = self.title_messages(data))
+
+    def generate_tags(self, data : str, k : int = 5):
+        """
+        Asks the model for at most k comma separated tags describing the data
+
+        ## Returns
+        The chat response containing the tags
+        """
+        return self.client.chat(model = self.model_type,
+                                messages = self.tags_messages(data, k))
+
+    def embed(self, data : str):
+        """
+        Computes an embedding of the data with the embedding model
+
+        ## Returns
+        The embedding as a list of floats
+        """
+        response = self.client.embed(model = self.embedding_model, input = data)
+        return list(response['embeddings'][0])
+
+    def ping(self):
+        """
+        Checks that the ollama server can be reached
+
+        ## Raises
+        - ConnectionError: if the server is not available
+        """
+        self.client.list()
+        return True
+
+    def reset(self):
+        """
+        Closes the connection pool, the next request creates a new client
+        """
+        transport, self._transport, self._client = self._transport, None, None
+        if transport is not None:
+            transport.close()
+
+    def close_connection(self):
+        """
+        Closes the pooled connections to the server
+        """
+        self.reset()
+        return True
+
+
+class AsyncModelClient(ModelClient):
+    """
+    Interface for asynchronous model client connections. Mirrors ModelClient,
+    but each request is a coroutine so that many requests can be awaited
+    concurrently.
+    """
+
+    async def generate_question(self, data, k = 1):
+        raise NotImplementedError()
+
+    async def eval_answer(self, data, answer):
+        raise NotImplementedError()
+
+    async def generate_tags(self, data, k = 5):
+        raise NotImplementedError()
+
+    async def generate_title(self, data):
+        raise NotImplementedError()
+
+    async def embed(self, data):
+        raise NotImplementedError()
+
+
+class AsyncOllamaClient(AsyncModelClient):
+    """
+    Asynchronous connection to an ollama model, created on first use like
+    OllamaClient
+    """
+
+    def __init__(self,
+                 model_type : str,
+                 host : str = 'http://localhost:11434',
+                 headers : dict = None,
+                 question : str = None,
+                 answer : str = None,
+                 timeout : float = 120,
+                 max_connections : int = 10,
+                 embedding_model : str = None):
+        """
+        Creates an instance of an asynchronous connection to an ollama client
+        ## Parameters
+        - model_type: type supported by ollama
+        - host: address of ollama server, likely localhost:11434
+        - headers: optional, parameters used for server connection
+        - question: prompt used to generate quiz questions
+        - answer: prompt used to evaluate answers
+        - timeout: seconds before a request is abandoned
+        - max_connections: size of the connection pool
+        - embedding_model: model used for embeddings, defaults to model_type
+        """
+
+        super().__init__(question, answer)
+        self.model_type = model_type
+        self.host = host
+        self.headers = headers
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.embedding_model = embedding_model or model_type
+        self._client = None
+
+    @property
+    def client(self):
+        """
+        The ollama client, connected on first use
+        """
+        if self._client is None:
+            self._client = AsyncClient(host = self.host, headers = self.headers,
+                                       **_client_options(self.timeout, self.max_connections))
+        return self._client
+
+    async def generate_question(self, data : str, k : int = 1):
+        """
+        Generates a question about the data passed using the current prompt
+
+        ## Paramerters
+        - data: information used to generate a question
+        - k: number of questions wanted, listed one per line when more than 1
+
+        ## Returns
+        The chat response containing the new question
+        """
+        return await self.client.chat(model = self.model_type,
+                                      messages = self.question_messages(data, k))
+
+    async def eval_answer(self, data : str, answer : str):
+        """
+        Asks the model to score an answer, see OllamaClient.eval_answer
+
+        ## Returns
+        The chat response containing the score
+        """
+        return await self.client.chat(model = self.model_type,
+                                      messages = self.answer_messages(data, answer))
+
+    def reset(self):
+        """
+        Forgets the connection pool, the next request opens a new one. The
+        old pool is bound to the event loop that used it, so it is left for
+        that loop to clean up rather than closed from another thread
+        """
+        self._client = None
+
     def close_connection(self):
         """
-        Ollama does not require the connection to the server to close.
+        Drops the pooled connections to the server
         """
+        self.reset()
         return True
 
+
+class StubClient(ModelClient):
+    """
+    Deterministic client that never contacts a server. Used for tests,
+    benchmarks and simulations where the content of the questions does not
+    matter.
+    """
+
+    def __init__(self,
+                 model_type : str = 'stub',
+                 question : str = None,
+                 answer : str = None,
+                 **kwargs):
+        """
+        Creates a stub client, extra connection params are ignored
+
+        ## Parameters
+        - model_type: name reported as the model
+        - question: prompt used to generate quiz questions
+        - answer: prompt used to evaluate answers
+        """
+        super().__init__(question, answer)
+        self.model_type = model_type
+
+    def generate_question(self, data : str, k : int = 1):
+        """
+        Builds a question from the first words of the data, with k variants
+        listed one per line
+
+        ## Returns
+        A chat response in the same shape as an ollama response
+        """
+        questions = [f"What do you remember about: {data[:60]}?"]
+        questions += [f"{i}. What else do you know about: {data[:60]}?" for i in range(2, k + 1)]
+        return {'message' : {'content' : '\n'.join(questions)}}
+
+    def stream_question(self, data : str, k : int = 1):
+        """
+        Yields the stub question one word at a time, like a streaming model
+        """
+        words = self.generate_question(data, k)['message']['content'].split(' ')
+        for i, word in enumerate(words):
+            yield word if i == 0 else ' ' + word
+
+    def eval_answer(self, data : str, answer : str):
+        """
+        Scores an answer by the share of the words of the data it contains,
+        from 0 to 5
+
+        ## Returns
+        A chat response in the same shape as an ollama response
+        """
+        expected = set(re.findall(r'\w+', data.lower()))
+        given = set(re.findall(r'\w+', answer.lower()))
+        score = round(5 * len(expected & given) / len(expected)) if expected else 0
+        return {'message' : {'content' : str(score)}}
+
+    def generate_title(self, data : str):
+        """
+        Uses the first words of the data as its title
+
+        ## Returns
+        A chat response in the same shape as an ollama response
+        """
+        return {'message' : {'content' : ' '.join(data.split()[:6])}}
+
+    def generate_tags(self, data : str, k : int = 5):
+        """
+        Uses the k longest distinct words of the data as its tags
+
+        ## Returns
+        A chat response in the same shape as an ollama response
+        """
+        words = dict.fromkeys(w for w in re.findall(r'[a-z]+', data.lower()) if len(w) > 3)
+        tags = sorted(words, key = len, reverse = True)[:k]
+        return {'message' : {'content' : ', '.join(tags)}}
+
+    def embed(self, data : str, dim : int = 64):
+        """
+        Hashes the words of the data into a bag of words vector, so texts
+        sharing most of their words are similar
+
+        ## Returns
+        The embedding as a list of floats
+        """
+        vector = [0.0] * dim
+        for word in re.findall(r'\w+', data.lower()):
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % dim] += 1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def ping(self):
+        return True
+
+    def close_connection(self):
+        return True
+
+
+class AsyncStubClient(AsyncModelClient):
+    """Asynchronous version of StubClient"""
+
+    def __init__(self, **kwargs):
+        """
+        Creates an asynchronous stub client
+
+        ## Parameters
+        - kwargs: same as StubClient
+        """
+        self._stub = StubClient(**kwargs)
+        super().__init__(self._stub.question_prompt, self._stub.answer_prompt)
+        self.model_type = self._stub.model_type
+
+    async def generate_question(self, data : str, k : int = 1):
+        return self._stub.generate_question(data, k)
+
+    async def eval_answer(self, data : str, answer : str):
+        return self._stub.eval_answer(data, answer)
+
+    def close_connection(self):
+        return True
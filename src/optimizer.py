@@ -0,0 +1,96 @@
+from concurrent.futures import ProcessPoolExecutor
+from fsrs import Optimizer, ReviewLog, Scheduler
+
+
+def fit_parameters(review_logs : list):
+    """
+    Fits FSRS parameters to a review history. Runs in a worker process, so the
+    review logs are passed as dictionaries
+
+    ## Parameters
+    - review_logs: list of ReviewLog dictionaries
+
+    ## Returns
+    List of fitted parameters
+
+    ## Raises
+    - ImportError: if torch, needed by the fsrs optimizer, is not installed
+    """
+    logs = [ReviewLog.from_dict(log) for log in review_logs]
+    return list(Optimizer(logs).compute_optimal_parameters())
+
+
+def with_parameters(schedule : Scheduler, parameters : list):
+    """
+    Copies a scheduler with new parameters, keeping every other setting
+
+    ## Parameters
+    - schedule: scheduler to copy
+    - parameters: new FSRS parameters
+
+    ## Returns
+    A new Scheduler
+    """
+    return Scheduler(
+        parameters = parameters,
+        desired_retention = schedule.desired_retention,
+        learning_steps = schedule.learning_steps,
+        relearning_steps = schedule.relearning_steps,
+        maximum_interval = schedule.maximum_interval,
+        enable_fuzzing = schedule.enable_fuzzing
+    )
+
+
+class BackgroundOptimizer():
+    """
+    Runs FSRS parameter fitting in a process pool so the UI is not blocked
+    while the optimizer runs. Only one fit runs at a time, a new request while
+    one is running returns the running job and its callback is called when
+    that job finishes.
+
+    ## Attributes
+    - fit: function fitting parameters to a list of ReviewLog dictionaries,
+    must be picklable
+    - running: future of the fit in progress or None
+    """
+
+    def __init__(self, fit = fit_parameters):
+        """
+        Creates the optimizer, the worker process is started on first use
+
+        ## Parameters
+        - fit: top level function used to fit parameters
+        """
+        self.fit = fit
+        self.running = None
+        self._pool = None
+
+    def submit(self, review_logs : list, callback = None):
+        """
+        Starts fitting parameters in the background
+
+        ## Parameters
+        - review_logs: list of ReviewLog
+        - callback: optional, called with the finished future
+
+        ## Returns
+        Future resolved with the fitted parameters
+        """
+        if self.running is not None and not self.running.done():
+            if callback:
+                self.running.add_done_callback(callback)
+            return self.running
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers = 1)
+        self.running = self._pool.submit(self.fit, [log.to_dict() for log in review_logs])
+        if callback:
+            self.running.add_done_callback(callback)
+        return self.running
+
+    def shutdown(self):
+        """
+        Stops the worker process, waiting for a running fit to finish
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
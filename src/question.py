@@ -1,15 +1,77 @@
-from collections import deque
+import re
+
+# numbering or bullets a model may put in front of each question
+_LIST_MARKER = re.compile(r'^\s*(?:\d+\s*[.):]|[-*•])\s*')
+_TITLE_PREFIX = re.compile(r'^\s*(?:#+\s*|title\s*:\s*)', re.IGNORECASE)
+_TAG_SPLIT = re.compile(r'[,;\n]+')
+_TAG_MARKER = re.compile(r'^\s*(?:(?:\d+\s*[.):]|[-*•#])\s*)+')
+_WHITESPACE = re.compile(r'\s+')
+
 
 class Question():
     """
-    Represents a question or set of questions tied to a given card.
+    Parsing of the questions tied to a given card. The question variants
+    themselves, and their rotation between reviews, are kept on the Tidbit.
     """
 
-    data : str
-    questions: list[str]
-    
-    def __init__(self,
-                 data : str):
+    @staticmethod
+    def parse(response : str, k : int = None):
+        """
+        Splits a model response listing several questions, one per line,
+        removing any numbering
+
+        ## Parameters
+        - response: text returned by the model
+        - k: optional, maximum number of questions to keep
+
+        ## Returns
+        List of questions, the whole response if no line is left
         """
-        Generates a new question"""
-        pass
\ No newline at end of file
+        questions = [_LIST_MARKER.sub('', line).strip() for line in response.splitlines()]
+        questions = [q for q in questions if q]
+        if not questions:
+            return [response.strip()] if response.strip() else []
+        return questions[:k] if k else questions
+
+
+def parse_title(response : str, max_chars : int = 80):
+    """
+    Cleans up a title returned by the model: only the first line is kept,
+    without heading marks, a 'Title:' prefix, surrounding quotes or a final
+    period
+
+    ## Parameters
+    - response: text returned by the model
+    - max_chars: longest title kept, longer ones are cut between words
+
+    ## Returns
+    The title, None if the response is blank
+    """
+    lines = [line for line in response.splitlines() if line.strip()]
+    if not lines:
+        return None
+    title = _TITLE_PREFIX.sub('', lines[0]).strip().strip('"\'*`').strip().rstrip('.')
+    if len(title) > max_chars:
+        title = title[:max_chars].rsplit(' ', 1)[0]
+    return title or None
+
+
+def parse_tags(response : str, k : int = 5):
+    """
+    Splits the tags returned by the model on commas, semicolons or lines.
+    Tags are lowercased, numbering and '#' are removed, inner spaces become
+    dashes and repeats are dropped
+
+    ## Parameters
+    - response: text returned by the model
+    - k: maximum number of tags
+
+    ## Returns
+    List of at most k tags
+    """
+    tags = []
+    for tag in _TAG_SPLIT.split(response):
+        tag = _WHITESPACE.sub('-', _TAG_MARKER.sub('', tag).strip().strip('"\'.').lower())
+        if tag and len(tag) <= 40 and tag not in tags:
+            tags.append(tag)
+    return tags[:k]
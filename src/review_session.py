@@ -0,0 +1,180 @@
+from functools import partial
+from queue import Queue
+from threading import Condition, Thread
+from fsrs import Rating
+
+
+class ReviewSession():
+    """
+    Keeps the next cards to review ready on the frontend. The frontend is sent
+    a buffer of already serialized cards, shows the next one as soon as a card
+    is rated, and sends the rating back. Ratings are applied to the deck by a
+    background worker, so the UI never waits on the scheduler, the heap or the
+    journal. Typed answers are graded by the model and their rating is queued
+    once the grade is known, so a slow grade never holds up the ratings
+    behind it.
+
+    ## Attributes
+    - deck_manager: deck being reviewed
+    - size: number of cards kept in the frontend buffer
+    - grade_timeout: seconds flush waits for answers still being graded.
+    Answers not graded by then are dropped and their cards stay due
+    - last_error: error of the last rating that could not be written back,
+    or None
+    """
+
+    def __init__(self, deck_manager, size : int = 10, grade_timeout : float = 60):
+        """
+        Creates a session and starts its write back worker
+
+        ## Parameters
+        - deck_manager: DeckManager to review
+        - size: number of cards kept ready
+        - grade_timeout: seconds flush waits for answers being graded
+        """
+        self.deck_manager = deck_manager
+        self.size = size
+        self.grade_timeout = grade_timeout
+        self.last_error = None
+        self._buffered = set() # card ids sent to the frontend and not yet rated
+        self._rated = set() # card ids rated but not yet written back
+        self._ratings = Queue()
+        self._grading = {} # card id of each answer being graded, by future
+        self._settled = Condition() # notified when a graded rating is queued
+        self._worker = Thread(target = self._write_back, daemon = True)
+        self._worker.start()
+
+    def start(self):
+        """
+        Starts a new round of reviews, dropping anything previously buffered.
+        If the deck is loading in the background this waits for its soonest
+        due cards
+
+        ## Returns
+        List of up to size serialized cards, soonest due first
+        """
+        self.deck_manager.ready.wait()
+        self.flush()
+        self._buffered = set()
+        return self._refill()
+
+    def rate(self, card_id : int, rating : int):
+        """
+        Queues the rating of a buffered card and tops up the buffer
+
+        ## Parameters
+        - card_id: id of the rated card
+        - rating: fsrs Rating as an integer
+
+        ## Returns
+        List of serialized cards to append to the frontend buffer
+
+        ## Raises
+        - ValueError: if rating is not a Rating, the card stays buffered
+        """
+        rating = Rating(rating)
+        self._buffered.discard(card_id)
+        self._rated.add(card_id)
+        self._ratings.put((card_id, rating))
+        return self._refill()
+
+    def answer(self, card_id : int, answer : str):
+        """
+        Queues a typed answer of a buffered card to be graded by the model.
+        The rating is queued for write back by a callback once the grade is
+        known, without waiting for it here
+
+        ## Parameters
+        - card_id: id of the answered card
+        - answer: answer typed by the user
+
+        ## Returns
+        List of serialized cards to append to the frontend buffer
+        """
+        dm = self.deck_manager
+        tidbit = dm.get_tidbit(card_id)
+        self._buffered.discard(card_id)
+        if tidbit is None:
+            return self._refill()
+        self._rated.add(card_id)
+        future = dm.grade_answer(tidbit, answer)
+        with self._settled:
+            self._grading[future] = card_id
+        future.add_done_callback(partial(self._graded, card_id))
+        return self._refill()
+
+    def _graded(self, card_id : int, future):
+        """
+        Queues the rating of a graded answer. Answers that failed to be graded,
+        or were dropped by flush, leave their card due
+        """
+        with self._settled:
+            if future not in self._grading:
+                return # dropped after the timeout
+            if future.cancelled() or future.exception() is not None:
+                self.last_error = future.exception() if not future.cancelled() \
+                    else RuntimeError(f"Grading of card {card_id} was cancelled")
+                self._rated.discard(card_id)
+            else:
+                self._ratings.put((card_id, future.result()))
+            # queued before it stops counting as graded, so flush sees it
+            del self._grading[future]
+            self._settled.notify_all()
+
+    def _refill(self):
+        """
+        Serializes the soonest due cards that are not already buffered or
+        waiting to be written back
+
+        ## Returns
+        List of serialized cards
+        """
+        dm = self.deck_manager
+        return dm.commands.call(self._next_cards, self.size - len(self._buffered))
+
+    def _next_cards(self, wanted : int):
+        # runs on the writer thread of the deck manager, the heap is not
+        # changed while it is walked
+        dm = self.deck_manager
+        cards = []
+        for tid in dm.deck.ordered():
+            if len(cards) >= wanted or tid.paused:
+                break
+            if tid.card.card_id in self._buffered or tid.card.card_id in self._rated:
+                continue
+            self._buffered.add(tid.card.card_id)
+            cards.append(dm.serialize_tidbit(tid, None))
+        return cards
+
+    def _write_back(self):
+        """
+        Applies queued ratings to the deck one at a time. A rating that fails
+        is dropped and kept in last_error, the card stays due and the worker
+        goes on
+        """
+        dm = self.deck_manager
+        while True:
+            card_id, rating = self._ratings.get()
+            try:
+                dm.review_card(card_id, rating)
+            except Exception as e:
+                self.last_error = e
+            finally:
+                self._rated.discard(card_id)
+                self._ratings.task_done()
+
+    def flush(self):
+        """
+        Waits until every queued rating has been applied. Answers still being
+        graded are waited on for up to grade_timeout seconds, then dropped
+        """
+        with self._settled:
+            grading = list(self._grading)
+            self._settled.wait_for(lambda: not any(f in self._grading for f in grading),
+                                   self.grade_timeout)
+            late = {f : self._grading.pop(f) for f in grading if f in self._grading}
+        for future, card_id in late.items():
+            future.cancel()
+            self._rated.discard(card_id)
+            self.last_error = TimeoutError(f"Card {card_id} was not graded in time")
+        self._ratings.join()
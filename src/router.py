@@ -0,0 +1,356 @@
+from threading import Lock
+from time import perf_counter
+from ollama import ResponseError
+from connection import CircuitBreaker
+from model import ModelClient, AsyncModelClient, OllamaClient, AsyncOllamaClient
+from model import _CONNECTION_ERRORS
+
+
+def _should_fail_over(error : Exception):
+    """
+    Checks if a failed request should be retried on another backend: the
+    server could not be reached or had an internal error. Bad requests would
+    fail the same way everywhere and are raised right away
+
+    ## Returns
+    True if another backend should be tried
+    """
+    if isinstance(error, ResponseError):
+        return error.status_code >= 500
+    return isinstance(error, _CONNECTION_ERRORS)
+
+
+class Backend():
+    """
+    One model server of a router, with the statistics used to balance
+    requests. The same backend is shared by the synchronous and asynchronous
+    routers so the load of both is counted together.
+
+    ## Attributes
+    - host: address of the server
+    - weight: relative share of the requests the server should get
+    - client: synchronous client for the server
+    - async_client: asynchronous client for the server
+    - breaker: skips the server for a while after it fails
+    - outstanding: requests currently in flight
+    - requests: number of successful requests
+    - failures: number of failed requests
+    - seconds: total time spent on successful requests
+    """
+
+    def __init__(self, client : ModelClient, async_client : AsyncModelClient,
+                 host : str, weight : float = 1, reset_timeout : float = 30):
+        """
+        Creates a backend
+
+        ## Parameters
+        - client: synchronous client for the server
+        - async_client: asynchronous client for the server
+        - host: address of the server, used in reports
+        - weight: relative share of the requests
+        - reset_timeout: seconds a failed server is skipped for
+        """
+        if weight <= 0:
+            raise ValueError(f"Backend weight must be positive: {weight}")
+        self.host = host
+        self.weight = weight
+        self.client = client
+        self.async_client = async_client
+        self.breaker = CircuitBreaker(failure_threshold = 1, reset_timeout = reset_timeout)
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.seconds = 0.0
+        self._lock = Lock()
+
+    def load(self):
+        """
+        ## Returns
+        Outstanding requests relative to the weight of the backend, counting
+        the request about to be sent
+        """
+        return (self.outstanding + 1) / self.weight
+
+    def latency(self):
+        """
+        ## Returns
+        Mean seconds per successful request, 0 before the first one
+        """
+        return self.seconds / self.requests if self.requests else 0.0
+
+    def begin(self):
+        """
+        Counts a request as in flight
+
+        ## Returns
+        Start time of the request
+        """
+        with self._lock:
+            self.outstanding += 1
+        return perf_counter()
+
+    def end(self, start : float, error : Exception = None):
+        """
+        Counts a request as done
+
+        ## Parameters
+        - start: value returned by begin
+        - error: optional, exception raised by the request
+        """
+        with self._lock:
+            self.outstanding -= 1
+            if error is None:
+                self.requests += 1
+                self.seconds += perf_counter() - start
+            else:
+                self.failures += 1
+        if error is None:
+            self.breaker.record_success()
+        elif _should_fail_over(error):
+            self.breaker.record_failure()
+
+    def stats(self):
+        """
+        ## Returns
+        Dictionary describing the load and latency of the backend
+        """
+        return {
+            'host' : self.host,
+            'weight' : self.weight,
+            'available' : self.breaker.state != 'open',
+            'outstanding' : self.outstanding,
+            'requests' : self.requests,
+            'failures' : self.failures,
+            'latency_ms' : self.latency() * 1000
+        }
+
+
+def make_backends(model_type : str, backends : list, question : str = None,
+                  answer : str = None, timeout : float = 120,
+                  max_connections : int = 10, reset_timeout : float = 30,
+                  embedding_model : str = None):
+    """
+    Builds ollama backends from the 'backends' list of the model params
+
+    ## Parameters
+    - model_type: model used on every server unless a backend sets its own
+    - backends: list of dictionaries with a 'host' and optionally a 'weight',
+    'model_type', 'timeout', 'max_connections' or 'embedding_model'
+    - question: prompt used to generate quiz questions
+    - answer: prompt used to evaluate answers
+    - timeout: default seconds before a request is abandoned
+    - max_connections: default size of each connection pool
+    - reset_timeout: seconds a failed server is skipped for
+    - embedding_model: default model used for embeddings
+
+    ## Returns
+    List of backends
+    """
+    if not backends:
+        raise ValueError("The router needs at least one backend")
+    built = []
+    for params in backends:
+        options = {
+            'model_type' : params.get('model_type', model_type),
+            'host' : params['host'],
+            'headers' : params.get('headers'),
+            'question' : question,
+            'answer' : answer,
+            'timeout' : params.get('timeout', timeout),
+            'max_connections' : params.get('max_connections', max_connections),
+            'embedding_model' : params.get('embedding_model', embedding_model)
+        }
+        built.append(Backend(OllamaClient(**options), AsyncOllamaClient(**options),
+                             params['host'], params.get('weight', 1), reset_timeout))
+    return built
+
+
+class RouterClient(ModelClient):
+    """
+    Spreads requests over several model servers. Each request goes to the
+    available backend with the fewest outstanding requests relative to its
+    weight. If the server cannot be reached the request is sent to the next
+    backend, and the failed one is skipped until its breaker lets a trial
+    request through.
+    """
+
+    def __init__(self, backends : list, question : str = None,
+                 answer : str = None, model_type : str = None):
+        """
+        Creates a router
+
+        ## Parameters
+        - backends: list of Backend
+        - question: prompt used to generate quiz questions
+        - answer: prompt used to evaluate answers
+        - model_type: name reported as the model
+        """
+        super().__init__(question, answer)
+        self.backends = backends
+        self.model_type = model_type
+
+    def _order(self):
+        """
+        Orders the backends for a request, least loaded first. Backends with
+        an open breaker are only tried when every backend is failing
+
+        ## Returns
+        List of backends
+        """
+        ranked = sorted(self.backends, key = lambda b: (b.load(), b.latency()))
+        ready = [b for b in ranked if b.breaker.retry_due()]
+        return ready or ranked
+
+    def _dispatch(self, method : str, *args):
+        """
+        Sends a request to the backends until one answers
+
+        ## Parameters
+        - method: name of the client method to call
+        - args: arguments of the method
+
+        ## Returns
+        The response of the first backend that answered
+
+        ## Raises
+        The error of the last backend tried if none answered
+        """
+        error = None
+        for backend in self._order():
+            start = backend.begin()
+            try:
+                response = getattr(backend.client, method)(*args)
+            except Exception as e:
+                backend.end(start, e)
+                if not _should_fail_over(e):
+                    raise
+                error = e
+                continue
+            backend.end(start)
+            return response
+        raise error
+
+    def generate_question(self, data : str, k : int = 1):
+        return self._dispatch('generate_question', data, k)
+
+    def stream_question(self, data : str, k : int = 1):
+        """
+        Streams a question from the least loaded backend. Fails over to the
+        next backend only if nothing was received yet, a stream that breaks
+        part way raises its error
+
+        ## Returns
+        Generator of strings that join into the question
+        """
+        error = None
+        for backend in self._order():
+            start = backend.begin()
+            started = False
+            try:
+                for part in backend.client.stream_question(data, k):
+                    started = True
+                    yield part
+            except GeneratorExit:
+                backend.end(start)
+                raise
+            except Exception as e:
+                backend.end(start, e)
+                if started or not _should_fail_over(e):
+                    raise
+                error = e
+                continue
+            backend.end(start)
+            return
+        raise error
+
+    def eval_answer(self, data, answer):
+        return self._dispatch('eval_answer', data, answer)
+
+    def generate_tags(self, data, k = 5):
+        return self._dispatch('generate_tags', data, k)
+
+    def generate_title(self, data):
+        return self._dispatch('generate_title', data)
+
+    def embed(self, data):
+        return self._dispatch('embed', data)
+
+    def ping(self):
+        """
+        Checks that at least one backend can be reached
+
+        ## Raises
+        - ConnectionError: if no server is available
+        """
+        return self._dispatch('ping')
+
+    def reset(self):
+        for backend in self.backends:
+            backend.client.reset()
+
+    def close_connection(self):
+        for backend in self.backends:
+            backend.client.close_connection()
+        return True
+
+    def stats(self):
+        """
+        ## Returns
+        List with the statistics of every backend
+        """
+        return [backend.stats() for backend in self.backends]
+
+
+class AsyncRouterClient(AsyncModelClient):
+    """Asynchronous version of RouterClient, sharing its backends"""
+
+    def __init__(self, router : RouterClient):
+        """
+        Creates an asynchronous router
+
+        ## Parameters
+        - router: synchronous router whose backends are used
+        """
+        super().__init__(router.question_prompt, router.answer_prompt)
+        self.router = router
+        self.model_type = router.model_type
+
+    async def _dispatch(self, method : str, *args):
+        """
+        Asynchronous version of RouterClient._dispatch
+        """
+        error = None
+        for backend in self.router._order():
+            start = backend.begin()
+            try:
+                response = await getattr(backend.async_client, method)(*args)
+            except Exception as e:
+                backend.end(start, e)
+                if not _should_fail_over(e):
+                    raise
+                error = e
+                continue
+            backend.end(start)
+            return response
+        raise error
+
+    async def generate_question(self, data : str, k : int = 1):
+        return await self._dispatch('generate_question', data, k)
+
+    async def eval_answer(self, data, answer):
+        return await self._dispatch('eval_answer', data, answer)
+
+    async def generate_tags(self, data, k = 5):
+        return await self._dispatch('generate_tags', data, k)
+
+    async def generate_title(self, data):
+        return await self._dispatch('generate_title', data)
+
+    def reset(self):
+        for backend in self.router.backends:
+            backend.async_client.reset()
+
+    def close_connection(self):
+        for backend in self.router.backends:
+            backend.async_client.close_connection()
+        return True
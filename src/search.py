@@ -0,0 +1,203 @@
+import re
+from tidbit import Tidbit
+
+_TOKEN = re.compile(r'\w+')
+
+
+def tokenize(text : str):
+    """
+    Splits text into lower case words
+
+    ## Parameters
+    - text: text to split, may be None
+
+    ## Returns
+    List of tokens
+    """
+    return _TOKEN.findall(text.lower()) if text else []
+
+
+class SearchIndex():
+    """
+    Inverted index over the tidbits of a deck. The data, title and every
+    question variant of a tidbit are split into words, and each word maps to
+    the ids of the cards containing it. Tags and sources are matched exactly,
+    tags ignoring case. A query only touches the postings of its own words, so
+    it does not scan the deck.
+
+    ## Attributes
+    - tokens: card ids for each word
+    - tags: card ids for each lower case tag
+    - sources: card ids for each source
+    """
+
+    def __init__(self):
+        """
+        Creates an empty index
+        """
+        self.tokens = {}
+        self.tags = {}
+        self.sources = {}
+        self._docs = {} # card_id -> (tokens, tags, source) indexed for the card
+
+    @classmethod
+    def from_tidbits(cls, tidbits):
+        """
+        Builds an index over tidbits
+
+        ## Parameters
+        - tidbits: iterable of tidbits
+
+        ## Returns
+        A new index
+        """
+        index = cls()
+        for tid in tidbits:
+            index.add(tid)
+        return index
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, card_id : int):
+        return card_id in self._docs
+
+    def card_ids(self):
+        """
+        ## Returns
+        List of the ids of every indexed card
+        """
+        return list(self._docs)
+
+    @staticmethod
+    def _fields(tidbit : Tidbit):
+        """
+        Gets the terms a tidbit is indexed under
+
+        ## Returns
+        Tuple of the words, lower case tags and source
+        """
+        words = set(tokenize(tidbit.data))
+        words.update(tokenize(tidbit.title))
+        for question in tidbit.questions or []:
+            words.update(tokenize(question))
+        tags = tuple({t.lower() for t in tidbit.tags or []})
+        return tuple(words), tags, tidbit.source
+
+    def _post(self, card_id : int, words, tags, source):
+        for word in words:
+            self.tokens.setdefault(word, set()).add(card_id)
+        for tag in tags:
+            self.tags.setdefault(tag, set()).add(card_id)
+        if source is not None:
+            self.sources.setdefault(source, set()).add(card_id)
+        self._docs[card_id] = (words, tags, source)
+
+    def add(self, tidbit : Tidbit):
+        """
+        Indexes a tidbit, replacing what was indexed for its card before
+
+        ## Parameters
+        - tidbit: tidbit to index
+        """
+        card_id = tidbit.card.card_id
+        if card_id in self._docs:
+            self.remove(card_id)
+        self._post(card_id, *self._fields(tidbit))
+
+    def update(self, tidbit : Tidbit):
+        """
+        Reindexes a tidbit after its text, title, tags or source changed
+
+        ## Parameters
+        - tidbit: changed tidbit
+        """
+        self.add(tidbit)
+
+    def remove(self, card_id : int):
+        """
+        Removes a card from the index, unknown cards are ignored
+
+        ## Parameters
+        - card_id: id of the card to remove
+        """
+        doc = self._docs.pop(card_id, None)
+        if doc is None:
+            return
+        words, tags, source = doc
+        for postings, terms in ((self.tokens, words), (self.tags, tags),
+                                (self.sources, () if source is None else (source,))):
+            for term in terms:
+                ids = postings.get(term)
+                if ids is not None:
+                    ids.discard(card_id)
+                    if not ids:
+                        del postings[term]
+
+    def search(self, query : str = None, tags : list = None, source : str = None):
+        """
+        Finds the cards matching every word of a query, every tag and the
+        source. Filters left empty are not applied
+
+        ## Parameters
+        - query: words to look for in the data, title and questions
+        - tags: tags the cards must have
+        - source: source the cards must come from
+
+        ## Returns
+        Set of matching card ids
+        """
+        postings = [self.tokens.get(word, set()) for word in set(tokenize(query))]
+        postings += [self.tags.get(tag.lower(), set()) for tag in tags or []]
+        if source:
+            postings.append(self.sources.get(source, set()))
+        if not postings:
+            return set(self._docs)
+        postings.sort(key = len)
+        matches = set(postings[0])
+        for ids in postings[1:]:
+            if not matches:
+                break
+            matches &= ids
+        return matches
+
+    def to_dict(self):
+        """
+        Converts the index to a json serializable dictionary. The ids of each
+        term are joined into one string so a large index stays compact when
+        written with indentation
+
+        ## Returns
+        Dictionary of the postings
+        """
+        def _encode(postings):
+            return {term : ' '.join(map(str, ids)) for term, ids in postings.items()}
+        return {
+            'tokens' : _encode(self.tokens),
+            'tags' : _encode(self.tags),
+            'sources' : _encode(self.sources)
+        }
+
+    @classmethod
+    def from_dict(cls, index_dict : dict):
+        """
+        Restores an index written by to_dict
+
+        ## Parameters
+        - index_dict: dictionary returned by to_dict
+
+        ## Returns
+        A new index
+        """
+        index = cls()
+        docs = {}
+        for name, slot in (('tokens', 0), ('tags', 1), ('sources', 2)):
+            postings = getattr(index, name)
+            for term, ids in index_dict.get(name, {}).items():
+                ids = {int(i) for i in ids.split()}
+                postings[term] = ids
+                for card_id in ids:
+                    docs.setdefault(card_id, ([], [], []))[slot].append(term)
+        index._docs = {card_id : (tuple(words), tuple(tags), sources[0] if sources else None)
+                       for card_id, (words, tags, sources) in docs.items()}
+        return index
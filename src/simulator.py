@@ -0,0 +1,316 @@
+"""
+Review simulator for capacity planning. Synthetic users review a
+DeckManager deck in daily sessions on a virtual clock, so months of reviews
+run in seconds and the results do not depend on when the simulation is run.
+Each run reports the reviews per day, the backlog of overdue cards and the
+time spent scheduling reviews, in heap operations and in persistence, timed
+in a Metrics registry of its own so the app's metrics are left alone.
+Parameter sweeps run in parallel over a process pool.
+
+Run from the src directory:
+    python simulator.py --cards 1000 10000 --days 180 --retention 0.85 0.9 --output sim.json
+"""
+import argparse
+import itertools
+import os
+import platform
+import random
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from json import dumps as j_dumps
+from time import perf_counter
+
+from fsrs import Card, Rating, Scheduler, State
+
+from deck_manager import DeckManager
+from harness import make_config, git_commit
+from metrics import Metrics
+from tidbit import Tidbit
+
+START = datetime(2025, 1, 1, 9, tzinfo = timezone.utc)
+
+# timers reported by every run, see DeckManager.review_tidbit
+TIMERS = {
+    'review_card' : 'deck.review.schedule',
+    'heap_pop' : 'deck.review.pop',
+    'heap_push' : 'deck.review.push',
+    'persist' : 'deck.review.persist',
+    'compaction' : 'deck.save'
+}
+
+
+class SyntheticUser():
+    """
+    Answers reviews at random. A card that was reviewed before is recalled
+    with its FSRS retrievability at the time of the review plus recall_bias,
+    a new card with new_recall. Recalled cards are rated Hard, Good or Easy
+    in the proportions of grades, forgotten ones Again.
+
+    ## Attributes
+    - new_recall: chance of recalling a card seen for the first time
+    - recall_bias: added to the retrievability of reviewed cards, negative
+    for a user who forgets more than the model predicts
+    - grades: relative weights of Hard, Good and Easy for recalled cards
+    """
+
+    def __init__(self, new_recall : float = 0.7, recall_bias : float = 0.0,
+                 grades : tuple = (0.15, 0.7, 0.15), seed : int = 0):
+        """
+        ## Parameters
+        - new_recall: chance of recalling a new card
+        - recall_bias: added to the recall chance of reviewed cards
+        - grades: weights of Hard, Good and Easy
+        - seed: seed for the random generator
+        """
+        self.new_recall = new_recall
+        self.recall_bias = recall_bias
+        self.grades = grades
+        self._rng = random.Random(seed)
+
+    def recall_probability(self, card : Card, now : datetime):
+        """
+        ## Returns
+        Chance of recalling a card at a time, between 0 and 1
+        """
+        if card.stability is None:
+            return self.new_recall
+        return max(0.0, min(1.0, card.get_retrievability(now) + self.recall_bias))
+
+    def rate(self, card : Card, now : datetime):
+        """
+        Reviews a card
+
+        ## Parameters
+        - card: card under review
+        - now: virtual time of the review
+
+        ## Returns
+        The Rating given
+        """
+        if self._rng.random() >= self.recall_probability(card, now):
+            return Rating.Again
+        return self._rng.choices((Rating.Hard, Rating.Good, Rating.Easy), self.grades)[0]
+
+
+def make_deck(size : int, start : datetime = START, seed : int = 0):
+    """
+    Generates a deck that has been in use before the simulation starts.
+    Every card was last reviewed within one interval of the start and is
+    due one stability later, so reviews are spread the way a steady deck's
+    are
+
+    ## Parameters
+    - size: number of tidbits
+    - start: virtual time the simulation starts at
+    - seed: seed for the random generator
+
+    ## Returns
+    List of tidbits
+    """
+    rng = random.Random(seed)
+    tids = []
+    for i in range(size):
+        stability = rng.uniform(1, 100)
+        last_review = start - timedelta(days = rng.uniform(0, stability))
+        card = Card(card_id = i + 1, state = State.Review, stability = stability,
+                    difficulty = rng.uniform(3, 8), last_review = last_review,
+                    due = last_review + timedelta(days = stability))
+        tids.append(Tidbit(card, f"Fact {i}", question = f"What is fact {i}?",
+                           created = last_review))
+    return tids
+
+
+def _overdue(deck, now : datetime):
+    # the heap is explored soonest first, so this stops at the first card due later
+    count = 0
+    for tid in deck.ordered():
+        if tid.paused or tid.card.due > now:
+            break
+        count += 1
+    return count
+
+
+def _timings(metrics : Metrics):
+    timings = {}
+    for key, name in TIMERS.items():
+        histogram = metrics.histograms.get(name)
+        count = histogram.count if histogram else 0
+        total = histogram.total if histogram else 0.0
+        timings[key] = {'count' : count, 'total_s' : total,
+                        'mean_us' : total / count * 1e6 if count else None}
+    return timings
+
+
+def simulate(cards : int = 1000, days : int = 90, new_per_day : int = 20,
+             max_reviews : int = None, desired_retention : float = 0.9,
+             maximum_interval : int = 36500, new_recall : float = 0.7,
+             recall_bias : float = 0.0, grades : tuple = (0.15, 0.7, 0.15),
+             seconds_per_review : float = 8, journal : bool = True,
+             compact_after : int = 1000, seed : int = 0, daily : bool = False,
+             directory : str = None):
+    """
+    Runs daily review sessions on a synthetic deck. Each day new cards are
+    added, then every card due is reviewed, up to max_reviews, while the
+    virtual clock moves on by seconds_per_review per review. The run is
+    timed in a private Metrics registry
+
+    ## Parameters
+    - cards: size of the deck at the start
+    - days: number of days simulated
+    - new_per_day: cards added every day
+    - max_reviews: reviews per day before the session stops, no limit if
+    None. Cards left over add to the backlog
+    - desired_retention: retention the scheduler aims for
+    - maximum_interval: longest interval of the scheduler in days
+    - new_recall, recall_bias, grades: answers of the SyntheticUser
+    - seconds_per_review: virtual time taken by a review
+    - journal: if True reviews are journaled like with 'journal params'
+    - compact_after: journal entries before compaction
+    - seed: seed of the deck, the user and the scheduler fuzzing
+    - daily: if True the counts of every day are included
+    - directory: folder for the deck files, a temporary one by default
+
+    ## Returns
+    Json serializable dictionary with the params, the mean and peak
+    'reviews_per_day', the final and peak 'backlog' of overdue cards,
+    the observed 'recall_rate' and the 'timings' of each TIMERS phase
+    """
+    params = {k : v for k, v in locals().items() if k not in ('directory', 'daily')}
+    if directory is None:
+        with tempfile.TemporaryDirectory() as directory:
+            return simulate(**params, daily = daily, directory = directory)
+
+    random.seed(seed) # fsrs fuzzes intervals with the random module
+    user = SyntheticUser(new_recall, recall_bias, grades, seed)
+    metrics = Metrics(enabled = True)
+    dm = DeckManager(make_config(directory, journal = journal))
+    dm.metrics = metrics
+    try:
+        dm.commands.call(setattr, dm, 'schedule', Scheduler(
+            desired_retention = desired_retention, maximum_interval = maximum_interval))
+        dm.add_tidbits(make_deck(cards, START, seed))
+        dm.save_deck()
+        if dm.storage:
+            dm.storage.compact_after = compact_after
+        metrics.reset()
+
+        history = []
+        next_id = cards + 1
+        wall = perf_counter()
+        for day in range(days):
+            clock = START + timedelta(days = day)
+            new = [Tidbit(Card(card_id = next_id + i, due = clock), f"Fact {next_id + i}",
+                          question = f"What is fact {next_id + i}?", created = clock)
+                   for i in range(new_per_day)]
+            next_id += new_per_day
+            dm.add_tidbits(new)
+
+            reviews = lapses = 0
+            while max_reviews is None or reviews < max_reviews:
+                tid = dm.peek_tidbit()
+                if tid is None or tid.card.due > clock:
+                    break
+                tid = dm.get_next_tidbit()
+                rating = user.rate(tid.card, clock)
+                dm.review_tidbit(tid, rating, review_datetime = clock)
+                reviews += 1
+                lapses += rating == Rating.Again
+                clock += timedelta(seconds = seconds_per_review)
+            backlog = dm.commands.call(_overdue, dm.deck, clock)
+            history.append({'day' : day, 'new' : new_per_day, 'reviews' : reviews,
+                            'lapses' : lapses, 'backlog' : backlog})
+        wall = perf_counter() - wall
+
+        total = sum(h['reviews'] for h in history)
+        lapsed = sum(h['lapses'] for h in history)
+        result = {
+            'params' : {**params, 'grades' : list(grades)},
+            'deck_size' : dm.deck_size(),
+            'reviews' : total,
+            'reviews_per_day' : total / days if days else 0,
+            'peak_reviews_per_day' : max((h['reviews'] for h in history), default = 0),
+            'backlog' : history[-1]['backlog'] if history else 0,
+            'peak_backlog' : max((h['backlog'] for h in history), default = 0),
+            'recall_rate' : 1 - lapsed / total if total else None,
+            'wall_s' : wall,
+            'reviews_per_s' : total / wall if wall else None,
+            'timings' : _timings(metrics)
+        }
+        if daily:
+            result['daily'] = history
+        return result
+    finally:
+        dm.commands.close()
+
+
+def _simulate(params : dict):
+    return simulate(**params)
+
+
+def sweep(grid : dict, base : dict = None, workers : int = None):
+    """
+    Runs a simulation for every combination of parameter values, in
+    parallel over a process pool
+
+    ## Parameters
+    - grid: list of values of each parameter of simulate to vary
+    - base: values of the parameters that stay the same
+    - workers: number of processes, the number of cores by default
+
+    ## Returns
+    List of simulate results in the order of the combinations
+    """
+    names = list(grid)
+    runs = [{**(base or {}), **dict(zip(names, values))}
+            for values in itertools.product(*(grid[n] for n in names))]
+    if workers == 1 or len(runs) == 1:
+        return [simulate(**run) for run in runs]
+    with ProcessPoolExecutor(max_workers = workers or min(len(runs), os.cpu_count())) as pool:
+        return list(pool.map(_simulate, runs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Simulate review load on synthetic decks")
+    parser.add_argument('--cards', type = int, nargs = '+', default = [1000],
+                        help = "deck sizes at the start")
+    parser.add_argument('--new-per-day', type = int, nargs = '+', default = [20],
+                        help = "cards added every day")
+    parser.add_argument('--retention', type = float, nargs = '+', default = [0.9],
+                        help = "desired retention of the scheduler")
+    parser.add_argument('--recall-bias', type = float, nargs = '+', default = [0.0],
+                        help = "added to the recall chance of the synthetic user")
+    parser.add_argument('--days', type = int, default = 90, help = "days simulated")
+    parser.add_argument('--max-reviews', type = int, default = None,
+                        help = "reviews per day before a session stops")
+    parser.add_argument('--no-journal', action = 'store_true', help = "do not journal reviews")
+    parser.add_argument('--workers', type = int, default = None,
+                        help = "processes running simulations, one per core by default")
+    parser.add_argument('--daily', action = 'store_true', help = "include the counts of every day")
+    parser.add_argument('--output', default = None,
+                        help = "json file to write results to, printed if not set")
+    args = parser.parse_args()
+
+    grid = {
+        'cards' : args.cards,
+        'new_per_day' : args.new_per_day,
+        'desired_retention' : args.retention,
+        'recall_bias' : args.recall_bias
+    }
+    base = {'days' : args.days, 'max_reviews' : args.max_reviews,
+            'journal' : not args.no_journal, 'daily' : args.daily}
+    report = {
+        'commit' : git_commit(),
+        'python' : platform.python_version(),
+        'timestamp' : datetime.now(timezone.utc).isoformat(),
+        'results' : sweep(grid, base, args.workers)
+    }
+    if args.output:
+        with open(args.output, 'w', encoding = 'utf-8') as file:
+            file.write(j_dumps(report, indent = 4))
+    else:
+        print(j_dumps(report, indent = 4))
+
+
+if __name__ == '__main__':
+    main()
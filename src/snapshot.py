@@ -0,0 +1,351 @@
+"""
+Binary deck snapshots. A snapshot is the columns and string pools of a
+DeckStore written back to back after a small header, so it can be opened with
+mmap and read in place: opening costs the same however big the deck is, and
+a row is only decoded into a Tidbit when it is read.
+
+Layout, little endian header then 8 byte aligned sections:
+
+    magic 8s | version H | little endian B | pad x | sections I | rows q
+    sections x (name 16s | offset q | length q)
+    ... section data ...
+
+Each DeckStore column is one section in native byte order, flagged in the
+header. Anything else saved with the deck, like the scheduler or the search
+index, is utf-8 json in a 'meta.<key>' section of its own and is only parsed
+when it is first read, so a large index does not slow down opening.
+
+DeckManager still decodes every row into a Tidbit while it loads, since
+DueQueue and the search index hold live objects. What the snapshot speeds up
+is the time until the soonest due cards can be reviewed, not the full load,
+and the file is unmapped once every row is decoded, so the deck is only held
+twice while loading.
+"""
+import mmap
+from collections import ChainMap
+from collections.abc import Mapping
+import os
+import struct
+import sys
+from json import dumps as j_dumps, loads as j_loads, load as j_load
+from fsrs import Card
+from deck_store import DeckStore, StringPool, NO_TEXT
+from storage import DeckStorage
+from tidbit import Tidbit
+
+MAGIC = b'TIDBITS\x00'
+VERSION = 1
+EXTENSION = '.tbd'
+
+_HEADER = struct.Struct('<8sHBxIq')
+_SECTION = struct.Struct('<16sqq')
+_COLUMNS = ('card_id', 'state', 'step', 'stability', 'difficulty', 'due',
+            'last_review', 'created', 'paused', 'data', 'question', 'title',
+            'source', 'tags')
+_POOLS = (('text', '_text'), ('labels', '_labels'))
+_META = 'meta.'
+
+
+def is_binary(file_path : str):
+    """
+    ## Returns
+    True if the file is a binary snapshot, judged by its extension
+    """
+    return file_path.endswith(EXTENSION)
+
+
+def write_snapshot(file_path : str, tidbits, meta : dict = None):
+    """
+    Atomically writes tidbits to a binary snapshot. Rows keep the order of
+    the tidbits, so writing them soonest due first lets a reader stop early
+
+    ## Parameters
+    - file_path: location to write to
+    - tidbits: iterable of tidbits
+    - meta: dictionary of json serializable values saved with the deck,
+    e.g. the 'schedule'. Keys are at most 11 ascii characters
+
+    ## Raises
+    - ValueError: if a meta key is too long
+    """
+    store = DeckStore.from_tidbits(tidbits)
+    sections = [(name, getattr(store, name).tobytes()) for name in _COLUMNS]
+    for name, attribute in _POOLS:
+        pool = getattr(store, attribute)
+        sections.append((name + '.buffer', bytes(pool._buffer)))
+        sections.append((name + '.offsets', pool._offsets.tobytes()))
+    for key, value in (meta or {}).items():
+        sections.append((_META + key, j_dumps(value, ensure_ascii = False).encode('utf-8')))
+    for name, _ in sections:
+        if len(name.encode('ascii')) > _SECTION.size - 16:
+            raise ValueError(f"Section name {name} is too long")
+
+    offset = _HEADER.size + _SECTION.size * len(sections)
+    table = []
+    for name, data in sections:
+        offset += -offset % 8
+        table.append((name, offset, len(data)))
+        offset += len(data)
+
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(_HEADER.pack(MAGIC, VERSION, sys.byteorder == 'little',
+                                len(sections), len(store)))
+        for name, start, length in table:
+            file.write(_SECTION.pack(name.encode('ascii'), start, length))
+        for (_, data), (_, start, _) in zip(sections, table):
+            file.write(b'\x00' * (start - file.tell()))
+            file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, file_path)
+
+
+class MappedPool(StringPool):
+    """
+    Read only StringPool over a mapped buffer
+    """
+
+    def __init__(self, buffer : memoryview, offsets : memoryview):
+        self.intern = False
+        self._buffer = buffer
+        self._offsets = offsets
+        self._index = None
+
+    def add(self, text : str):
+        raise TypeError("Mapped string pools are read only")
+
+    def get(self, index : int):
+        if index == NO_TEXT:
+            return None
+        return str(self._buffer[self._offsets[index]:self._offsets[index + 1]], 'utf-8')
+
+
+class LazyMeta(Mapping):
+    """
+    Read only mapping of the meta saved with a snapshot, each value decoded
+    from json the first time it is read
+    """
+
+    def __init__(self, sections : dict):
+        self._sections = sections
+        self._values = {}
+
+    def __getitem__(self, key : str):
+        if key not in self._values:
+            self._values[key] = j_loads(str(self._sections[key], 'utf-8'))
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._sections)
+
+    def __len__(self):
+        return len(self._sections)
+
+    def load_all(self):
+        """
+        Decodes every value not read yet and lets go of the mapped sections
+        """
+        for key, data in self._sections.items():
+            if data is not None:
+                self[key]
+                data.release()
+                self._sections[key] = None
+
+
+class MappedDeck(DeckStore):
+    """
+    DeckStore read in place from a binary snapshot. The file is mapped copy on
+    write, so opening it reads nothing but the header, rows are decoded only
+    when read, and set_card changes the mapped pages without touching the
+    file. Rows cannot be appended.
+
+    ## Attributes
+    - file_path: location of the snapshot
+    - meta: dictionary saved with the deck
+    """
+
+    def __init__(self, file_path : str):
+        """
+        Maps a snapshot
+
+        ## Parameters
+        - file_path: location of the snapshot
+
+        ## Raises
+        - ValueError: if the file is not a snapshot of this version or was
+        written on a machine of the other byte order
+        """
+        self.file_path = file_path
+        with open(file_path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_COPY)
+        view = memoryview(self._map)
+        magic, version, little, count, rows = _HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{file_path} is not a version {VERSION} deck snapshot")
+        if bool(little) != (sys.byteorder == 'little'):
+            raise ValueError(f"{file_path} was written with the other byte order")
+        sections = {}
+        for i in range(count):
+            name, start, length = _SECTION.unpack_from(view, _HEADER.size + i * _SECTION.size)
+            sections[name.rstrip(b'\x00').decode('ascii')] = view[start:start + length]
+
+        empty = DeckStore()
+        for name in _COLUMNS:
+            setattr(self, name, sections[name].cast(getattr(empty, name).typecode))
+        for name, attribute in _POOLS:
+            setattr(self, attribute, MappedPool(sections[name + '.buffer'],
+                                                sections[name + '.offsets'].cast('q')))
+        self.meta = LazyMeta({name[len(_META):] : data for name, data in sections.items()
+                              if name.startswith(_META)})
+        self._rows = None
+        self._rows_count = rows
+
+    def __len__(self):
+        return self._rows_count
+
+    def _row_index(self):
+        if self._rows is None:
+            self._rows = {card_id : row for row, card_id in enumerate(self.card_id.tolist())}
+        return self._rows
+
+    def __contains__(self, card_id : int):
+        return card_id in self._row_index()
+
+    def row(self, card_id : int):
+        return self._row_index()[card_id]
+
+    def append(self, tidbit : Tidbit):
+        raise TypeError("Mapped decks are read only, write a new snapshot instead")
+
+    def close(self):
+        """
+        Unmaps the file. Tidbits and meta already decoded stay valid, meta
+        not read yet is decoded first
+        """
+        self.meta.load_all()
+        for name in _COLUMNS:
+            getattr(self, name).release()
+        for _, attribute in _POOLS:
+            pool = getattr(self, attribute)
+            pool._buffer.release()
+            pool._offsets.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def read(file_path : str):
+    """
+    Opens a binary snapshot and replays its journal, the binary counterpart
+    of DeckStorage.read. Only the tidbits changed by the journal are decoded
+    up front, the rest are decoded as the returned generator is consumed, so
+    a caller can start using the soonest due tidbits right away. Consuming
+    the whole generator still decodes every row. The file is unmapped once
+    the generator is exhausted or closed
+
+    ## Parameters
+    - file_path: location of the snapshot, which may not exist yet if only
+    the journal was written
+
+    ## Returns
+    Dictionary with 'tidbits', a generator of the tidbits, those changed by
+    the journal first and then the rest soonest due first, 'schedule', the
+    scheduler dictionary or None, and 'touched', the ids of the cards added,
+    updated or deleted by the journal. Other keys of the snapshot meta are
+    passed through
+    """
+    deck = MappedDeck(file_path) if os.path.exists(file_path) else None
+    try:
+        meta = deck.meta if deck is not None else {}
+        # the rest of the meta, like the search index, is decoded when read
+        result = ChainMap({'schedule' : meta.get('schedule')}, meta)
+        changed, touched = {}, set()
+        for entry in DeckStorage.read_journal(file_path + '.journal'):
+            card_id = DeckStorage.entry_card_id(entry)
+            if deck is not None and card_id is not None \
+                    and card_id not in changed and card_id in deck:
+                changed[card_id] = deck.tidbit(deck.row(card_id))
+            _replay(entry, changed, result)
+            if entry['op'] in ('add', 'update', 'delete'):
+                touched.add(card_id)
+    except BaseException:
+        if deck is not None:
+            deck.close()
+        raise
+    result['touched'] = list(touched)
+    result['tidbits'] = _tidbits(deck, changed)
+    return result
+
+
+def _tidbits(deck : MappedDeck, changed : dict):
+    try:
+        yield from (t for t in changed.values() if t is not None)
+        for row in range(len(deck) if deck is not None else 0):
+            if not changed or deck.card_id[row] not in changed:
+                yield deck.tidbit(row)
+    finally:
+        if deck is not None:
+            deck.close()
+
+
+def _replay(entry : dict, tidbits : dict, deck : dict):
+    """
+    Applies a journal entry to decoded tidbits, like DeckStorage._replay
+    does to tidbit dictionaries. Deleted tidbits are kept as None so their
+    rows are skipped
+    """
+    op = entry['op']
+    if op == 'add':
+        tidbits[entry['tidbit']['card']['card_id']] = Tidbit.from_dict(entry['tidbit'])
+    elif op == 'review':
+        tid = tidbits.get(entry['card']['card_id'])
+        if tid is not None:
+            tid.card = Card.from_dict(entry['card'])
+    elif op == 'update':
+        tid = tidbits.get(entry['card_id'])
+        if tid is not None:
+            fields = dict(entry['fields'])
+            if fields.get('questions'): # holds the current question first
+                fields.pop('question', None)
+            for name, value in fields.items():
+                setattr(tid, name, value)
+    elif op == 'delete':
+        tidbits[entry['card_id']] = None
+    elif op == 'schedule':
+        deck['schedule'] = entry['schedule']
+
+
+def export_json(file_path : str, json_path : str):
+    """
+    Converts a binary snapshot to the json deck format of DeckManager.save_deck
+
+    ## Parameters
+    - file_path: binary snapshot
+    - json_path: json file to write
+    """
+    with MappedDeck(file_path) as deck:
+        DeckStorage.write_snapshot(json_path, {
+            **deck.meta,
+            'deck' : [t.to_dict() for t in deck.tidbits()]
+        })
+
+
+def import_json(json_path : str, file_path : str):
+    """
+    Converts a json deck file to a binary snapshot, rows soonest due first
+
+    ## Parameters
+    - json_path: json file written by DeckManager.save_deck
+    - file_path: binary snapshot to write
+    """
+    with open(json_path, 'r', encoding = 'utf-8') as file:
+        deck = j_load(file)
+    tidbits = sorted((Tidbit.from_dict(t) for t in deck.pop('deck')),
+                     key = lambda t: t.card.due)
+    write_snapshot(file_path, tidbits, deck)
@@ -0,0 +1,82 @@
+"""
+Measures cold start. Import this module before anything else so the report
+starts counting as early as possible; each startup phase is then marked as it
+finishes.
+"""
+import sys
+from threading import Lock
+from time import perf_counter
+
+# modules that are slow to import and should only be loaded when needed
+HEAVY_MODULES = ('ollama', 'httpx', 'pydantic', 'numpy', 'torch', 'eel')
+
+
+class StartupReport():
+    """
+    Records how long each phase of startup took
+
+    ## Attributes
+    - start: perf_counter value the report counts from
+    - phases: list of (name, seconds since start) pairs, in the order marked
+    - errors: list of (name, error message) pairs of the phases that failed
+    """
+
+    def __init__(self):
+        """
+        Starts counting
+        """
+        self.start = perf_counter()
+        self.phases = []
+        self.errors = []
+        self._lock = Lock()
+
+    def mark(self, name : str):
+        """
+        Records that a phase finished now. Phases may be marked from background
+        threads
+
+        ## Parameters
+        - name: name of the phase
+
+        ## Returns
+        Seconds since the report started
+        """
+        elapsed = perf_counter() - self.start
+        with self._lock:
+            self.phases.append((name, elapsed))
+        return elapsed
+
+    def fail(self, name : str, error : Exception):
+        """
+        Records that a phase failed, e.g. the deck could not be loaded
+
+        ## Parameters
+        - name: name of the phase
+        - error: exception raised by the phase
+        """
+        with self._lock:
+            self.errors.append((name, f"{type(error).__name__}: {error}"))
+
+    def to_dict(self):
+        """
+        ## Returns
+        Dictionary with the time each phase finished at and how long it took,
+        the number of loaded modules, which heavy modules are loaded and the
+        errors of the phases that failed
+        """
+        with self._lock:
+            phases = sorted(self.phases, key = lambda p: p[1])
+            errors = [{'phase' : name, 'error' : error} for name, error in self.errors]
+        report, previous = [], 0.0
+        for name, elapsed in phases:
+            report.append({'phase' : name, 'at_s' : elapsed, 'took_s' : elapsed - previous})
+            previous = elapsed
+        return {
+            'phases' : report,
+            'modules' : len(sys.modules),
+            'heavy_modules' : [m for m in HEAVY_MODULES if m in sys.modules],
+            'errors' : errors
+        }
+
+
+REPORT = StartupReport()
@@ -0,0 +1,362 @@
+import os
+from json import load as j_load, dump as j_dump, dumps as j_dumps, loads as j_loads
+from fsrs import ReviewLog
+from threading import Lock
+
+
+class DeckStorage():
+    """
+    Stores a deck as a snapshot plus an append-only journal. The snapshot is the
+    same json document written by DeckManager.save_deck, so an existing deck
+    file is used as the first snapshot without any conversion. Every change
+    after that, like an added card or a review, is appended to the journal as a
+    single json line, so saving a change costs the same however big the deck
+    is. Once the journal is long enough it is compacted into a new snapshot.
+
+    Journal entries are upserts keyed by card_id, so replaying an entry that is
+    already part of the snapshot is harmless. A torn last line left by a crash
+    is ignored by readers and cut off when the storage is opened, so the next
+    entry starts on a line of its own.
+
+    ## Attributes
+    - file_path: location of the snapshot
+    - journal_path: location of the journal, next to the snapshot
+    - reviews_path: location of the review history, next to the snapshot. The
+    history is append only and is never compacted
+    - compact_after: number of journal entries written before compaction is due
+    - sync: if True each entry is flushed to disk before append returns
+    - entries: number of entries in the journal
+    """
+
+    def __init__(self, file_path : str, compact_after : int = 1000, sync : bool = True):
+        """
+        Opens storage for a deck
+
+        ## Parameters
+        - file_path: location of the snapshot json file
+        - compact_after: journal entries before compaction is due
+        - sync: flush every entry to disk with fsync
+        """
+        self.file_path = file_path
+        self.journal_path = file_path + '.journal'
+        self.reviews_path = file_path + '.reviews'
+        self.compact_after = compact_after
+        self.sync = sync
+        self.entries = 0
+        self._lock = Lock()
+        self._truncate_torn(self.reviews_path)
+        if self._truncate_torn(self.journal_path):
+            with open(self.journal_path, 'r', encoding = 'utf-8') as file:
+                self.entries = sum(1 for _ in file)
+
+    @staticmethod
+    def _truncate_torn(path : str):
+        """
+        Cuts a torn last line, one without its newline, off the end of a file
+        of json lines. Appending after it would otherwise continue the torn
+        line and lose the new entry along with it
+
+        ## Parameters
+        - path: location of the file
+
+        ## Returns
+        True if the file exists
+        """
+        if not os.path.exists(path):
+            return False
+        with open(path, 'rb+') as file:
+            end = size = file.seek(0, os.SEEK_END)
+            while end > 0:
+                # look backwards for the end of the last complete line
+                start = max(0, end - 4096)
+                file.seek(start)
+                block = file.read(end - start)
+                newline = block.rfind(b'\n')
+                if newline >= 0:
+                    end = start + newline + 1
+                    break
+                end = start
+            if end < size:
+                file.truncate(end)
+                file.flush()
+                os.fsync(file.fileno())
+        return True
+
+    def exists(self):
+        """
+        Checks if anything has been stored for this deck
+
+        ## Returns
+        True if a snapshot or journal exists
+        """
+        return os.path.exists(self.file_path) or os.path.exists(self.journal_path)
+
+    @staticmethod
+    def read(file_path : str):
+        """
+        Reads a deck snapshot and replays its journal, if one exists, on top of
+        it
+
+        ## Parameters
+        - file_path: location of the snapshot
+
+        ## Returns
+        Dictionary with 'deck', a list of tidbit dictionaries, 'schedule',
+        the scheduler dictionary or None, and 'touched', the ids of the cards
+        added, updated or deleted by the journal. Other keys of the snapshot
+        are passed through
+        """
+        deck = {'deck' : [], 'schedule' : None}
+        if os.path.exists(file_path):
+            with open(file_path, 'r', encoding = 'utf-8') as file:
+                deck = j_load(file)
+        deck['touched'] = []
+
+        journal_path = file_path + '.journal'
+        if not os.path.exists(journal_path):
+            return deck
+
+        tidbits = {t['card']['card_id'] : t for t in deck['deck']}
+        touched = set()
+        for entry in DeckStorage.read_journal(journal_path):
+            DeckStorage._replay(entry, tidbits, deck)
+            if entry['op'] in ('add', 'update', 'delete'):
+                touched.add(DeckStorage.entry_card_id(entry))
+        deck['deck'] = list(tidbits.values())
+        deck['touched'] = list(touched)
+        return deck
+
+    @staticmethod
+    def read_journal(journal_path : str):
+        """
+        Reads the entries of a journal, stopping at a torn last line
+
+        ## Parameters
+        - journal_path: location of the journal
+
+        ## Returns
+        Generator of entry dictionaries, none if there is no journal
+        """
+        if not os.path.exists(journal_path):
+            return
+        with open(journal_path, 'r', encoding = 'utf-8') as file:
+            for line in file:
+                try:
+                    yield j_loads(line)
+                except ValueError:
+                    return # torn write, nothing after it was committed
+
+    @staticmethod
+    def entry_card_id(entry : dict):
+        """
+        ## Returns
+        Id of the card changed by an entry, None for schedule entries
+        """
+        if entry['op'] == 'add':
+            return entry['tidbit']['card']['card_id']
+        if entry['op'] == 'review':
+            return entry['card']['card_id']
+        return entry.get('card_id')
+
+    @staticmethod
+    def _replay(entry : dict, tidbits : dict, deck : dict):
+        """
+        Applies a single journal entry
+
+        ## Parameters
+        - entry: decoded journal line
+        - tidbits: tidbit dictionaries keyed by card_id, updated in place
+        - deck: deck dictionary, its schedule is updated in place
+        """
+        op = entry['op']
+        if op == 'add':
+            tidbits[entry['tidbit']['card']['card_id']] = entry['tidbit']
+        elif op == 'review':
+            tid = tidbits.get(entry['card']['card_id'])
+            if tid is not None:
+                tid['card'] = entry['card']
+        elif op == 'update':
+            tid = tidbits.get(entry['card_id'])
+            if tid is not None:
+                tid.update(entry['fields'])
+        elif op == 'delete':
+            tidbits.pop(entry['card_id'], None)
+        elif op == 'schedule':
+            deck['schedule'] = entry['schedule']
+
+    def append(self, op : str, **fields):
+        """
+        Writes an entry to the end of the journal
+
+        ## Parameters
+        - op: type of change, one of 'add', 'review', 'update', 'delete' or
+        'schedule'
+        - fields: contents of the entry
+        """
+        self.append_all([{'op' : op, **fields}])
+
+    def append_all(self, entries : list):
+        """
+        Writes several entries to the end of the journal with a single write
+        and, if sync is set, a single fsync
+
+        ## Parameters
+        - entries: list of dictionaries with an 'op' and its fields
+        """
+        lines = ''.join(j_dumps(entry, ensure_ascii = False) + '\n' for entry in entries)
+        with self._lock:
+            with open(self.journal_path, 'a', encoding = 'utf-8') as file:
+                file.write(lines)
+                if self.sync:
+                    file.flush()
+                    os.fsync(file.fileno())
+            self.entries += len(entries)
+
+    def log_add(self, tidbit):
+        """
+        Journals a new tidbit
+
+        ## Parameters
+        - tidbit: tidbit added to the deck
+        """
+        self.append('add', tidbit = tidbit.to_dict())
+
+    def log_add_all(self, tidbits):
+        """
+        Journals many new tidbits at once
+
+        ## Parameters
+        - tidbits: tidbits added to the deck
+        """
+        self.append_all([{'op' : 'add', 'tidbit' : t.to_dict()} for t in tidbits])
+
+    def log_review(self, tidbit):
+        """
+        Journals the new card state of a reviewed tidbit
+
+        ## Parameters
+        - tidbit: tidbit that was reviewed
+        """
+        self.append('review', card = tidbit.card.to_dict())
+
+    def log_review_history(self, review_log : ReviewLog):
+        """
+        Appends a review log to the review history
+
+        ## Parameters
+        - review_log: log returned by Scheduler.review_card
+        """
+        line = j_dumps(review_log.to_dict()) + '\n'
+        with self._lock:
+            with open(self.reviews_path, 'a', encoding = 'utf-8') as file:
+                file.write(line)
+                if self.sync:
+                    file.flush()
+                    os.fsync(file.fileno())
+
+    def read_review_history(self):
+        """
+        Reads every review log in the review history
+
+        ## Returns
+        List of ReviewLog in the order they were written
+        """
+        if not os.path.exists(self.reviews_path):
+            return []
+        logs = []
+        with open(self.reviews_path, 'r', encoding = 'utf-8') as file:
+            for line in file:
+                try:
+                    logs.append(ReviewLog.from_dict(j_loads(line)))
+                except ValueError:
+                    break # torn write
+        return logs
+
+    def log_schedule(self, schedule):
+        """
+        Journals a change to the scheduler
+
+        ## Parameters
+        - schedule: fsrs Scheduler now used by the deck
+        """
+        self.append('schedule', schedule = schedule.to_dict())
+
+    def log_update(self, tidbit, **fields):
+        """
+        Journals changed fields of a tidbit
+
+        ## Parameters
+        - tidbit: tidbit that was changed
+        - fields: json serializable values of the changed attributes
+        """
+        self.append('update', card_id = tidbit.card.card_id, fields = fields)
+
+    def log_delete(self, tidbit):
+        """
+        Journals the removal of a tidbit
+
+        ## Parameters
+        - tidbit: tidbit removed from the deck
+        """
+        self.append('delete', card_id = tidbit.card.card_id)
+
+    def needs_compaction(self):
+        """
+        Checks if the journal is long enough to be folded into a snapshot
+
+        ## Returns
+        True if compaction is due
+        """
+        return self.entries >= self.compact_after
+
+    def compact(self, deck):
+        """
+        Writes a new snapshot and empties the journal
+
+        ## Parameters
+        - deck: full deck dictionary, as built by DeckManager.save_deck, or a
+        function returning it. A function is called while the journal is
+        locked, so no change can be journaled between building the snapshot
+        and emptying the journal
+        """
+        with self._lock:
+            self.write_snapshot(self.file_path, deck() if callable(deck) else deck)
+            self._clear_journal()
+
+    def clear_journal(self, write = None):
+        """
+        Empties the journal once its changes are in a snapshot written some
+        other way, like a binary snapshot
+
+        ## Parameters
+        - write: optional, function writing the snapshot. It is called while
+        the journal is locked, like the deck function of compact
+        """
+        with self._lock:
+            if write is not None:
+                write()
+            self._clear_journal()
+
+    def _clear_journal(self):
+        with open(self.journal_path, 'w', encoding = 'utf-8') as file:
+            if self.sync:
+                os.fsync(file.fileno())
+        self.entries = 0
+
+    @staticmethod
+    def write_snapshot(file_path : str, deck : dict):
+        """
+        Atomically writes a deck to a json file. The deck is written to a
+        temporary file which then replaces the destination, so a crash never
+        leaves a partially written deck behind
+
+        ## Parameters
+        - file_path: location to write the deck to
+        - deck: deck dictionary to write
+        """
+        tmp_path = file_path + '.tmp'
+        with open(tmp_path, 'w', encoding = 'utf-8') as file:
+            j_dump(deck, file, ensure_ascii = False, indent = 4)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, file_path)
@@ -11,9 +11,18 @@ class Tidbit():
     - data: information to recall
     - title: (optional) title of card
     - tags: (optional) tags used for searching cards by content
-    - 
+    - question: question asked at the next review, None while it is generated
+    - questions: pool of question variants rotated between reviews, None
+    while the question is generated
+    - paused: if True the tidbit is kept in the deck but not reviewed
     """    
 
+    # avoid a __dict__ per tidbit, decks can hold hundreds of thousands. The
+    # question variants are a tuple and the index of the one asked next,
+    # rotating moves the index instead of the questions
+    __slots__ = ('card', 'data', 'title', 'tags', '_questions', '_turn', 'source',
+                 'created', 'paused')
+
     def __init__(self,
                  card: Card,
                  data : str,
@@ -21,7 +30,9 @@ class Tidbit():
                  tags : list[str] = None,
                  question : str = None,
                  source : str = None,
-                 created: datetime = None
+                 created: datetime = None,
+                 paused : bool = False,
+                 questions : list[str] = None
                  ):
 
         if type(data) is not str or data == "":
@@ -30,14 +41,58 @@ class Tidbit():
         self.data = data
         self.title = title
         self.tags = tags
-        self.question = question
+        self._questions = None
+        self._turn = 0
+        if questions:
+            self.questions = questions
+        else:
+            self.question = question
         self.source = source
+        self.paused = paused
         if created == None or type(created) is not datetime:
             self.created = datetime.now(timezone.utc)
         else:
             self.created = created
         
 
+    @property
+    def question(self):
+        return self._questions[self._turn] if self._questions else None
+
+    @question.setter
+    def question(self, question : str):
+        if question is None:
+            self._questions = None
+            self._turn = 0
+        elif self._questions is None:
+            self._questions = (question,)
+        else:
+            turn = self._turn
+            self._questions = self._questions[:turn] + (question,) + self._questions[turn + 1:]
+
+    @property
+    def questions(self):
+        if not self._questions:
+            return None
+        return list(self._questions[self._turn:] + self._questions[:self._turn])
+
+    @questions.setter
+    def questions(self, questions : list[str]):
+        self._questions = tuple(q for q in questions or [] if q) or None
+        self._turn = 0
+
+    def rotate_question(self):
+        """
+        Moves on to the next question variant, called after every review
+
+        ## Returns
+        True if the question changed
+        """
+        if self._questions is None or len(self._questions) < 2:
+            return False
+        self._turn = (self._turn + 1) % len(self._questions)
+        return True
+
     def __lt__(self, other: Card):
         """
         Defines the order of two tidbits. This one should comebefore another if
@@ -55,11 +110,30 @@ class Tidbit():
         ## Returns
         A dictionary representation of the card attributes
         """
-        rtn = self.__dict__.copy()
-        rtn['card'] = self.card.to_dict()
-        rtn['created'] = self.created.isoformat()
+        return {
+            'card' : self.card.to_dict(),
+            'data' : self.data,
+            'title' : self.title,
+            'tags' : self.tags,
+            'question' : self.question,
+            'source' : self.source,
+            'created' : self.created.isoformat(),
+            'paused' : self.paused,
+            'questions' : self.questions
+        }
 
-        return rtn
+    @classmethod
+    def from_dict(cls, tidbit_dict : dict):
+        """
+        Builds a tidbit from the dictionary returned by to_dict
+
+        ## Returns
+        A new tidbit
+        """
+        tidbit_dict = dict(tidbit_dict)
+        tidbit_dict['card'] = Card.from_dict(tidbit_dict['card'])
+        tidbit_dict['created'] = datetime.fromisoformat(tidbit_dict['created'])
+        return cls(**tidbit_dict)
 
     def __str__(self):
         return f"[title: {self.title}, data: {self.data}, question: {self.question}, due: {self.card.due}]"
@@ -81,6 +81,8 @@ document.addEventListener('DOMContentLoaded', function () {
         ratingControls.style.display = 'flex';
     });
 
+    startReview();
+
 });
 
 // *** REVIEW ***
@@ -95,7 +97,7 @@ class ratingBtn {
         const button = document.getElementById(this.id);
         button.addEventListener('click', function (e) {
             console.log(rating);
-            eel.review_tidbit(rating)(displayReviewCard);
+            rateReviewCard(rating);
         });
     }
 }
@@ -108,6 +110,87 @@ const ratingButtons = [
     new ratingBtn("rev-easy", 4)
 ];
 
+/** Cards ready to review, soonest due first. The first card is shown */
+let reviewBuffer = [];
+
+/**
+ * Starts a review session, filling the buffer with the next cards to review
+ */
+function startReview() {
+    eel.start_review()(function (cards) {
+        reviewBuffer = cards;
+        showNextReview();
+    });
+}
+
+/**
+ * Shows the first card of the review buffer, or the placeholder if the buffer
+ * is empty
+ */
+function showNextReview() {
+    let placeHolder = document.getElementById('review-placeholder');
+    if (reviewBuffer.length === 0) {
+        document.getElementById('review-card').style = "display: none";
+        placeHolder.style = "";
+        return;
+    }
+    placeHolder.style = "display: none";
+    displayReviewCard(reviewBuffer[0]);
+}
+
+/**
+ * Rates the card being reviewed. The next card is shown from the buffer right
+ * away, the rating is sent to the backend which replies with cards to top up
+ * the buffer
+ *
+ * @param rating rating from 1 (again) to 4 (easy)
+ */
+function rateReviewCard(rating) {
+    let current = reviewBuffer.shift();
+    if (current === undefined) {
+        return;
+    }
+    showNextReview();
+    eel.rate_card(current['card_id'], rating)(function (cards) {
+        let wasEmpty = reviewBuffer.length === 0;
+        reviewBuffer.push(...cards);
+        if (wasEmpty) {
+            showNextReview();
+        }
+    });
+}
+
+/**
+ * Sends the typed answer of the card being reviewed to be graded. Like a
+ * rating, the next card is shown right away and the grade is applied in the
+ * background
+ */
+function answerReviewCard() {
+    let typed = document.getElementById('review-typed-answer');
+    let answer = typed.value.trim();
+    let current = reviewBuffer[0];
+    if (answer == "" || current === undefined) {
+        return;
+    }
+    reviewBuffer.shift();
+    typed.value = "";
+    showNextReview();
+    eel.answer_card(current['card_id'], answer)(function (cards) {
+        let wasEmpty = reviewBuffer.length === 0;
+        reviewBuffer.push(...cards);
+        if (wasEmpty) {
+            showNextReview();
+        }
+    });
+}
+
+document.getElementById('submit-answer').addEventListener('click', answerReviewCard);
+document.getElementById('review-typed-answer').addEventListener('keydown', function (e) {
+    if (e.key === 'Enter') {
+        answerReviewCard();
+    }
+});
+
 /**
  * Displays the top card of the deck to review
  * 
@@ -126,7 +209,7 @@ function displayReviewCard(tidbit) {
     }
 
     let question = document.getElementById('review-question');
-    question.textContent = tidbit['question'];
+    question.textContent = questionText(tidbit);
     let answer = document.getElementById('review-answer');
     answer.textContent = tidbit['data'];
 
@@ -137,6 +220,19 @@ function displayReviewCard(tidbit) {
 
 }
 
+/**
+ * Text shown for the question of a tidbit. Questions generated in the
+ * background are null until the model responds
+ *
+ * @param tidbit dictionary / object with tidbit data
+ */
+function questionText(tidbit) {
+    if (tidbit['question'] === null) {
+        return "Generating question...";
+    }
+    return tidbit['question'];
+}
+
 /**
  * General Function to display a card to review. This generates a card, the
  * answer is not obscured
@@ -161,7 +257,7 @@ function displayTidbit(tidbit, element) {
 
     let question = card.appendChild(document.createElement('p'));
     question.className = 'card-text';
-    question.textContent = tidbit['question'];
+    question.textContent = questionText(tidbit);
 
     let hr = card.appendChild(document.createElement('hr'));
     hr.className = 'my-3';
@@ -174,6 +270,34 @@ function displayTidbit(tidbit, element) {
     let source = card.appendChild(document.createElement('p'));
     source.className = 'text-muted';
     source.textContent = tidbit['source'];
+
+    let controls = card.appendChild(document.createElement('div'));
+    controls.className = 'd-flex gap-2';
+    let pauseBtn = controls.appendChild(document.createElement('button'));
+    pauseBtn.className = 'btn btn-sm btn-outline-secondary';
+    pauseBtn.textContent = tidbit['paused'] ? 'Resume' : 'Pause';
+    pauseBtn.addEventListener('click', function (e) {
+        let cardId = tidbit['card_id'];
+        let toggle = tidbit['paused'] ? eel.resume_card(cardId) : eel.pause_card(cardId);
+        toggle(function (changed) {
+            if (!changed) {
+                return;
+            }
+            tidbit['paused'] = !tidbit['paused'];
+            pauseBtn.textContent = tidbit['paused'] ? 'Resume' : 'Pause';
+        });
+    });
+    let deleteBtn = controls.appendChild(document.createElement('button'));
+    deleteBtn.className = 'btn btn-sm btn-outline-danger';
+    deleteBtn.textContent = 'Delete';
+    deleteBtn.addEventListener('click', function (e) {
+        eel.delete_card(tidbit['card_id'])(function (deleted) {
+            if (!deleted) {
+                return;
+            }
+            element.remove();
+        });
+    });
 }
 
 
@@ -184,38 +308,186 @@ const addDataValue = document.getElementById('new-card-content');
 const addDataSource = document.getElementById('new-card-source');
 const addDataTitle = document.getElementById('new-card-title');
 
+const addPreview = document.getElementById('new-card-preview');
+
+/**
+ * Appends a piece of the question being generated to the preview. Called
+ * from python while the model streams the question
+ *
+ * @param token text to append
+ */
+function receive_question_token(token) {
+    if (addPreview.dataset.waiting) {
+        addPreview.textContent = '';
+        delete addPreview.dataset.waiting;
+    }
+    addPreview.textContent += token;
+}
+eel.expose(receive_question_token);
+
+/**
+ * Adds a tidbit, streaming its question into the preview. If the tidbit is a
+ * near duplicate of a card in the deck the user is asked before adding it
+ *
+ * @param force add the tidbit even if it is a near duplicate
+ */
+function createTidbit(data, usrQuestion, source, title, force) {
+    addPreview.style.display = usrQuestion == "" ? '' : 'none';
+    addPreview.textContent = "Generating question...";
+    addPreview.dataset.waiting = 'true';
+    addCreateBtn.disabled = true;
+    eel.add_tidbit_stream(data, usrQuestion, source, title, force)(function (tidbit) {
+        addCreateBtn.disabled = false;
+        if ('duplicate' in tidbit) {
+            addPreview.style.display = 'none';
+            let similar = tidbit['duplicate']['data'];
+            if (confirm("A similar card is already in the deck:\n\n" + similar + "\n\nAdd this card anyway?")) {
+                createTidbit(data, usrQuestion, source, title, true);
+            }
+            return;
+        }
+        addPreview.textContent = tidbit['question'];
+        startReview();
+        showAllCards();
+    }, function (error) {
+        // e.g. the model server is down, the note is put back to try again
+        addCreateBtn.disabled = false;
+        addPreview.style.display = '';
+        addPreview.textContent = "Could not add the card: " + error;
+        delete addPreview.dataset.waiting;
+        if (addDataValue.value == "") {
+            addDataValue.value = data;
+            addDataSource.value = source;
+            addDataTitle.value = title;
+        }
+    });
+}
+
 addCreateBtn.addEventListener('click', function (e) {
     let data = addDataValue.value;
     let usrQuestion = addQuestion.value;
     let source = addDataSource.value;
     let title = addDataTitle.value;
     if (data != "") {
-        eel.add_tidbit(data, usrQuestion, source, title)(displayReviewCard);
-        let placeHolder = document.getElementById('review-placeholder');
-        placeHolder.style = "display: none";
-        eel.get_deck()(showAllCards);
+        createTidbit(data, usrQuestion, source, title, false);
         addDataValue.value = "";
         addDataSource.value = "";
         addDataTitle.value = "";
     }
 })
 
+/** Fields shown for each card in the card list */
+const cardListFields = ['title', 'question', 'data', 'source', 'paused'];
+/** Number of cards requested per page */
+const cardPageSize = 50;
+/** Offset of the next page of cards, null once every card is shown */
+let cardPageNext = 0;
+
 /**
- * Displays contents of the current deck.
+ * Appends cards to the card list
+ *
+ * @param cards list of projected tidbits
  */
-function showAllCards(deck) {
+function appendCards(cards) {
     let cardsElement = document.getElementById('all-cards');
-    cardsElement.innerHTML = '';
-    deck.forEach(tid => {
+    cards.forEach(tid => {
         let row = cardsElement.appendChild(document.createElement('div'));
         row.className = 'row mt-3';
         let newCard = row.appendChild(document.createElement('div'));
         newCard.className = 'card h-100';
         displayTidbit(tid, newCard);
     })
+}
+
+/**
+ * Loads the next page of the deck into the card list
+ */
+function loadCardPage() {
+    if (cardPageNext === null) {
+        return;
+    }
+    eel.get_deck_page(cardPageNext, cardPageSize, cardListFields, 'due')(function (page) {
+        appendCards(page['items']);
+        cardPageNext = page['next'];
+        let moreBtn = document.getElementById('more-cards-btn');
+        moreBtn.style.display = cardPageNext === null ? 'none' : '';
+    });
+}
+
+/**
+ * Displays the first page of the current deck. Further pages are loaded on
+ * request so the cost of opening the list does not grow with the deck.
+ */
+function showAllCards() {
+    let cardsElement = document.getElementById('all-cards');
+    cardsElement.innerHTML = '';
+    cardPageNext = 0;
+    loadCardPage();
+}
+
+/**
+ * Receives a chunk of cards pushed by stream_deck
+ *
+ * @param cards list of projected tidbits
+ */
+eel.expose(receive_cards);
+function receive_cards(cards) {
+    appendCards(cards);
+}
 
+document.getElementById('more-cards-btn').addEventListener('click', function (e) {
+    loadCardPage();
+});
+
+document.getElementById('all-cards-btn').addEventListener('click', function (e) {
+    document.getElementById('all-cards').innerHTML = '';
+    document.getElementById('more-cards-btn').style.display = 'none';
+    cardPageNext = null;
+    eel.stream_deck(cardListFields, 'due');
+});
+
+/**
+ * Splits the search box into words, tags written as #tag and a source
+ * written as source:name
+ *
+ * @param text contents of the search box
+ * @returns object with the query, tags and source
+ */
+function parseSearch(text) {
+    let words = [];
+    let tags = [];
+    let source = "";
+    text.split(/\s+/).forEach(term => {
+        if (term.startsWith('#') && term.length > 1) {
+            tags.push(term.slice(1));
+        } else if (term.startsWith('source:')) {
+            source = term.slice('source:'.length);
+        } else if (term != "") {
+            words.push(term);
+        }
+    });
+    return {'query': words.join(' '), 'tags': tags, 'source': source};
 }
 
+document.getElementById('card-search').addEventListener('input', function (e) {
+    let text = e.target.value.trim();
+    if (text == "") {
+        showAllCards();
+        return;
+    }
+    let search = parseSearch(text);
+    eel.search_tidbits(search['query'], search['tags'], search['source'],
+                       cardPageSize, cardListFields)(function (result) {
+        if (e.target.value.trim() != text) {
+            return; // a newer search was started
+        }
+        document.getElementById('all-cards').innerHTML = '';
+        document.getElementById('more-cards-btn').style.display = 'none';
+        cardPageNext = null;
+        appendCards(result['items']);
+    });
+});
+
 // *** SETTINGS ***
 const saveDataBtn = document.getElementById('settings-save');
 const loadDataBtn = document.getElementById('settings-load');
@@ -228,12 +500,8 @@ loadDataBtn.addEventListener('click', function (e) {
                 '<div class="alert alert-success alert-dismissible" role="alert"><button type="button" class="btn-close" data-bs-dismiss="alert"aria-label="Close"></button><strong>Success!</strong>'
             );
 
-            eel.get_deck()(function (deck) {
-                let placeHolder = document.getElementById('review-placeholder');
-                placeHolder.style = "display: none";
-                displayReviewCard(deck[0])
-                showAllCards(deck)
-            });
+            startReview();
+            showAllCards();
         } else {
             loadDataBtn.insertAdjacentHTML(
                 'afterend',
@@ -260,3 +528,134 @@ saveDataBtn.addEventListener('click', function (e) {
     })
 
 });
+
+const optimizeBtn = document.getElementById('settings-optimize');
+
+optimizeBtn.addEventListener('click', function (e) {
+    eel.optimize_schedule()(function (started) {
+        if (started) {
+            optimizeBtn.insertAdjacentHTML(
+                'afterend',
+                '<div class="alert alert-success alert-dismissible" role="alert"><button type="button" class="btn-close" data-bs-dismiss="alert"aria-label="Close"></button><strong>Optimizing in the background</strong>'
+            )
+            showOptimizeStatus();
+        } else {
+            optimizeBtn.insertAdjacentHTML(
+                'afterend',
+                '<div class="alert alert-warning alert-dismissible" role="alert"><button type="button" class="btn-close" data-bs-dismiss="alert"aria-label="Close"></button><strong>Not Enough Reviews</strong>'
+            )
+        }
+    })
+});
+
+/**
+ * Polls the running scheduler fit and shows its error if it fails
+ */
+function showOptimizeStatus() {
+    eel.get_optimize_status()(function (status) {
+        if (status.running) {
+            setTimeout(showOptimizeStatus, 1000);
+        } else if (status.last_error) {
+            optimizeBtn.insertAdjacentHTML(
+                'afterend',
+                `<div class="alert alert-danger alert-dismissible" role="alert"><button type="button" class="btn-close" data-bs-dismiss="alert"aria-label="Close"></button><strong>Optimizing failed:</strong> ${status.last_error}`
+            )
+        }
+    })
+}
+
+
+const importProgress = document.getElementById('import-progress');
+
+/**
+ * Shows the progress of the running import, polling until it is done
+ */
+function showImportProgress() {
+    eel.get_import_progress()(function (progress) {
+        importProgress.textContent = `${progress.records} read, ${progress.added} added, ${progress.duplicates} duplicates`;
+        if (progress.error) {
+            importProgress.textContent += ` - failed: ${progress.error}`;
+        } else if (progress.done) {
+            importProgress.textContent += ' - done';
+            showAllCards();
+        } else {
+            setTimeout(showImportProgress, 1000);
+        }
+    });
+}
+
+document.getElementById('import-start').addEventListener('click', function (e) {
+    let path = document.getElementById('import-path').value;
+    let source = document.getElementById('import-source').value;
+    if (path === '') {
+        return;
+    }
+    eel.import_file(path, source)(function (started) {
+        if (started) {
+            showImportProgress();
+        } else {
+            importProgress.textContent = 'An import is already running';
+        }
+    });
+});
+
+// *** METRICS ***
+
+const metricsEnabled = document.getElementById('metrics-enabled');
+const metricsTimers = document.getElementById('metrics-timers');
+const metricsCounters = document.getElementById('metrics-counters');
+
+function formatMs(seconds) {
+    return seconds == null ? '-' : (seconds * 1000).toFixed(2);
+}
+
+/**
+ * Fills the metrics tables from the backend
+ */
+function showMetrics() {
+    eel.get_metrics()(function (metrics) {
+        metricsEnabled.checked = metrics.enabled;
+        metricsTimers.innerHTML = '';
+        for (const [name, h] of Object.entries(metrics.histograms).sort()) {
+            let row = metricsTimers.insertRow();
+            for (const value of [name, h.count, formatMs(h.mean), formatMs(h.p95), formatMs(h.max)]) {
+                row.insertCell().textContent = value;
+            }
+        }
+        metricsCounters.innerHTML = '';
+        for (const [name, value] of Object.entries(metrics.counters).sort()) {
+            let row = metricsCounters.insertRow();
+            row.insertCell().textContent = name;
+            row.insertCell().textContent = value;
+        }
+    });
+}
+
+/**
+ * Downloads the metrics as a text file
+ */
+function exportMetrics(fmt, filename) {
+    eel.export_metrics(fmt)(function (text) {
+        let link = document.createElement('a');
+        link.href = URL.createObjectURL(new Blob([text], { type: 'text/plain' }));
+        link.download = filename;
+        link.click();
+        URL.revokeObjectURL(link.href);
+    });
+}
+
+metricsEnabled.addEventListener('change', function (e) {
+    eel.set_metrics_enabled(metricsEnabled.checked)(showMetrics);
+});
+document.getElementById('metrics-refresh').addEventListener('click', showMetrics);
+document.getElementById('metrics-reset').addEventListener('click', function (e) {
+    eel.reset_metrics()(showMetrics);
+});
+document.getElementById('metrics-export-json').addEventListener('click', function (e) {
+    exportMetrics('json', 'metrics.json');
+});
+document.getElementById('metrics-export-prometheus').addEventListener('click', function (e) {
+    exportMetrics('prometheus', 'metrics.prom');
+});
+
+showMetrics();
@@ -0,0 +1,21 @@
+import pytest
+import harness
+
+
+@pytest.fixture
+def make_config(tmp_path):
+    """
+    Factory writing a config for a deck that uses the stub model client, see
+    harness.make_config. The directory defaults to tmp_path
+    """
+    def _make_config(directory = None, **kwargs):
+        return harness.make_config(directory or tmp_path, **kwargs)
+    return _make_config
+
+
+@pytest.fixture
+def make_tidbits():
+    """
+    Factory generating a synthetic deck, see harness.make_tidbits
+    """
+    return harness.make_tidbits
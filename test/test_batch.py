@@ -0,0 +1,82 @@
+import random
+import pytest
+from datetime import datetime, timedelta, timezone
+from fsrs import Card, Rating, Scheduler, State
+from tidbit import Tidbit
+from deck_store import DeckStore
+from batch import BatchScheduler
+
+NOW = datetime(2025, 6, 1, 12, tzinfo = timezone.utc)
+
+
+def make_store(n = 200, seed = 0):
+    """
+    Builds a store of reviewed and new cards
+    """
+    rng = random.Random(seed)
+    tids = []
+    for i in range(n):
+        if i % 5 == 0:
+            card = Card(card_id = i + 1, due = NOW)
+        else:
+            last = NOW - timedelta(days = rng.randrange(0, 60), hours = rng.randrange(24))
+            card = Card(card_id = i + 1, state = State.Review, step = None,
+                        stability = rng.uniform(0.5, 100), difficulty = rng.uniform(1, 10),
+                        due = last + timedelta(days = rng.randrange(1, 30)), last_review = last)
+        tids.append(Tidbit(card, f"tidbit {i}"))
+    return store_from(tids), tids
+
+
+def store_from(tids):
+    return DeckStore.from_tidbits(tids)
+
+
+def test_retrievability():
+    store, tids = make_store()
+    r = BatchScheduler(Scheduler()).retrievability(store, NOW)
+    assert r == pytest.approx([t.card.get_retrievability(NOW) for t in tids])
+
+
+def test_forecast():
+    store, tids = make_store()
+    counts = BatchScheduler(Scheduler()).forecast(store, 30, NOW)
+    assert len(counts) == 30
+    assert counts.sum() == sum(1 for t in tids if (t.card.due - NOW).days < 30)
+    tids[1].paused = True
+    assert BatchScheduler(Scheduler()).forecast_tidbits(tids, 30, NOW).tolist() == \
+        BatchScheduler(Scheduler()).forecast(store_from(tids), 30, NOW).tolist()
+
+
+def test_review_matches_scheduler():
+    """
+    Tests that batch reviews give the same result as Scheduler.review_card
+    """
+    scheduler = Scheduler(enable_fuzzing = False)
+    store, tids = make_store()
+    rng = random.Random(1)
+    ratings = [Rating(rng.randrange(1, 5)) for _ in tids]
+    BatchScheduler(scheduler).review(store, range(len(tids)), ratings, NOW)
+
+    for row, (tid, rating) in enumerate(zip(tids, ratings)):
+        expected, _ = scheduler.review_card(tid.card, rating, NOW)
+        card = store.card(row)
+        assert card.state == expected.state
+        assert card.step == expected.step
+        assert card.stability == pytest.approx(expected.stability)
+        assert card.difficulty == pytest.approx(expected.difficulty)
+        assert card.due == expected.due
+        assert card.last_review == NOW
+
+
+def test_reschedule():
+    """
+    Tests that a lower desired retention pushes reviewed cards further out
+    """
+    store, tids = make_store()
+    BatchScheduler(Scheduler(desired_retention = 0.8)).reschedule(store)
+    for row, tid in enumerate(tids):
+        if tid.card.state == State.Review:
+            expected = Scheduler(desired_retention = 0.8)._next_interval(tid.card.stability)
+            assert store.card(row).due == tid.card.last_review + timedelta(days = expected)
+        else:
+            assert store.card(row).due == tid.card.due
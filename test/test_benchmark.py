@@ -0,0 +1,13 @@
+from benchmark import bench_size
+
+
+def test_bench_size(tmp_path):
+    """
+    Tests that the benchmark runs on a small deck and reports every metric
+    """
+    results = bench_size(50, 10, str(tmp_path))
+    assert results['size'] == 50
+    for key in ['save_deck_s', 'load_deck_s', 'get_deck_s', 'review_cycle_us',
+                'journaled_review_cycle_us', 'load_deck_peak_bytes',
+                'save_binary_s', 'first_cards_binary_ms', 'load_binary_s']:
+        assert results[key] > 0
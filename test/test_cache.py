@@ -0,0 +1,66 @@
+import pytest
+from cache import ResponseCache
+from model import Model
+
+
+class StubClient():
+    """
+    Counts calls so cache hits can be checked without a model server
+    """
+    question_prompt = "Create a question"
+    answer_prompt = "Grade the answer"
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate_question(self, data):
+        self.calls += 1
+        return {'message': {'content': f"Question about {data}"}}
+
+
+def test_response_cache(tmp_path):
+    """
+    Tests storing, evicting and reopening cached responses
+    """
+    file_path = str(tmp_path / "cache.db")
+    cache = ResponseCache(file_path, max_entries = 2)
+    key_a = cache.make_key('question', 'model', 'prompt', 'a')
+    key_b = cache.make_key('question', 'model', 'prompt', 'b')
+    key_c = cache.make_key('question', 'model', 'prompt', 'c')
+    assert key_a != cache.make_key('question', 'model', 'other prompt', 'a')
+    assert key_a != cache.make_key('title', 'model', 'prompt', 'a')
+
+    assert cache.get(key_a) is None
+    cache.put(key_a, "A")
+    cache.put(key_b, ["B", "tags"])
+    assert cache.get(key_a) == "A"
+    cache.put(key_c, "C") # b is least recently used
+    assert cache.get(key_b) is None
+    assert cache.stats() == {'entries': 2, 'hits': 1, 'misses': 2}
+    cache.close()
+
+    cache = ResponseCache(file_path, max_entries = 2)
+    assert cache.get(key_c) == "C"
+    cache.close()
+
+    cache = ResponseCache(':memory:', max_entries = None, max_bytes = 8)
+    cache.put(key_a, "aaaa")
+    cache.put(key_b, "bbbb")
+    assert len(cache) == 1
+    assert cache.get(key_b) == "bbbb"
+
+
+def test_model_cache():
+    """
+    Tests that repeated requests are answered from the cache
+    """
+    m = Model(connection = 'ollama',
+              model_type = 'llama3.2:1b',
+              host = 'Not a Host',
+              cache = ResponseCache(':memory:'))
+    m.model_client = StubClient()
+
+    assert m.generate_question("Albert has 23 sheep") == "Question about Albert has 23 sheep"
+    assert m.generate_question("Albert has 23 sheep") == "Question about Albert has 23 sheep"
+    assert m.model_client.calls == 1
+    assert m.cache.stats()['hits'] == 1
@@ -0,0 +1,60 @@
+from threading import Thread
+import pytest
+from fsrs import Rating
+from commands import CommandQueue
+from deck_manager import DeckManager
+
+
+def test_command_queue():
+    commands = CommandQueue()
+    order = []
+    futures = [commands.submit(order.append, i) for i in range(100)]
+    commands.join()
+    assert order == list(range(100))
+    assert all(f.done() for f in futures)
+
+    # commands run from the writer run right away instead of deadlocking
+    assert commands.call(lambda: commands.call(lambda: 'nested')) == 'nested'
+    assert commands.call(commands.on_writer)
+    assert not commands.on_writer()
+
+    with pytest.raises(KeyError):
+        commands.call({}.__getitem__, 'missing')
+    commands.close()
+    with pytest.raises(RuntimeError):
+        commands.submit(print)
+
+
+def test_concurrent_changes(tmp_path, make_config):
+    """
+    Tests that adds, reviews and saves from several threads leave the deck,
+    its index and its snapshot consistent
+    """
+    dm = DeckManager(make_config(journal = True))
+
+    def _add(n):
+        for i in range(25):
+            dm.add_tidbit(f"worker {n} fact {i}")
+
+    def _review():
+        for _ in range(50):
+            tid = dm.get_next_tidbit()
+            if tid is not None:
+                dm.review_tidbit(tid, Rating.Good)
+
+    threads = [Thread(target = _add, args = (n,)) for n in range(4)]
+    threads += [Thread(target = _review) for _ in range(2)]
+    threads += [Thread(target = dm.save_deck)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert dm.deck_size() == 100
+    assert len(dm.index) == 100
+    assert {t.card.card_id for t in dm.snapshot()} == set(dm.index.card_ids())
+    assert len(dm.review_logs) <= 100
+    first = dm.snapshot()
+    assert dm.snapshot() is first
+    dm.add_tidbit("one more")
+    assert len(dm.snapshot()) == 101
@@ -0,0 +1,94 @@
+import pytest
+from threading import Event
+from time import sleep
+from connection import CircuitBreaker, HealthChecker, ModelUnavailableError
+from model import Model, StubClient
+
+
+def test_circuit_breaker():
+    """
+    Tests that the breaker opens after repeated failures and lets a single
+    trial request through after the reset timeout
+    """
+    breaker = CircuitBreaker(failure_threshold = 2, reset_timeout = 0.05)
+    assert breaker.allow()
+    assert not breaker.record_failure()
+    assert breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+    sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == 'half open'
+    assert not breaker.allow()
+
+    # a failed trial opens the breaker again
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.failures == 0
+
+
+def test_health_checker():
+    """
+    Tests that the health checker keeps probing until the server responds
+    """
+    attempts = []
+    healthy = Event()
+
+    def probe():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError()
+
+    checker = HealthChecker(probe, healthy.set, initial_delay = 0.01, max_delay = 0.02)
+    checker.start()
+    assert healthy.wait(1)
+    checker.stop()
+    assert len(attempts) == 3
+    assert not checker.running()
+
+
+class FlakyClient(StubClient):
+    """
+    Stub client that fails while the server is down
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.down = True
+
+    def generate_question(self, data : str):
+        if self.down:
+            raise ConnectionError("down")
+        return super().generate_question(data)
+
+    def ping(self):
+        if self.down:
+            raise ConnectionError("down")
+        return True
+
+
+def test_model_reconnects():
+    """
+    Tests that the model recovers once the server is back, without being
+    recreated
+    """
+    m = Model(connection = 'stub', failure_threshold = 1, reset_timeout = 0.05)
+    m.model_client = FlakyClient()
+    m.health.initial_delay = 0.01
+
+    with pytest.raises(ModelUnavailableError):
+        m.generate_question("Albert has 23 sheep")
+    assert not m.is_available()
+
+    m.model_client.down = False
+    for _ in range(100):
+        if m.is_available():
+            break
+        sleep(0.01)
+    assert m.generate_question("Albert has 23 sheep") == "What do you remember about: Albert has 23 sheep?"
+    m.close()
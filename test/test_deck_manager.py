@@ -1,6 +1,9 @@
 import pytest
 from deck_manager import DeckManager
+from due_queue import DueQueue
+from tidbit import Tidbit
 from fsrs import Scheduler, Card, Rating, ReviewLog
+from datetime import datetime, timedelta, timezone
 
 def test_DeckManager():
     """
@@ -10,7 +13,8 @@ def test_DeckManager():
     assert len(dm.deck) == 0
 
     dm = DeckManager('test/config_1.yaml')
-    assert dm.model.model_client == None
+    with pytest.raises(ConnectionError):
+        dm.model.generate_question("Albert has 23 sheep")
 
     dm = DeckManager('test/config_2.yaml')
     assert dm.model.get_question_prompt() == "This is a short prompt"
@@ -70,5 +74,81 @@ def test_load_deck():
     assert not dm.load_deck("test/empty_deck.json")
 
 
+def test_query_deck():
+    """
+    Tests paging, projecting and sorting the deck
+    """
+    dm = DeckManager("test/config_3.yaml")
+    start = datetime(2025, 1, 1, tzinfo = timezone.utc)
+    dm.deck = DueQueue([
+        Tidbit(Card(card_id = i, due = start + timedelta(minutes = (i * 37) % 120)),
+               f"tidbit {i}", title = f"title {i:03}")
+        for i in range(120)])
+
+    page = dm.query_deck(0, 50, ['title', 'due'])
+    assert page['total'] == 120
+    assert page['next'] == 50
+    assert set(page['items'][0]) == {'title', 'due', 'card_id'}
+    dues = [t['due'] for t in page['items']]
+    assert dues == sorted(dues)
+
+    last = dm.query_deck(100, 50, ['title'], sort = 'title', descending = True)
+    assert last['next'] is None
+    assert [t['title'] for t in last['items']] == [f"title {i:03}" for i in range(19, -1, -1)]
+
+    assert dm.query_deck(0, 1)['items'][0]['card']['card_id'] == dm.deck.peek().card.card_id
+
+    with pytest.raises(ValueError):
+        dm.query_deck(sort = 'size')
+    with pytest.raises(ValueError):
+        dm.query_deck(fields = ['colour'])
+
+    # an edited title and a replaced deck are sorted again
+    first = dm.query_deck(0, 1, ['title'], sort = 'title')['items'][0]
+    dm.update_tidbit(dm.get_tidbit(first['card_id']), title = "zzz")
+    assert dm.query_deck(0, 1, ['title'], sort = 'title')['items'][0]['title'] == "title 001"
+    version = dm.deck.version
+    dm.deck = DueQueue([Tidbit(Card(card_id = 500, due = start), "other", title = "other")])
+    dm.deck.version = version
+    assert dm.query_deck(0, 5, ['title'], sort = 'title')['items'] == \
+        [{'card_id' : 500, 'title' : "other"}]
+
+
+def test_review_next():
+    """
+    Tests that the next card is reviewed and put back in one command
+    """
+    dm = DeckManager("test/config_3.yaml")
+    start = datetime(2025, 1, 1, tzinfo = timezone.utc)
+    dm.deck = DueQueue([Tidbit(Card(card_id = i, due = start + timedelta(minutes = i)),
+                               f"tidbit {i}") for i in range(3)])
+    with pytest.raises(ValueError):
+        dm.review_next(9)
+    assert len(dm.deck) == 3
+
+    assert dm.review_next(Rating.Easy).card_id == 0
+    assert len(dm.deck) == 3
+    assert dm.peek_tidbit().card.card_id == 1
+    dm.deck = DueQueue()
+    assert dm.review_next(Rating.Good) is None
+
+
+def test_add_tidbit_stream(tmp_path, make_config):
+    """
+    Tests that the question is streamed before the tidbit is added
+    """
+    dm = DeckManager(make_config())
+    tokens = []
+
+    def on_token(token):
+        tokens.append(token)
+        assert len(dm.deck) == 0
+
+    tid = dm.add_tidbit("Albert has 23 sheep", on_token = on_token)
+    assert len(tokens) > 1
+    assert tid.question == ''.join(tokens)
+    assert dm.get_tidbit(tid.card.card_id) is tid
+
+
 if __name__ == '__main__':
-    pytest.main()
\ No newline at end of file
+    pytest.main()
@@ -0,0 +1,34 @@
+from datetime import datetime, timezone
+from fsrs import Card, Rating, Scheduler, State
+from tidbit import Tidbit
+from deck_store import DeckStore, to_micros, from_micros
+
+
+def test_micros():
+    time = datetime(2025, 3, 6, 14, 45, 32, 593304, tzinfo = timezone.utc)
+    assert from_micros(to_micros(time)) == time
+    assert from_micros(to_micros(None)) is None
+
+
+def test_round_trip():
+    """
+    Tests that tidbits read back from the store match the originals
+    """
+    tids = [
+        Tidbit(Card(card_id = 1), "Albert has 23 sheep", question = "How many sheep?",
+               source = "some-place.com"),
+        Tidbit(Card(card_id = 2, state = State.Review, step = None, stability = 3.5,
+                    difficulty = 5.25,
+                    last_review = datetime(2025, 3, 1, tzinfo = timezone.utc)),
+               "Bill has 99 goats", title = "Goats", tags = ["animals", "farm"],
+               source = "some-place.com", paused = True)
+    ]
+    store = DeckStore.from_tidbits(tids)
+    assert len(store) == 2
+    assert [t.to_dict() for t in store.tidbits()] == [t.to_dict() for t in tids]
+    assert store.tidbit(store.row(2)).tags == ["animals", "farm"]
+
+    row = store.row(1)
+    store.review(row, Scheduler(), Rating.Good)
+    assert store.card(row).last_review is not None
+    assert store.card(row).due > tids[0].card.due
@@ -0,0 +1,74 @@
+import random
+from datetime import datetime, timedelta, timezone
+from heapq import heappush, heappop
+from fsrs import Card
+from tidbit import Tidbit
+from due_queue import DueQueue
+
+
+def make_tidbits(n, seed = 0):
+    """
+    Builds tidbits with random due dates
+    """
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, tzinfo = timezone.utc)
+    return [Tidbit(Card(card_id = i, due = start + timedelta(minutes = rng.randrange(10000))),
+                   f"tidbit {i}")
+            for i in range(n)]
+
+
+def test_matches_heapq():
+    """
+    Tests that the queue keeps the same layout and pop order as heapq
+    """
+    tids = make_tidbits(200)
+    heap = []
+    queue = DueQueue()
+    for t in tids:
+        heappush(heap, t)
+        queue.push(t)
+    assert list(queue) == heap
+    while heap:
+        assert queue.pop() is heappop(heap)
+    assert queue.pop() is None
+
+
+def test_remove_update_pause():
+    """
+    Tests removing, rescheduling and pausing arbitrary tidbits
+    """
+    tids = make_tidbits(100, seed = 1)
+    queue = DueQueue(tids)
+    assert len(queue) == 100
+    assert queue.get(42) is tids[42]
+
+    queue.remove(42)
+    assert 42 not in queue
+    queue.pause(7)
+    assert queue.active() == 98
+    assert len(queue) == 99
+    assert queue.get(7).paused
+
+    early = datetime(2024, 1, 1, tzinfo = timezone.utc)
+    tids[3].card.due = early
+    queue.update(3)
+    assert queue.peek() is tids[3]
+
+    queue.resume(7)
+    expected = sorted((t for t in tids if t.card.card_id != 42),
+                      key = lambda t: t.card.due)
+    popped = [queue.pop() for _ in range(99)]
+    assert [t.card.due for t in popped] == [t.card.due for t in expected]
+
+
+def test_ordered():
+    """
+    Tests iterating in due order without changing the queue
+    """
+    tids = make_tidbits(100, seed = 2)
+    queue = DueQueue(tids)
+    queue.pause(5)
+    ordered = list(queue.ordered())
+    assert ordered[-1] is tids[5]
+    assert [t.card.due for t in ordered[:-1]] == sorted(t.card.due for t in tids if t is not tids[5])
+    assert len(queue) == 100
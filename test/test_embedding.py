@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+from embedding import EmbeddingIndex
+from fsrs import Card
+from deck_manager import DeckManager, DuplicateTidbitError
+from tidbit import Tidbit
+
+
+def test_embedding_index(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((50, 16))
+    index = EmbeddingIndex()
+    for card_id, vector in enumerate(vectors):
+        index.add(card_id, vector)
+
+    (card_id, similarity), = index.nearest(vectors[7] * 3)
+    assert card_id == 7 and similarity == pytest.approx(1.0)
+    assert [c for c, _ in index.nearest(vectors[7], k = 3)][0] == 7
+
+    index.remove(7)
+    index.remove(0) # the last row is moved into its place
+    assert len(index) == 48
+    assert index.nearest(vectors[49])[0][0] == 49
+    assert index.nearest(vectors[7])[0][0] != 7
+
+    index.save(str(tmp_path / "vectors.npz"))
+    loaded = EmbeddingIndex()
+    assert loaded.load(str(tmp_path / "vectors.npz"), card_ids = {3, 49})
+    assert len(loaded) == 2 and loaded.nearest(vectors[3])[0][0] == 3
+    assert not loaded.load(str(tmp_path / "missing.npz"))
+
+
+def test_lsh():
+    """
+    Tests that approximate lookups find exact and near matches
+    """
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((2000, 32))
+    index = EmbeddingIndex(approximate = True, lsh_min = 100, bits = 8, tables = 8)
+    for card_id, vector in enumerate(vectors):
+        index.add(card_id, vector)
+    for card_id in range(0, 2000, 97):
+        noisy = vectors[card_id] + 0.05 * rng.standard_normal(32)
+        assert index.nearest(noisy)[0][0] == card_id
+
+
+def duplicate_settings(action):
+    return {'duplicate params' : {'threshold' : 0.9, 'action' : action}}
+
+
+def test_duplicates(tmp_path, make_config):
+    """
+    Tests that near duplicates are flagged or merged before a question is
+    generated
+    """
+    dm = DeckManager(make_config(settings = duplicate_settings('flag')))
+    first = dm.add_tidbit("Albert has 23 sheep on his farm")
+    dm.add_tidbit("Bill has 99 goats")
+    with pytest.raises(DuplicateTidbitError) as error:
+        dm.add_tidbit("albert has 23 sheep on his farm!")
+    assert error.value.tidbit is first
+    assert len(dm.deck) == 2
+    dm.add_tidbit("albert has 23 sheep on his farm!", allow_duplicate = True)
+    assert len(dm.deck) == 3
+
+    dm.config['initialized'] = True
+    dm.save_deck()
+    dm.delete_card(first)
+    dm.load_deck()
+    assert len(dm.embeddings) == 3
+
+    merging = DeckManager(make_config(tmp_path / "merge", settings = duplicate_settings('merge')))
+    tid = merging.add_tidbit("Casey has 38 opossums")
+    assert merging.add_tidbit("Casey has 38 opossums.") is tid
+    assert len(merging.deck) == 1
+
+
+def test_missing_embeddings(tmp_path, make_config):
+    """
+    Tests that bulk added cards and cards loaded without a saved embedding
+    are embedded in the background, and that a failing embedding does not
+    stop a card from being added
+    """
+    settings = {'initialized' : True, **duplicate_settings('flag')}
+    config_path = make_config(journal = True, settings = settings)
+    dm = DeckManager(config_path)
+    first, = dm.add_tidbits([Tidbit(Card(), "Albert has 23 sheep on his farm",
+                                    question = "How many sheep does Albert have?")])
+    dm.wait_for_embeddings()
+    assert first.card.card_id in dm.embeddings
+    with pytest.raises(DuplicateTidbitError):
+        dm.add_tidbit("albert has 23 sheep on his farm!")
+
+    # only journaled, the embedding was never saved
+    reloaded = DeckManager(config_path)
+    reloaded.wait_for_embeddings()
+    assert first.card.card_id in reloaded.embeddings
+
+    def unavailable(data):
+        raise ConnectionError("embedding model is down")
+    reloaded.model.embed = unavailable
+    tid = reloaded.add_tidbit("Bill has 99 goats")
+    assert reloaded.get_tidbit(tid.card.card_id) is tid
+    assert isinstance(reloaded.embed_error, ConnectionError)
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta, timezone
+from fsrs import Card
+from deck_manager import DeckManager
+from enrichment import Enricher
+from storage import DeckStorage
+from tidbit import Tidbit
+
+
+def test_enrich_due_soon(tmp_path, make_config):
+    """
+    Tests that only cards due within the horizon are enriched, that user
+    questions are kept first and that results are journaled
+    """
+    dm = DeckManager(make_config(journal = True))
+    dm.variants = 2
+    now = datetime.now(timezone.utc)
+    soon = Tidbit(Card(card_id = 1, due = now), "Albert has 23 sheep on his farm",
+                  question = "How many sheep does Albert have?")
+    later = Tidbit(Card(card_id = 2, due = now + timedelta(days = 30)), "Bill has 99 goats")
+    dm.add_tidbits([soon, later])
+
+    enricher = Enricher(dm, horizon_hours = 24, idle_seconds = 0)
+    assert enricher.candidates() == [soon]
+    assert enricher.run_once() == 3
+    assert soon.title == "Albert has 23 sheep on his"
+    assert soon.tags == ['albert', 'sheep', 'farm']
+    assert soon.questions[0] == "How many sheep does Albert have?"
+    assert len(soon.questions) == 2
+    assert later.title is None
+    assert enricher.candidates() == []
+    assert dm.search_tidbits("farm")['total'] == 1
+
+    replayed = {t['card']['card_id'] : t for t in DeckStorage.read(dm.config['deck'])['deck']}
+    assert replayed[1]['tags'] == ['albert', 'sheep', 'farm']
+    assert replayed[1]['questions'] == soon.questions
+
+
+def test_pause_on_activity(tmp_path, make_config):
+    """
+    Tests that nothing is generated while the deck is in use
+    """
+    dm = DeckManager(make_config())
+    dm.add_tidbit("Paris is the capital of France", "What is the capital of France?")
+    enricher = Enricher(dm, idle_seconds = 60)
+    assert not enricher.is_idle()
+    assert enricher.run_once() == 0
+
+    enricher.idle_seconds = 0
+    dm.touch()
+    assert enricher.run_once() == 2 # title and tags, one question is enough
+
+
+def test_skip_queued(tmp_path, make_config):
+    """
+    Tests that questions waiting on the generation queue are left to it and
+    that enrichment is restarted by reset and stopped by close
+    """
+    dm = DeckManager(make_config())
+    tid = Tidbit(Card(card_id = 1), "Albert has 23 sheep")
+    dm.commands.call(dm._insert_all, [tid])
+    dm._queued.add(1)
+    enricher = Enricher(dm, idle_seconds = 0, interval = 60)
+    assert enricher.needs(tid) == ['title', 'tags']
+    assert enricher.run_once() == 2
+    assert tid.question is None
+
+    dm._queued.clear()
+    assert enricher.run_once() == 1
+    assert tid.question is not None
+    assert not dm._queued
+
+    dm.enricher = enricher
+    enricher.start()
+    dm.reset()
+    assert enricher.to_dict()['running']
+    dm.close()
+    assert not enricher.to_dict()['running']
@@ -0,0 +1,166 @@
+import asyncio
+import time
+from concurrent.futures import CancelledError
+import pytest
+from generation import GenerationQueue
+from deck_manager import DeckManager
+
+
+class CountingJob():
+    """
+    Async job that records how many calls are running at the same time
+    """
+    def __init__(self, delay = 0.05):
+        self.delay = delay
+        self.running = 0
+        self.max_running = 0
+
+    async def __call__(self, data):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(self.delay)
+        self.running -= 1
+        return f"Question about {data}"
+
+
+class StubModel():
+    """
+    Stands in for Model so questions can be generated without a server
+    """
+    async def agenerate_question(self, data):
+        await asyncio.sleep(0.01)
+        return f"Question about {data}"
+
+
+def test_generation_queue():
+    """
+    Tests that jobs run concurrently up to the configured limit
+    """
+    with pytest.raises(ValueError):
+        GenerationQueue(CountingJob(), concurrency = 0)
+
+    job = CountingJob()
+    queue = GenerationQueue(job, concurrency = 3, max_pending = 2)
+    futures = [queue.submit(i) for i in range(9)]
+    queue.join(timeout = 5)
+    assert [f.result() for f in futures] == [f"Question about {i}" for i in range(9)]
+    assert job.max_running == 3
+    queue.close()
+
+
+class FlakyJob():
+    """
+    Async job that fails a number of times before it succeeds
+    """
+    def __init__(self, failures):
+        self.failures = failures
+
+    async def __call__(self, data):
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("Model server restarting")
+        return data
+
+
+def test_submit_never_blocks():
+    """
+    Tests that a full queue does not block submit, only wait_for_room, and
+    that failed jobs are retried
+    """
+    queue = GenerationQueue(CountingJob(delay = 0.2), concurrency = 1, max_pending = 1)
+    start = time.perf_counter()
+    futures = [queue.submit(i) for i in range(5)]
+    assert time.perf_counter() - start < 0.1
+    assert not queue.wait_for_room(timeout = 0.01)
+    assert queue.wait_for_room(timeout = 5)
+    queue.close()
+    assert queue.submit(6).cancelled()
+    assert all(f.done() for f in futures)
+
+    flaky = GenerationQueue(FlakyJob(2), retries = 2, backoff = 0.01)
+    assert flaky.submit("ok").result(timeout = 5) == "ok"
+    flaky.job = FlakyJob(3)
+    with pytest.raises(ConnectionError):
+        flaky.submit("lost").result(timeout = 5)
+    flaky.close()
+
+
+def test_close_resolves_futures():
+    """
+    Tests that closing the queue resolves the futures of running and waiting
+    jobs
+    """
+    queue = GenerationQueue(CountingJob(delay = 5), concurrency = 1)
+    running, waiting = queue.submit(1), queue.submit(2)
+    while not running.running():
+        pass
+    queue.close()
+    with pytest.raises(CancelledError):
+        running.result(timeout = 1)
+    assert waiting.cancelled()
+
+
+def test_add_tidbits_bulk():
+    """
+    Tests that bulk tidbits are added right away and filled in later
+    """
+    dm = DeckManager("test/config_3.yaml")
+    dm.model = StubModel()
+    dm.config['generation params'] = {'concurrency': 2}
+
+    tids = dm.add_tidbits_bulk(["Dan has 19 elephants", "Eve has 4 cats"],
+                               source = "bulk")
+    assert len(dm.deck) == 5
+    assert all(t.source == "bulk" for t in tids)
+
+    # both are already queued, resuming does not queue them again
+    assert dm.resume_questions() == 0
+    dm.wait_for_questions(timeout = 5)
+    assert dm.pending_tidbits() == []
+    assert tids[0].question == "Question about Dan has 19 elephants"
+    assert tids[1].question == "Question about Eve has 4 cats"
+    dm.reset()
+
+
+def test_failed_generation():
+    """
+    Tests that a question that could not be generated is reported and left
+    pending
+    """
+    dm = DeckManager("test/config_3.yaml")
+    dm.model = StubModel()
+    dm.model.agenerate_question = FlakyJob(1)
+    dm.config['generation params'] = {'retries' : 0}
+
+    tid, = dm.add_tidbits_bulk(["Dan has 19 elephants"])
+    dm.wait_for_questions(timeout = 5)
+    assert dm.pending_tidbits() == [tid]
+    status = dm.generation_status()
+    assert status['failed'] == 1
+    assert "restarting" in status['last_error']
+    assert dm.resume_questions() == 1
+    dm.wait_for_questions(timeout = 5)
+    assert tid.question == "Dan has 19 elephants"
+    dm.reset()
+
+
+def test_reset_in_flight():
+    """
+    Tests that questions dropped by reset are not reported as failures and
+    that their cards can be queued again on the new deck
+    """
+    dm = DeckManager("test/config_3.yaml")
+    dm.model = StubModel()
+    dm.model.agenerate_question = CountingJob(delay = 1)
+    tid, = dm.add_tidbits_bulk(["Dan has 19 elephants"])
+    time.sleep(0.1) # the job is running
+    dm.review_logs.append(None)
+    dm.reset()
+    assert dm.generation_status()['failed'] == 0
+    assert dm.generation_error is None
+    assert dm.review_logs == []
+
+    dm.model.agenerate_question = StubModel().agenerate_question
+    assert dm._queue_questions([tid]) == 1
+    dm.wait_for_questions(timeout = 5)
+    dm.reset()
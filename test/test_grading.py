@@ -0,0 +1,52 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from fsrs import Card, Rating
+from grading import parse_score, score_to_rating
+from model import Model
+from deck_manager import DeckManager
+from due_queue import DueQueue
+from tidbit import Tidbit
+from review_session import ReviewSession
+
+
+def test_scores():
+    assert parse_score("4") == 4
+    assert parse_score("Score: 3/5") == 3
+    assert parse_score("9") == 5
+    assert parse_score("On a scale from 0 to 5 the answer misses 2 details, so 3") == 3
+    assert parse_score("1 detail is missing. Score: 4. 5 would need the number") == 4
+    assert parse_score("I would give it 2 out of 5") == 2
+    with pytest.raises(ValueError):
+        parse_score("Great answer!")
+    assert [score_to_rating(s) for s in range(6)] == [
+        Rating.Again, Rating.Again, Rating.Hard, Rating.Good, Rating.Good, Rating.Easy]
+
+
+def test_stub_grading():
+    m = Model(connection = 'stub')
+    assert m.eval_answer("Albert has 23 sheep", "albert has 23 sheep") == 5
+    assert m.eval_answer("Albert has 23 sheep", "Albert has sheep") == 4
+    assert m.eval_answer("Albert has 23 sheep", "no idea") == 0
+
+
+def test_answer_review(tmp_path, make_config):
+    """
+    Tests that typed answers are graded in the background and rate the card
+    """
+    dm = DeckManager(make_config())
+    start = datetime(2025, 1, 1, tzinfo = timezone.utc)
+    dm.deck = DueQueue([Tidbit(Card(card_id = i, due = start + timedelta(minutes = i)),
+                               f"Albert has {i} sheep") for i in range(4)])
+    session = ReviewSession(dm, size = 2)
+    session.start()
+
+    futures = [dm.grade_answer(dm.get_tidbit(3), answer)
+               for answer in ("Albert has 3 sheep", "Albert has sheep", "goats")]
+    assert [f.result(timeout = 5) for f in futures] == [Rating.Easy, Rating.Good, Rating.Again]
+
+    assert [c['card_id'] for c in session.answer(0, "albert has 0 sheep")] == [2]
+    session.answer(1, "I forgot")
+    session.flush()
+    assert dm.get_tidbit(0).card.due - dm.get_tidbit(0).card.last_review > timedelta(days = 1)
+    assert dm.review_logs[1].rating == Rating.Again
+    dm.reset()
@@ -0,0 +1,85 @@
+import io
+import json
+import pytest
+from importer import Importer, chunk_text, read_markdown, read_csv, content_hash
+from deck_manager import DeckManager
+
+
+def test_chunk_text():
+    text = "One short sentence. " * 20 + "x" * 50
+    pieces = chunk_text(text, 60)
+    assert all(len(p) <= 60 for p in pieces)
+    assert ''.join(pieces).replace(' ', '') == text.replace(' ', '')
+    assert chunk_text("  \n ") == []
+    assert content_hash("Paris  is\nthe capital") == content_hash("paris is the capital")
+
+
+def test_readers():
+    markdown = io.StringIO("# Geography\n\nParis is the capital\nof France.\n\n"
+                           "- Rome is in Italy\n- Bern is in Switzerland\n\n"
+                           "## Code\n```\nx = 1\n\ny = 2\n```\n")
+    records = list(read_markdown(markdown))
+    assert [r['data'] for r in records] == ["Paris is the capital of France.",
+                                            "Rome is in Italy", "Bern is in Switzerland",
+                                            "```\nx = 1\n\ny = 2\n```"]
+    assert [r['title'] for r in records] == ["Geography"] * 3 + ["Code"]
+    assert records[3]['fenced'] and 'fenced' not in records[0]
+
+    rows = list(read_csv(io.StringIO("text,tags,source\nAlbert has 23 sheep,farm;animals,notes\n")))
+    assert rows[0]['data'] == "Albert has 23 sheep"
+    assert rows[0]['tags'] == ["farm", "animals"]
+    assert rows[0]['source'] == "notes"
+
+
+def test_fenced_records(tmp_path, make_config):
+    """
+    Tests that fenced code keeps its whitespace and is not split
+    """
+    code = "```\ndef f(x):\n    return x  *  2\n```"
+    notes = tmp_path / "notes.md"
+    with open(notes, 'w') as file:
+        file.write("# Code\n" + code + "\n")
+    importer = Importer(DeckManager(make_config()), max_chars = 20)
+    assert [r['data'] for r in importer.records(str(notes))] == [code]
+
+
+def test_import_resume(tmp_path, make_config):
+    """
+    Tests that an interrupted import resumes from its checkpoint without
+    adding duplicates, and that a deck can be merged into another
+    """
+    notes = tmp_path / "notes.jsonl"
+    with open(notes, 'w') as file:
+        for i in range(30):
+            file.write(json.dumps({'text' : f"Fact number {i % 25}"}) + '\n')
+    dm = DeckManager(make_config(journal = True))
+    importer = Importer(dm, batch_size = 4, checkpoint_every = 10)
+
+    add_tidbits = dm.add_tidbits
+    calls = []
+    def _interrupt(tidbits):
+        calls.append(len(tidbits))
+        if len(calls) == 5:
+            raise KeyboardInterrupt()
+        return add_tidbits(tidbits)
+    dm.add_tidbits = _interrupt
+    with pytest.raises(KeyboardInterrupt):
+        importer.run(str(notes))
+    assert json.load(open(importer.checkpoint_path()))['records'] == 10
+    del dm.add_tidbits
+
+    # records added after the checkpoint are already in the deck
+    result = importer.run(str(notes))
+    assert result['records'] == 30
+    assert result['added'] + result['duplicates'] == 30
+    assert dm.deck_size() == 25
+    assert not dm.pending_tidbits()
+    assert len({t.data for t in dm.snapshot()}) == 25
+
+    dm.save_deck()
+    merge = tmp_path / "merge"
+    merge.mkdir()
+    other = DeckManager(make_config(merge))
+    other.add_tidbit("Casey has 38 opossums")
+    assert Importer(other).run(dm.config['deck'])['added'] == 25
+    assert other.deck_size() == 26
@@ -0,0 +1,75 @@
+from metrics import Metrics, Histogram, METRICS
+from deck_manager import DeckManager
+
+
+def test_disabled():
+    metrics = Metrics()
+
+    @metrics.timed('work')
+    def work(x):
+        return x * 2
+
+    assert work(2) == 4
+    with metrics.timer('block'):
+        pass
+    metrics.inc('count')
+    assert metrics.to_dict() == {'enabled' : False, 'counters' : {}, 'histograms' : {}}
+
+
+def test_record_and_export(tmp_path):
+    metrics = Metrics(enabled = True)
+
+    @metrics.timed('work')
+    def fail():
+        raise ValueError()
+
+    for _ in range(3):
+        with metrics.timer('block'):
+            pass
+    try:
+        fail()
+    except ValueError:
+        pass
+    metrics.inc('requests', 2)
+
+    summary = metrics.to_dict()
+    assert summary['histograms']['block']['count'] == 3
+    assert summary['histograms']['block']['buckets']['+Inf'] == 3
+    assert summary['histograms']['work']['count'] == 1
+    assert summary['counters'] == {'requests' : 2, 'work.errors' : 1}
+
+    text = metrics.to_prometheus()
+    assert '# TYPE tidbit_requests_total counter' in text
+    assert 'tidbit_block_seconds_bucket{le="+Inf"} 3' in text
+    assert 'tidbit_work_errors_total 1' in text
+
+    metrics.dump(str(tmp_path / 'metrics.prom'))
+    assert (tmp_path / 'metrics.prom').read_text() == text
+
+
+def test_quantile():
+    histogram = Histogram(bounds = (1.0, 2.0, 3.0))
+    for value in (0.5, 1.5, 1.5, 2.5):
+        histogram.observe(value)
+    assert histogram.counts == [1, 2, 1, 0]
+    assert 1.0 <= histogram.quantile(0.5) <= 2.0
+    assert histogram.quantile(1.0) == 2.5
+
+
+def test_instrumented_deck(tmp_path, make_config):
+    """
+    Tests that the deck manager and model record their timings
+    """
+    METRICS.reset()
+    METRICS.enabled = True
+    try:
+        dm = DeckManager(make_config())
+        dm.add_tidbit("Albert has 23 sheep")
+        dm.review_tidbit(dm.get_next_tidbit(), 3)
+        dm.save_deck()
+        histograms = METRICS.to_dict()['histograms']
+    finally:
+        METRICS.enabled = False
+        METRICS.reset()
+    for name in ('model.generate_questions', 'model.request', 'deck.review_tidbit', 'deck.save'):
+        assert histograms[name]['count'] == 1
@@ -1,5 +1,6 @@
 import pytest
 from model import Model
+from connection import ModelUnavailableError
 
 
 def test_model():
@@ -27,8 +28,46 @@ def test_model():
 def test_connection():
     m = Model(connection = 'ollama',
             model_type = 'llama3.2:1b',
-            host = 'Not a Host')
-    
-    assert m.model_client == None
+            host = 'Not a Host',
+            failure_threshold = 2,
+            reset_timeout = 60)
+    # nothing is sent to the server until the first request
+    assert m.model_client._client == None
+    assert m.is_available()
+
+    for _ in range(2):
+        with pytest.raises(ModelUnavailableError):
+            m.generate_question("Albert has 23 sheep")
+    assert not m.is_available()
+    assert m.health.running()
+
+    # the breaker is open, requests fail without contacting the server
+    m.model_client.generate_question = lambda data: pytest.fail("server contacted")
+    with pytest.raises(ModelUnavailableError):
+        m.generate_question("Albert has 23 sheep")
+    m.health.stop()
     
-   
\ No newline at end of file
+   
+def test_stub():
+    m = Model(connection = 'stub')
+    assert m.model_client != None
+    assert m.generate_question("Albert has 23 sheep") == "What do you remember about: Albert has 23 sheep?"
+
+def test_stream_question():
+    m = Model(connection = 'stub')
+    parts = list(m.stream_question("Albert has 23 sheep"))
+    assert len(parts) > 1
+    assert ''.join(parts) == m.generate_question("Albert has 23 sheep")
+
+
+def test_reset_client():
+    """
+    Tests that reset closes the connection pool and the next request gets a
+    new client
+    """
+    m = Model(connection = 'ollama', model_type = 'llama3.2:1b', host = 'Not a Host')
+    client = m.model_client.client
+    m.model_client.reset()
+    assert m.model_client._client is None
+    assert m.model_client._transport is None
+    assert m.model_client.client is not client
@@ -0,0 +1,63 @@
+from question import Question, parse_title, parse_tags
+from tidbit import Tidbit
+from deck_manager import DeckManager
+from deck_store import DeckStore
+from fsrs import Card, Rating
+
+
+def test_parse():
+    response = "1. What is the capital of France?\n\n2) Which city is the capital of France?\n- Name France's capital."
+    assert Question.parse(response) == ["What is the capital of France?",
+                                        "Which city is the capital of France?",
+                                        "Name France's capital."]
+    assert len(Question.parse(response, 2)) == 2
+    assert Question.parse("Just one question?") == ["Just one question?"]
+
+
+def test_parse_title_tags():
+    assert parse_title('Title: "The Sheep of Albert."\nmore text') == "The Sheep of Albert"
+    assert parse_title("## Goats") == "Goats"
+    assert parse_title("  \n") is None
+    assert parse_tags("1. Farm animals\n2. #Sheep, farm animals; counting", 3) == \
+        ['farm-animals', 'sheep', 'counting']
+
+
+def test_rotate():
+    tid = Tidbit(Card(), "Paris is the capital of France", questions = ["a", "b", "c"])
+    assert tid.question == "a"
+    assert tid.rotate_question()
+    assert tid.rotate_question()
+    assert tid.question == "c"
+    tid.question = "d"
+    assert tid.to_dict()['questions'] == ["d", "a", "b"]
+    tid.questions = ["a", "b"]
+    assert tid.rotate_question()
+    assert tid.to_dict()['questions'] == ["b", "a"]
+    assert DeckStore.from_tidbits([tid]).tidbit(0).questions == ["b", "a"]
+    tid.question = "c"
+    assert tid.questions == ["c", "a"]
+    assert isinstance(tid._questions, tuple) # no pool object per tidbit
+
+    single = Tidbit(Card(), "Paris is the capital of France", question = "a")
+    assert not single.rotate_question()
+    assert single.questions == ["a"]
+
+
+def test_question_variants(tmp_path, make_config):
+    """
+    Tests that variants are generated with one request and rotated between
+    reviews, surviving a reload
+    """
+    dm = DeckManager(make_config(journal = True))
+    dm.variants = 3
+    tid = dm.add_tidbit("Albert has 23 sheep")
+    assert len(tid.questions) == 3
+    first = tid.question
+
+    dm.review_tidbit(dm.get_next_tidbit(), Rating.Good)
+    assert tid.question == tid.questions[0] != first
+    assert tid.questions[-1] == first
+
+    dm.config['initialized'] = True
+    dm.load_deck()
+    assert dm.get_tidbit(tid.card.card_id).questions == tid.questions
@@ -0,0 +1,86 @@
+import pytest
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+from fsrs import Card, Rating
+from deck_manager import DeckManager
+from due_queue import DueQueue
+from tidbit import Tidbit
+from review_session import ReviewSession
+
+
+def test_review_session():
+    """
+    Tests that the buffer stays full and ratings are written back
+    """
+    dm = DeckManager("test/config_3.yaml")
+    start = datetime(2025, 1, 1, tzinfo = timezone.utc)
+    dm.deck = DueQueue([Tidbit(Card(card_id = i, due = start + timedelta(minutes = i)),
+                               f"tidbit {i}") for i in range(8)])
+    session = ReviewSession(dm, size = 3)
+
+    cards = session.start()
+    assert [c['card_id'] for c in cards] == [0, 1, 2]
+
+    more = session.rate(0, Rating.Easy)
+    assert [c['card_id'] for c in more] == [3]
+    more = session.rate(1, Rating.Good)
+    assert [c['card_id'] for c in more] == [4]
+    session.flush()
+
+    assert dm.get_tidbit(0).card.last_review is not None
+    assert dm.get_tidbit(1).card.step == 1
+    assert len(dm.review_logs) == 2
+    assert [c['card_id'] for c in session.start()] == [2, 3, 4]
+
+
+def test_failed_rating():
+    """
+    Tests that invalid ratings are refused and a failing review neither loses
+    the card nor stops the worker
+    """
+    dm = DeckManager("test/config_3.yaml")
+    start = datetime(2025, 1, 1, tzinfo = timezone.utc)
+    dm.deck = DueQueue([Tidbit(Card(card_id = i, due = start + timedelta(minutes = i)),
+                               f"tidbit {i}") for i in range(4)])
+    session = ReviewSession(dm, size = 2)
+    session.start()
+    with pytest.raises(ValueError):
+        session.rate(0, 7)
+    with pytest.raises(ValueError):
+        dm.review_card(0, 7)
+    assert 0 in dm.deck
+
+    schedule = dm.schedule
+    dm.schedule = None # reviews fail until the scheduler is back
+    session.rate(0, Rating.Good)
+    session.flush()
+    assert isinstance(session.last_error, AttributeError)
+    assert dm.get_tidbit(0).card.last_review is None
+
+    dm.schedule = schedule
+    session.rate(1, Rating.Good)
+    session.flush()
+    assert dm.get_tidbit(1).card.last_review is not None
+
+
+def test_grade_timeout():
+    """
+    Tests that an answer that is never graded does not hold up the ratings
+    queued after it, and is dropped by flush after the timeout
+    """
+    dm = DeckManager("test/config_3.yaml")
+    start = datetime(2025, 1, 1, tzinfo = timezone.utc)
+    dm.deck = DueQueue([Tidbit(Card(card_id = i, due = start + timedelta(minutes = i)),
+                               f"tidbit {i}") for i in range(4)])
+    session = ReviewSession(dm, size = 2, grade_timeout = 0.1)
+    session.start()
+    stuck = Future()
+    dm.grade_answer = lambda tidbit, answer: stuck
+    session.answer(0, "no reply")
+    session.rate(1, Rating.Good)
+    session.flush()
+    assert dm.get_tidbit(1).card.last_review is not None
+    assert dm.get_tidbit(0).card.last_review is None
+    assert isinstance(session.last_error, TimeoutError)
+    assert stuck.cancelled()
+    assert 0 in [c['card_id'] for c in session.start()]
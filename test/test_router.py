@@ -0,0 +1,116 @@
+import asyncio
+import json
+import socket
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from time import sleep
+from model import Model
+
+
+def stub_server(name : str, delay : float = 0):
+    """
+    Starts an http server answering ollama chat requests with its name
+
+    ## Returns
+    The server, shut down by the caller
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self._reply({'models' : []})
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            sleep(delay)
+            self._reply({'model' : 'stub', 'done' : True,
+                         'message' : {'role' : 'assistant', 'content' : name}})
+
+        def _reply(self, body):
+            payload = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    Thread(target = server.serve_forever, daemon = True).start()
+    return server
+
+
+def host(server):
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def closed_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+@pytest.fixture
+def servers():
+    started = [stub_server('a', 0.1), stub_server('b', 0.1)]
+    yield started
+    for server in started:
+        server.shutdown()
+
+
+def test_balancing(servers):
+    """
+    Tests that concurrent requests are spread over the backends
+    """
+    m = Model(connection = 'router', model_type = 'stub',
+              backends = [{'host' : host(s)} for s in servers])
+
+    async def generate():
+        return await asyncio.gather(*(m.agenerate_question(f"fact {i}") for i in range(8)))
+
+    answers = asyncio.run(generate())
+    assert answers.count('a') == 4
+    assert answers.count('b') == 4
+    stats = m.backend_stats()
+    assert [s['requests'] for s in stats] == [4, 4]
+    assert all(s['outstanding'] == 0 and s['latency_ms'] >= 100 for s in stats)
+    m.close()
+
+
+def test_weights(servers):
+    """
+    Tests that heavier backends get a larger share of the requests
+    """
+    m = Model(connection = 'router', model_type = 'stub',
+              backends = [{'host' : host(servers[0]), 'weight' : 3},
+                          {'host' : host(servers[1]), 'weight' : 1}])
+
+    async def generate():
+        return await asyncio.gather(*(m.agenerate_question(f"fact {i}") for i in range(8)))
+
+    answers = asyncio.run(generate())
+    assert answers.count('a') == 6
+    assert answers.count('b') == 2
+    m.close()
+
+
+def test_failover(servers):
+    """
+    Tests that requests fail over to a live backend and the dead backend is
+    skipped afterwards
+    """
+    m = Model(connection = 'router', model_type = 'stub',
+              backends = [{'host' : closed_port(), 'weight' : 10},
+                          {'host' : host(servers[0])}])
+
+    assert m.generate_question("Albert has 23 sheep") == 'a'
+    assert m.generate_question("Albert has 24 sheep") == 'a'
+    dead, live = m.backend_stats()
+    assert dead['failures'] == 1 and not dead['available']
+    assert live['requests'] == 2
+    assert m.is_available()
+    m.close()
+
+    with pytest.raises(ValueError):
+        Model(connection = 'router', model_type = 'stub', backends = [])
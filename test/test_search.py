@@ -0,0 +1,58 @@
+from search import SearchIndex, tokenize
+from tidbit import Tidbit
+from deck_manager import DeckManager
+from fsrs import Card
+
+
+def make_tidbit(card_id, data, **kwargs):
+    return Tidbit(Card(card_id = card_id), data, **kwargs)
+
+
+def test_search_index():
+    assert tokenize("Albert has 23 Sheep!") == ["albert", "has", "23", "sheep"]
+
+    index = SearchIndex.from_tidbits([
+        make_tidbit(1, "Albert has 23 sheep", tags = ["Farm"], source = "a.com"),
+        make_tidbit(2, "Bill has 99 goats", title = "Goats", tags = ["farm", "goats"]),
+        make_tidbit(3, "Casey has 38 opossums", question = "How many sheep does Casey see?")
+    ])
+    assert index.search("has") == {1, 2, 3}
+    assert index.search("SHEEP") == {1, 3}
+    assert index.search("sheep albert") == {1}
+    assert index.search("sheep", tags = ["farm"]) == {1}
+    assert index.search(tags = ["FARM"]) == {1, 2}
+    assert index.search(source = "a.com") == {1}
+    assert index.search("unicorn") == set()
+    assert index.search() == {1, 2, 3}
+
+    index.remove(1)
+    assert index.search("sheep") == {3}
+    assert "albert" not in index.tokens
+
+    restored = SearchIndex.from_dict(index.to_dict())
+    assert restored.search("goats", tags = ["goats"]) == {2}
+    restored.update(make_tidbit(2, "Bill has 99 llamas", tags = ["farm"]))
+    assert restored.search("goats") == set()
+    assert restored.search("llamas", tags = ["farm"]) == {2}
+
+
+def test_search_tidbits(tmp_path, make_config):
+    """
+    Tests that the index follows changes to the deck and survives reloads,
+    including changes only in the journal
+    """
+    dm = DeckManager(make_config(journal = True))
+    dm.config['initialized'] = True
+    sheep = dm.add_tidbit("Albert has 23 sheep", source = "farm")
+    goats = dm.add_tidbit("Bill has 99 goats", source = "farm")
+    dm.save_deck()
+    assert dm.search_tidbits("sheep")['total'] == 1
+
+    dm.delete_card(sheep)
+    dm.add_tidbit("Casey has 38 sheep")
+    result = dm.search_tidbits("sheep", fields = ['data'])
+    assert [t['data'] for t in result['items']] == ["Casey has 38 sheep"]
+
+    dm.load_deck()
+    assert [t['data'] for t in dm.search_tidbits("sheep")['items']] == ["Casey has 38 sheep"]
+    assert dm.search_tidbits(source = "farm")['items'][0]['card_id'] == goats.card.card_id
@@ -0,0 +1,51 @@
+from datetime import timedelta
+from fsrs import Card, Rating, State
+from metrics import METRICS
+from simulator import SyntheticUser, simulate, sweep, START
+
+
+def test_synthetic_user():
+    user = SyntheticUser(new_recall = 1.0, grades = (0, 1, 0))
+    assert user.rate(Card(), START) == Rating.Good
+    card = Card(state = State.Review, stability = 10, difficulty = 5,
+                last_review = START, due = START + timedelta(days = 10))
+    assert 0.85 < user.recall_probability(card, START + timedelta(days = 10)) < 0.95
+    assert SyntheticUser(recall_bias = -1).rate(card, START) == Rating.Again
+
+
+def test_simulate(tmp_path):
+    """
+    Tests that a run is reproducible, being on a virtual clock, and reports
+    the load and timings
+    """
+    METRICS.enabled = True
+    METRICS.inc('app.counter')
+    try:
+        result = simulate(cards = 100, days = 10, new_per_day = 5, daily = True,
+                          directory = str(tmp_path))
+        # the app's registry is not reset and the run is timed elsewhere
+        assert METRICS.counters['app.counter'] == 1
+        assert 'deck.review.pop' not in METRICS.histograms
+    finally:
+        METRICS.enabled = False
+        METRICS.reset()
+    assert result == {**simulate(cards = 100, days = 10, new_per_day = 5, daily = True),
+                      'wall_s' : result['wall_s'], 'reviews_per_s' : result['reviews_per_s'],
+                      'timings' : result['timings']}
+    assert result['deck_size'] == 150
+    assert len(result['daily']) == 10
+    assert result['reviews'] == sum(d['reviews'] for d in result['daily']) > 50
+    assert result['timings']['review_card']['count'] == result['reviews']
+    assert result['timings']['persist']['count'] == result['reviews']
+    assert result['timings']['heap_pop']['count'] == result['reviews']
+
+    capped = simulate(cards = 100, days = 10, new_per_day = 5, max_reviews = 5)
+    assert capped['peak_reviews_per_day'] == 5
+    assert capped['backlog'] > 0
+
+
+def test_sweep():
+    results = sweep({'desired_retention' : [0.8, 0.95]},
+                    {'cards' : 100, 'days' : 20, 'journal' : False}, workers = 2)
+    assert [r['params']['desired_retention'] for r in results] == [0.8, 0.95]
+    assert results[0]['reviews'] < results[1]['reviews']
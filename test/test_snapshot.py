@@ -0,0 +1,70 @@
+from fsrs import Rating
+from deck_manager import DeckManager
+from snapshot import MappedDeck, write_snapshot, read, export_json, import_json
+from storage import DeckStorage
+
+
+def test_round_trip(tmp_path, make_tidbits):
+    """
+    Tests that every field of every tidbit survives a binary snapshot, in the
+    order the tidbits were written
+    """
+    tidbits = sorted(make_tidbits(200), key = lambda t: t.card.due)
+    tidbits[0].questions = ["First?", "Second?"]
+    tidbits[1].tags = None
+    tidbits[1].title = None
+    file_path = str(tmp_path / "deck.tbd")
+    write_snapshot(file_path, tidbits, {'schedule' : None, 'note' : 'ü'})
+
+    with MappedDeck(file_path) as deck:
+        assert len(deck) == 200
+        assert deck.meta['note'] == 'ü'
+        assert [t.to_dict() for t in deck.tidbits()] == [t.to_dict() for t in tidbits]
+        assert deck.tidbit(deck.row(tidbits[5].card.card_id)).data == tidbits[5].data
+
+    json_path = str(tmp_path / "deck.json")
+    export_json(file_path, json_path)
+    assert len(DeckStorage.read(json_path)['deck']) == 200
+    import_json(json_path, str(tmp_path / "copy.tbd"))
+    with MappedDeck(str(tmp_path / "copy.tbd")) as deck:
+        assert [t.data for t in deck.tidbits()] == [t.data for t in tidbits]
+
+
+def test_journal_replay(tmp_path, make_config):
+    """
+    Tests that a binary deck is saved and loaded by DeckManager, with journaled
+    changes replayed on top of it and compaction writing a new snapshot
+    """
+    config_path = make_config(deck = 'deck.tbd',
+                              settings = {'initialized' : True,
+                                          'journal params' : {'compact_after' : 4}})
+    dm = DeckManager(config_path)
+    dm.add_tidbit("Albert has 23 sheep", "How many sheep does Albert have?")
+    dm.add_tidbit("Bill has 99 goats", "How many goats does Bill have?")
+    dm.save_deck()
+    assert dm.storage.entries == 0
+
+    dm.add_tidbit("Paris is the capital of France", "What is the capital of France?")
+    reviewed = dm.get_next_tidbit()
+    dm.review_tidbit(reviewed, Rating.Easy)
+    dm.pause_card(dm.peek_tidbit())
+    assert dm.storage.entries == 3
+
+    deck = read(dm.config['deck'])
+    assert len(deck['touched']) == 2
+    assert len(list(deck['tidbits'])) == 3
+
+    for background in (False, True):
+        dm = DeckManager(config_path, background = background)
+        dm.loaded.wait()
+        assert dm.load_error is None
+        assert len(dm.deck) == 3
+        assert dm.deck.get(reviewed.card.card_id).card.state == 2
+        assert dm.deck.active() == 2
+        assert dm.search_tidbits("Paris")["total"] == 1
+
+    # fourth entry triggers compaction into the binary file
+    dm.review_tidbit(dm.get_next_tidbit(), Rating.Good)
+    assert dm.storage.entries == 0
+    with MappedDeck(dm.config['deck']) as deck:
+        assert len(deck) == 3
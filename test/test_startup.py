@@ -0,0 +1,73 @@
+import sys
+import pytest
+import yaml
+from deck_manager import DeckManager, DeckLoadError
+from due_queue import DueQueue
+from startup import StartupReport
+
+
+def test_background_load(tmp_path, make_config, make_tidbits):
+    """
+    Tests that a deck loaded in the background has every card, and that the
+    model is only created when it is first used
+    """
+    config_path = make_config()
+    dm = DeckManager(config_path)
+    dm.deck = DueQueue(make_tidbits(1200))
+    dm.save_deck()
+    with open(config_path) as file:
+        config = yaml.safe_load(file)
+    config['initialized'] = True
+    with open(config_path, 'w') as file:
+        yaml.safe_dump(config, file)
+
+    report = StartupReport()
+    loaded = DeckManager(config_path, background = True, report = report)
+    assert loaded._model is None
+    assert loaded.ready.wait(10)
+    assert loaded.loaded.wait(10)
+    assert loaded.load_error is None
+    assert len(loaded.deck) == 1200
+    assert len(loaded.index) == 1200
+    assert loaded.get_next_tidbit().card.card_id == dm.get_next_tidbit().card.card_id
+
+    loaded.model.generate_question("Albert has 23 sheep")
+    phases = [p['phase'] for p in report.to_dict()['phases']]
+    assert phases == ['config', 'first cards', 'deck loaded', 'model']
+
+
+def test_report():
+    report = StartupReport()
+    report.mark('a')
+    report.mark('b')
+    summary = report.to_dict()
+    assert [p['phase'] for p in summary['phases']] == ['a', 'b']
+    assert summary['phases'][1]['at_s'] >= summary['phases'][0]['at_s']
+    assert summary['modules'] == len(sys.modules)
+
+
+def test_load_error(tmp_path, make_config, make_tidbits):
+    """
+    Tests that a deck that failed to load in the background is reported and
+    never saved over
+    """
+    config_path = make_config(settings = {'initialized' : True})
+    dm = DeckManager(config_path)
+    dm.deck = DueQueue(make_tidbits(10))
+    dm.save_deck()
+    deck_path = dm.config['deck']
+    with open(deck_path) as file:
+        contents = file.read()
+    with open(deck_path, 'w') as file:
+        file.write(contents[:len(contents) // 2])
+
+    report = StartupReport()
+    broken = DeckManager(config_path, background = True, report = report)
+    assert broken.loaded.wait(10)
+    assert broken.load_error is not None
+    assert report.to_dict()['errors'][0]['phase'] == 'deck loaded'
+    with pytest.raises(DeckLoadError):
+        broken.save_deck()
+    broken.save_deck(str(tmp_path / "partial.json"))
+    with open(deck_path) as file:
+        assert file.read() == contents[:len(contents) // 2]
@@ -0,0 +1,159 @@
+import yaml
+from time import sleep
+from storage import DeckStorage
+from deck_manager import DeckManager
+from fsrs import Rating
+from threading import Thread
+
+
+def make_config(tmp_path, deck = "deck.json"):
+    """
+    Writes a config with a journaled deck in a temporary directory
+    """
+    config = {
+        'initialized' : None,
+        'deck' : str(tmp_path / deck),
+        'question' : 'src/prompts/question_prompt.txt',
+        'answer' : 'src/prompts/answer_prompt.txt',
+        'model params' : {
+            'connection' : 'ollama',
+            'model_type' : 'llama3.2:1b',
+            'host' : 'Not a Host'
+        },
+        'journal params' : {'compact_after' : 4}
+    }
+    config_path = tmp_path / "config.yaml"
+    with open(config_path, 'w') as file:
+        yaml.safe_dump(config, file)
+    return str(config_path)
+
+
+def test_journal_replay(tmp_path):
+    """
+    Tests that journaled changes are replayed on top of the snapshot and that
+    compaction folds them in
+    """
+    config_path = make_config(tmp_path)
+    dm = DeckManager(config_path)
+    dm.add_tidbit("Albert has 23 sheep", "How many sheep does Albert have?")
+    dm.add_tidbit("Bill has 99 goats", "How many goats does Bill have?")
+    dm.review_tidbit(dm.get_next_tidbit(), Rating.Easy)
+    assert dm.storage.entries == 3
+
+    dm = DeckManager(config_path)
+    assert len(dm.deck) == 2
+    assert dm.deck[0].data == "Bill has 99 goats"
+    assert dm.deck[1].card.state == 2
+
+    # fourth entry triggers compaction
+    dm.review_tidbit(dm.get_next_tidbit(), Rating.Good)
+    assert dm.storage.entries == 0
+    assert len(DeckStorage.read(dm.config['deck'])['deck']) == 2
+
+
+def test_torn_journal(tmp_path):
+    """
+    Tests that a partially written last entry is ignored
+    """
+    config_path = make_config(tmp_path)
+    dm = DeckManager(config_path)
+    dm.add_tidbit("Albert has 23 sheep", "How many sheep does Albert have?")
+    with open(dm.storage.journal_path, 'a') as file:
+        file.write('{"op": "add", "tidb')
+
+    dm = DeckManager(config_path)
+    assert len(dm.deck) == 1
+    assert dm.storage.entries == 1
+
+    # the torn line is cut off, so entries written after it are kept
+    dm.add_tidbit("Bill has 99 goats", "How many goats does Bill have?")
+    dm = DeckManager(config_path)
+    assert len(dm.deck) == 2
+
+
+def test_compaction_race(tmp_path):
+    """
+    Tests that a change journaled while a snapshot is built is not lost when
+    the journal is emptied
+    """
+    storage = DeckStorage(str(tmp_path / "deck.json"), compact_after = 4)
+    storage.append('schedule', schedule = None)
+    racing = []
+
+    def build():
+        # another thread journals a change while the snapshot is built
+        racing.append(Thread(target = storage.append, args = ('delete',),
+                             kwargs = {'card_id' : 1}))
+        racing[0].start()
+        racing[0].join(0.2)
+        return {'deck' : [], 'schedule' : None}
+
+    storage.compact(build)
+    racing[0].join()
+    assert [e['op'] for e in DeckStorage.read_journal(storage.journal_path)] == ['delete']
+    assert storage.entries == 1
+
+
+def fake_fit(review_logs):
+    """
+    Stands in for the fsrs optimizer, which needs torch
+    """
+    return [0.5] * 19
+
+
+def slow_fit(review_logs):
+    sleep(0.5)
+    return fake_fit(review_logs)
+
+
+def missing_fit(review_logs):
+    raise ImportError("No module named 'torch'")
+
+
+def test_review_history(tmp_path):
+    """
+    Tests that review logs are persisted and used to refit the scheduler
+    """
+    config_path = make_config(tmp_path)
+    dm = DeckManager(config_path)
+    dm.add_tidbit("Albert has 23 sheep", "How many sheep does Albert have?")
+    dm.review_tidbit(dm.get_next_tidbit(), 3)
+    dm.review_tidbit(dm.get_next_tidbit(), Rating.Good)
+
+    dm = DeckManager(config_path)
+    logs = dm.get_review_history()
+    assert [log.rating for log in logs] == [Rating.Good, Rating.Good]
+    assert dm.optimize_schedule(min_reviews = 3) is None
+
+    dm.optimizer.fit = fake_fit
+    future = dm.optimize_schedule(min_reviews = 2)
+    assert future.result(timeout = 30) == [0.5] * 19
+    dm.optimizer.shutdown()
+    assert dm.schedule.parameters == tuple([0.5] * 19)
+
+
+def test_failed_fit(tmp_path):
+    """
+    Tests that a failed fit is reported and that every caller of a running
+    fit is called back
+    """
+    dm = DeckManager(make_config(tmp_path))
+    dm.add_tidbit("Albert has 23 sheep", "How many sheep does Albert have?")
+    dm.review_tidbit(dm.get_next_tidbit(), Rating.Good)
+    dm.review_tidbit(dm.get_next_tidbit(), Rating.Good)
+    dm.optimizer.fit = missing_fit
+    dm.optimize_schedule(min_reviews = 2).exception(timeout = 30)
+    dm.optimizer.shutdown()
+    status = dm.optimize_status()
+    assert not status['running']
+    assert "torch" in status['last_error']
+
+    dm.optimizer.fit = slow_fit
+    called = []
+    first = dm.optimize_schedule(min_reviews = 2, callback = called.append)
+    assert dm.optimize_schedule(min_reviews = 2, callback = called.append) is first
+    assert dm.optimize_status()['running']
+    first.result(timeout = 30)
+    dm.optimizer.shutdown()
+    assert called == [first, first]
+    assert dm.optimize_status() == {'running' : False, 'last_error' : None}